@@ -0,0 +1,108 @@
+"""Reproducible synthetic documents: digital PDFs, scanned PDFs and image scans."""
+import random
+from dataclasses import dataclass
+from datetime import date, timedelta
+from pathlib import Path
+
+import pypdfium2 as pdfium
+from PIL import Image, ImageDraw, ImageFont
+
+from document_scanner.models import ExtractedData
+from document_scanner.report import build_report_page
+
+ISSUERS = ["Stadtwerke Musterstadt GmbH", "Beispiel Versicherung AG", "Muster Handwerk KG", "Sparkasse Musterland"]
+ITEMS = ["Arbeitszeit Monteur", "Material", "Anfahrt", "Grundgebühr", "Verbrauch Strom", "Wartung", "Beratung"]
+
+
+@dataclass
+class CorpusFile:
+    path: Path
+    kind: str  # "digital", "scanned", "image"
+    pages: int
+
+
+def _invoice_lines(rng: random.Random, page: int) -> list[str]:
+    issued = date(2024, 1, 1) + timedelta(days=rng.randrange(365))
+    lines = [
+        rng.choice(ISSUERS),
+        "Musterstraße 1, 12345 Musterstadt",
+        f"Rechnung Nr. R-{rng.randrange(10000, 99999)}",
+        f"Rechnungsdatum: {issued:%d.%m.%Y}",
+        f"Seite {page + 1}",
+        "",
+    ]
+    total = 0.0
+    for _ in range(rng.randrange(8, 20)):
+        amount = round(rng.uniform(5, 400), 2)
+        total += amount
+        lines.append(f"{rng.choice(ITEMS):<30} {amount:>10.2f} EUR".replace(".", ","))
+    lines += [
+        "",
+        f"Gesamtbetrag: {total:.2f} EUR".replace(".", ","),
+        f"Zahlbar bis zum {issued + timedelta(days=14):%d.%m.%Y}",
+        "IBAN: DE89 3704 0044 0532 0130 00",
+    ]
+    return lines
+
+
+def _scan_image(lines: list[str], rng: random.Random, dpi: int = 200) -> Image.Image:
+    width, height = int(8.27 * dpi), int(11.69 * dpi)
+    image = Image.new("L", (width, height), 255)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=dpi // 7)
+    y = dpi
+    for line in lines:
+        draw.text((dpi, y), line, fill=0, font=font)
+        y += dpi // 5
+    # a slightly rotated, noisy scan like from a sheet-fed scanner
+    image = image.rotate(rng.uniform(-1.5, 1.5), fillcolor=235)
+    noise = Image.effect_noise(image.size, 12).point(lambda v: 0 if v < 30 else 255)
+    return Image.composite(image, noise.convert("L"), noise.point(lambda v: 255 if v else 0).convert("L"))
+
+
+def _digital_pdf(path: Path, pages: int, rng: random.Random) -> None:
+    merged = pdfium.PdfDocument.new()
+    for page in range(pages):
+        lines = _invoice_lines(rng, page)
+        data = ExtractedData(
+            document_type="Rechnung",
+            issuer=lines[0],
+            document_date=None,
+            amount_total=None,
+            currency="EUR",
+            due_date=None,
+            iban=None,
+            invoice_number=None,
+            is_tax_relevant=False,
+            tax_category=None,
+            summary=lines[1:],
+        )
+        single = pdfium.PdfDocument(build_report_page(data, path.name).getvalue())
+        merged.import_pages(single)
+        single.close()
+    merged.save(path)
+    merged.close()
+
+
+def generate_corpus(directory: Path, seed: int = 1, scale: int = 1) -> list[CorpusFile]:
+    """Write the corpus to ``directory``; the same seed always yields the same documents."""
+    rng = random.Random(seed)
+    directory.mkdir(parents=True, exist_ok=True)
+    files: list[CorpusFile] = []
+    for n in range(4 * scale):
+        pages = (1, 2, 5, 1)[n % 4]
+        path = directory / f"digital_{n:03d}.pdf"
+        _digital_pdf(path, pages, rng)
+        files.append(CorpusFile(path, "digital", pages))
+    for n in range(3 * scale):
+        pages = (1, 3, 10)[n % 3]
+        path = directory / f"scanned_{n:03d}.pdf"
+        images = [_scan_image(_invoice_lines(rng, page), rng) for page in range(pages)]
+        images[0].save(path, format="PDF", save_all=True, append_images=images[1:], resolution=200.0)
+        files.append(CorpusFile(path, "scanned", pages))
+    for n in range(2 * scale):
+        suffix = (".png", ".tiff")[n % 2]
+        path = directory / f"image_{n:03d}{suffix}"
+        _scan_image(_invoice_lines(rng, 0), rng).save(path, dpi=(200, 200))
+        files.append(CorpusFile(path, "image", 1))
+    return files
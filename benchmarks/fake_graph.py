@@ -0,0 +1,68 @@
+"""Local stand-in for the Microsoft Graph endpoints the scanner uses (uploads, events, $batch)."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body):
+        time.sleep(self.latency)
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_PUT(self):
+        body = self._body()
+        if self.path.startswith("/upload/"):
+            start, rest = self.headers["Content-Range"].split(" ")[1].split("-")
+            end, total = (int(value) for value in rest.split("/"))
+            if end + 1 == total:
+                self._reply(201, {"webUrl": f"https://onedrive.invalid{self.path}"})
+            else:
+                self._reply(202, {"nextExpectedRanges": [f"{end + 1}-"]})
+            return
+        item = self.path.split("root:")[1].rsplit(":/content", 1)[0]
+        self._reply(201, {"webUrl": f"https://onedrive.invalid{item}", "size": len(body)})
+
+    def do_POST(self):
+        body = self._body()
+        if self.path.endswith("/$batch"):
+            requests = json.loads(body)["requests"]
+            responses = [{"id": r["id"], "status": 201, "body": {"id": f"event-{r['id']}"}} for r in requests]
+            self._reply(200, {"responses": responses})
+        elif self.path.endswith(":/createUploadSession"):
+            host, port = self.server.server_address
+            self._reply(200, {"uploadUrl": f"http://{host}:{port}/upload/{time.monotonic_ns()}"})
+        else:
+            self._reply(201, {"id": "event"})
+
+    def do_GET(self):
+        self._reply(200, {"nextExpectedRanges": ["0-"]})
+
+
+class FakeGraphServer:
+    def __init__(self, latency: float = 0.0):
+        handler = type("Handler", (_Handler,), {"latency": latency})
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/v1.0"
+
+    def __enter__(self) -> "FakeGraphServer":
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,316 @@
+"""Benchmark the processing pipeline on a synthetic corpus.
+
+    python -m benchmarks.run --out bench.json [--compare previous.json]
+
+The LLM is replaced by a stub with configurable latency and Microsoft Graph
+by a local fake server, so the numbers reflect this code base (PDF parsing,
+OCR, extraction, report, upload client) and are comparable between commits.
+"""
+import argparse
+import json
+import logging
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from document_scanner.config import ScannerConfig
+from document_scanner.graph import GraphClient
+from document_scanner.models import Job
+from document_scanner.pipeline import build_pipeline
+from document_scanner.processor import DocumentProcessor
+
+from .corpus import CorpusFile, generate_corpus
+from .fake_graph import FakeGraphServer
+
+ROOT = Path(__file__).resolve().parents[1]
+STAGES = ("open", "text", "extract", "report", "upload", "calendar")
+
+STUB_PAYLOAD = {
+    "document_type": "Rechnung",
+    "issuer": "Stadtwerke Musterstadt GmbH",
+    "document_date": "2024-05-02",
+    "amount_total": 123.45,
+    "currency": "EUR",
+    "due_date": "2024-05-16",
+    "iban": "DE89370400440532013000",
+    "invoice_number": "R-12345",
+    "is_tax_relevant": False,
+    "tax_category": None,
+    "confidence": {},
+    "summary": ["Synthetische Rechnung"],
+}
+
+
+class StubExtractor:
+    """Answers like the LLM after a fixed delay, without network access."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    def extract(self, text: str, schema: dict, model: Optional[str] = None) -> dict:
+        self.calls += 1
+        time.sleep(self.latency)
+        return dict(STUB_PAYLOAD)
+
+    def close(self) -> None:
+        pass
+
+
+def percentiles(values: list[float]) -> dict[str, float]:
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def pick(q: float) -> float:
+        return ordered[min(len(ordered) - 1, round(q * (len(ordered) - 1)))]
+
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "p50": pick(0.5),
+        "p95": pick(0.95),
+        "max": ordered[-1],
+        "total": sum(values),
+    }
+
+
+def peak_rss_mb() -> dict[str, float]:
+    # ru_maxrss is KiB on Linux; children covers the OCR worker processes once they have exited
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+    }
+
+
+def ocr_available(cfg: ScannerConfig) -> bool:
+    try:
+        import tesserocr  # noqa: F401
+
+        return True
+    except ImportError:
+        return shutil.which(cfg.ocr.tesseract_cmd or "tesseract") is not None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def build_config(work: Path, graph_url: str, workers: Optional[int]) -> ScannerConfig:
+    data: dict[str, Any] = {
+        "hotfolder": {
+            "input_dir": str(work / "incoming"),
+            "processed_dir": str(work / "processed"),
+            "failed_dir": str(work / "failed"),
+            "archive_dir": str(work / "archive"),
+        },
+        "graph": {"client_id": "bench", "tenant_id": "bench", "base_url": graph_url, "token_cache_path": None},
+        "cache": {"enabled": False},
+        "jobs": {"enabled": False},
+        "ocr": {"language": "deu"},
+    }
+    if workers:
+        data["ocr"]["workers"] = workers
+    cfg = ScannerConfig.from_dict(data)
+    cfg.graph.base_url = graph_url
+    cfg.graph.token_cache_path = None
+    for directory in (cfg.hotfolder.input_dir, cfg.hotfolder.processed_dir):
+        directory.mkdir(parents=True, exist_ok=True)
+    return cfg
+
+
+@contextmanager
+def timed(timings: dict[str, list[float]], name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name].append(time.perf_counter() - start)
+
+
+def run_stages(processor: DocumentProcessor, graph: GraphClient, files: list[CorpusFile]) -> dict[str, Any]:
+    """Every stage separately, per document."""
+    timings: dict[str, list[float]] = defaultdict(list)
+    by_kind: dict[str, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+    for item in files:
+        kind_timings = by_kind[item.kind]
+        with timed(timings, "open"), timed(kind_timings, "open"):
+            document = processor.open_document(item.path)
+        try:
+            with timed(timings, "text"), timed(kind_timings, "text"):
+                extraction = processor.extract_text(item.path, document)
+            pages = [page.text for page in extraction.pages]
+            with timed(timings, "extract"), timed(kind_timings, "extract"):
+                extracted = processor.extract_data(extraction.text, pages)
+            with timed(timings, "report"), timed(kind_timings, "report"):
+                report = processor.write_report(item.path, extracted, document, extraction.pages)
+        finally:
+            if document is not None:
+                document.close()
+        with timed(timings, "upload"), timed(kind_timings, "upload"):
+            link = processor.upload(graph, report, extracted)
+        with timed(timings, "calendar"), timed(kind_timings, "calendar"):
+            processor.create_calendar_event(graph, extracted, link)
+    return {
+        "stages": {name: percentiles(timings[name]) for name in STAGES},
+        "by_kind": {
+            kind: {name: percentiles(values[name]) for name in STAGES} for kind, values in sorted(by_kind.items())
+        },
+    }
+
+
+def run_process_file(processor: DocumentProcessor, files: list[CorpusFile]) -> dict[str, Any]:
+    """``DocumentProcessor.process_file`` one document after another: latency per document."""
+    latencies = []
+    start = time.perf_counter()
+    for item in files:
+        begin = time.perf_counter()
+        processor.process_file(item.path)
+        latencies.append(time.perf_counter() - begin)
+    wall = time.perf_counter() - start
+    return {
+        "latency": percentiles(latencies),
+        "documents_per_second": len(files) / wall,
+        "pages_per_second": sum(item.pages for item in files) / wall,
+    }
+
+
+def run_pipeline(
+    cfg: ScannerConfig, processor: DocumentProcessor, graph: GraphClient, files: list[CorpusFile]
+) -> dict[str, Any]:
+    """All documents through the concurrent staged pipeline: throughput under load."""
+    copies = []
+    for item in files:
+        target = cfg.hotfolder.input_dir / item.path.name
+        shutil.copyfile(item.path, target)
+        copies.append(target)
+    pipeline = build_pipeline(cfg, processor, graph).start()
+    start = time.perf_counter()
+    for path in copies:
+        pipeline.submit(Job(source_path=path))
+    pipeline.shutdown()
+    wall = time.perf_counter() - start
+    failed = len(list(cfg.hotfolder.failed_dir.glob("*"))) if cfg.hotfolder.failed_dir.exists() else 0
+    return {
+        "seconds": wall,
+        "documents_per_second": len(files) / wall,
+        "pages_per_second": sum(item.pages for item in files) / wall,
+        "failed": failed,
+    }
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    lines = [f"Vergleich mit {baseline.get('commit') or 'Baseline'}:"]
+
+    def row(label: str, new: Optional[float], old: Optional[float], higher_is_better: bool = False) -> None:
+        if new is None or old is None or old == 0:
+            return
+        change = (new - old) / old * 100
+        better = change > 0 if higher_is_better else change < 0
+        lines.append(f"  {label:<32} {old:10.4f} -> {new:10.4f}  ({change:+.1f} %{' besser' if better else ''})")
+
+    for name in STAGES:
+        row(f"Stage {name} p50 [s]", current["stages"][name].get("p50"), baseline["stages"].get(name, {}).get("p50"))
+    row("process_file p95 [s]", current["process_file"]["latency"].get("p95"),
+        baseline["process_file"]["latency"].get("p95"))
+    row("Pipeline Dokumente/s", current["pipeline"]["documents_per_second"],
+        baseline["pipeline"]["documents_per_second"], higher_is_better=True)
+    row("Peak RSS [MiB]", current["peak_rss_mb"]["self"], baseline["peak_rss_mb"]["self"])
+    return lines
+
+
+def main(argv: Optional[list[str]] = None) -> dict[str, Any]:
+    parser = argparse.ArgumentParser(description="Benchmark des Dokumenten-Scanners")
+    parser.add_argument("--out", type=Path, default=Path("bench.json"), help="Ergebnisdatei (JSON)")
+    parser.add_argument("--compare", type=Path, help="Frühere Ergebnisdatei zum Vergleich")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--scale", type=int, default=1, help="Vielfaches der Korpusgröße")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Antwortzeit des LLM-Stubs in Sekunden")
+    parser.add_argument("--graph-latency", type=float, default=0.02, help="Antwortzeit des Graph-Fakes in Sekunden")
+    parser.add_argument("--ocr-workers", type=int, default=None)
+    parser.add_argument("--work-dir", type=Path, default=None, help="Arbeitsverzeichnis (Standard: temporär)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s - %(message)s")
+    work = args.work_dir or Path(tempfile.mkdtemp(prefix="scanner-bench-"))
+    with FakeGraphServer(latency=args.graph_latency) as server:
+        cfg = build_config(work, server.base_url, args.ocr_workers)
+        files = generate_corpus(work / "corpus", seed=args.seed, scale=args.scale)
+        skipped = []
+        if not ocr_available(cfg):
+            skipped = [item.path.name for item in files if item.kind != "digital"]
+            files = [item for item in files if item.kind == "digital"]
+            print(f"Tesseract nicht gefunden, überspringe {len(skipped)} Scans", file=sys.stderr)
+
+        processor = DocumentProcessor(cfg, ROOT / "config" / "llm_schema.json")
+        stub = StubExtractor(args.llm_latency)
+        processor._extractor = stub
+        graph = GraphClient(cfg.graph)
+        graph._token = {"access_token": "bench", "expires_at": time.time() + 86400}
+        try:
+            results: dict[str, Any] = {
+                "commit": git_commit(),
+                "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "settings": {
+                    "seed": args.seed,
+                    "scale": args.scale,
+                    "llm_latency": args.llm_latency,
+                    "graph_latency": args.graph_latency,
+                    "ocr_workers": cfg.ocr.workers,
+                    "ocr_engine": cfg.ocr.engine,
+                },
+                "corpus": {
+                    "documents": len(files),
+                    "pages": sum(item.pages for item in files),
+                    "kinds": {kind: sum(1 for f in files if f.kind == kind) for kind in ("digital", "scanned", "image")},
+                    "skipped": skipped,
+                },
+            }
+            results.update(run_stages(processor, graph, files))
+            results["process_file"] = run_process_file(processor, files)
+            results["pipeline"] = run_pipeline(cfg, processor, graph, files)
+            results["llm_calls"] = stub.calls
+        finally:
+            graph.close()
+            processor.close()
+        results["peak_rss_mb"] = peak_rss_mb()
+
+    args.out.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"Ergebnisse in {args.out}")
+    print(
+        f"{results['corpus']['documents']} Dokumente / {results['corpus']['pages']} Seiten, "
+        f"Pipeline {results['pipeline']['documents_per_second']:.2f} Dokumente/s, "
+        f"process_file p50 {results['process_file']['latency'].get('p50', 0):.3f}s "
+        f"p95 {results['process_file']['latency'].get('p95', 0):.3f}s, "
+        f"Peak RSS {results['peak_rss_mb']['self']:.0f} MiB"
+    )
+    for name in STAGES:
+        stats = results["stages"][name]
+        if stats:
+            print(f"  {name:<9} p50 {stats['p50']:.4f}s  p95 {stats['p95']:.4f}s  gesamt {stats['total']:.2f}s")
+    if args.compare:
+        print("\n".join(compare(results, json.loads(args.compare.read_text(encoding="utf-8")))))
+    if args.work_dir is None:
+        shutil.rmtree(work, ignore_errors=True)
+    return results
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Optional
+
+from .config import ScannerConfig
+from .graph import GraphClient
+from .llm_client import LLMExtractor, system_prompt
+from .models import Job
+from .ocr import IMAGE_SUFFIXES
+from .pipeline import build_pipeline
+from .processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+FINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+
+def build_batch_requests(
+    texts: dict[str, str], model: str, temperature: float, schema: dict[str, Any]
+) -> list[dict[str, Any]]:
+    """One Batch API request line per document, keyed by ``custom_id``."""
+    system = system_prompt(schema)
+    return [
+        {
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": BATCH_ENDPOINT,
+            "body": {
+                "model": model,
+                "temperature": temperature,
+                "response_format": {"type": "json_object"},
+                "messages": [
+                    {"role": "system", "content": system},
+                    {"role": "user", "content": text},
+                ],
+            },
+        }
+        for custom_id, text in texts.items()
+    ]
+
+
+def parse_batch_output(content: str) -> dict[str, Any]:
+    """Map ``custom_id`` to the parsed JSON answer, or to an exception for failed requests."""
+    results: dict[str, Any] = {}
+    for line in content.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        custom_id = item["custom_id"]
+        response = item.get("response") or {}
+        if item.get("error") or response.get("status_code") != 200:
+            results[custom_id] = RuntimeError(f"Batch-Anfrage fehlgeschlagen: {item.get('error') or response}")
+            continue
+        try:
+            message = response["body"]["choices"][0]["message"]["content"]
+            results[custom_id] = json.loads(message)
+        except (KeyError, IndexError, TypeError, ValueError) as exc:
+            results[custom_id] = RuntimeError(f"Unlesbare Batch-Antwort: {exc}")
+    return results
+
+
+class BatchExtractor:
+    """Runs many extractions as one OpenAI Batch job (files + batches endpoints)."""
+
+    def __init__(self, extractor: LLMExtractor, poll_interval: float = 30.0):
+        self.extractor = extractor
+        self.client = extractor.client
+        self.poll_interval = poll_interval
+
+    def submit(self, texts: dict[str, str], schema: dict[str, Any]) -> str:
+        lines = build_batch_requests(texts, self.extractor.model, self.extractor.temperature, schema)
+        payload = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines).encode("utf-8")
+        uploaded = self.extractor.call_with_retries(
+            lambda: self.client.files.create(file=("batch.jsonl", payload), purpose="batch")
+        )
+        batch = self.extractor.call_with_retries(
+            lambda: self.client.batches.create(
+                input_file_id=uploaded.id, endpoint=BATCH_ENDPOINT, completion_window="24h"
+            )
+        )
+        logger.info("Batch %s mit %d Dokumenten eingereicht", batch.id, len(lines))
+        return batch.id
+
+    def wait(self, batch_id: str, timeout: Optional[float] = None) -> Any:
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            batch = self.extractor.call_with_retries(lambda: self.client.batches.retrieve(batch_id))
+            if batch.status in FINAL_STATES:
+                return batch
+            if deadline is not None and time.monotonic() > deadline:
+                raise TimeoutError(f"Batch {batch_id} nicht rechtzeitig fertig (Status {batch.status})")
+            logger.info("Batch %s: %s", batch_id, batch.status)
+            time.sleep(self.poll_interval)
+
+    def results(self, batch: Any) -> dict[str, Any]:
+        if batch.status != "completed":
+            raise RuntimeError(f"Batch {batch.id} beendet mit Status {batch.status}")
+        results: dict[str, Any] = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if file_id:
+                content = self.extractor.call_with_retries(lambda: self.client.files.content(file_id))
+                results.update(parse_batch_output(content.text))
+        return results
+
+
+def run_batch(
+    cfg: ScannerConfig,
+    processor: DocumentProcessor,
+    graph: GraphClient,
+    directory: Path,
+    poll_interval: float = 30.0,
+    timeout: Optional[float] = None,
+) -> dict[str, int]:
+    """OCR a directory, extract all documents in one Batch job and run the report/upload stages.
+
+    As in :func:`~document_scanner.replay.run_replay`, originals outside the
+    input and failed folders stay where they are. With ``llm.enabled: false``
+    nothing is sent to the Batch API; the rules extract every document.
+    """
+    files = sorted(
+        p for p in directory.iterdir() if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES | {".pdf"}
+    )
+    jobs: dict[str, Job] = {}
+    pending: dict[str, str] = {}
+    counts = {"documents": len(files), "local": 0, "cached": 0, "batched": 0, "failed": 0}
+
+    keep_source = directory.resolve() not in {cfg.hotfolder.input_dir.resolve(), cfg.hotfolder.failed_dir.resolve()}
+    lock = threading.Lock()
+
+    def failed(job: Job, exc: Exception) -> None:
+        with lock:
+            counts["failed"] += 1
+
+    pipeline = build_pipeline(cfg, processor, graph, first_stage="report", on_failed=failed).start()
+    fail = pipeline.on_error
+
+    try:
+        for index, path in enumerate(files):
+            custom_id = f"doc-{index}"
+            try:
+                extraction = processor.extract_text(path)
+            except Exception as exc:  # noqa: BLE001
+                logger.exception("Text-Extraktion fehlgeschlagen für %s", path)
+                fail(Job(source_path=path, keep_source=keep_source), exc)
+                continue
+            job = Job(source_path=path, text=extraction.text, pages=extraction.pages, keep_source=keep_source)
+            if not cfg.llm.enabled:
+                counts["local"] += 1
+                pipeline.submit(replace(job, extracted=processor.rules.extract(extraction.text)))
+                continue
+            local = processor.extract_local(extraction.text)
+            if local is not None:
+                counts["local"] += 1
+                pipeline.submit(replace(job, extracted=local))
+                continue
+            text = processor.prepare_text([page.text for page in extraction.pages])
+            cached = processor.cache.get_extraction(processor.extraction_key(text)) if processor.cache else None
+            if cached is not None:
+                counts["cached"] += 1
+                pipeline.submit(replace(job, extracted=cached))
+                continue
+            jobs[custom_id] = job
+            pending[custom_id] = text
+
+        if pending:
+            counts["batched"] = len(pending)
+            batch_extractor = BatchExtractor(processor.get_extractor(), poll_interval=poll_interval)
+            batch = batch_extractor.wait(batch_extractor.submit(pending, processor.schema), timeout=timeout)
+            results = batch_extractor.results(batch)
+            for custom_id, job in jobs.items():
+                raw = results.get(custom_id, RuntimeError("Keine Batch-Antwort erhalten"))
+                try:
+                    if isinstance(raw, Exception):
+                        raise raw
+                    job.extracted = processor.parse_extraction(raw)
+                except Exception as exc:  # noqa: BLE001
+                    logger.error("Batch-Ergebnis für %s unbrauchbar: %s", job.source_path.name, exc)
+                    fail(job, exc)
+                    continue
+                if processor.cache is not None:
+                    processor.cache.put_extraction(processor.extraction_key(pending[custom_id]), job.extracted)
+                pipeline.submit(job)
+    finally:
+        pipeline.shutdown()
+    logger.info("Batch-Lauf beendet: %s", counts)
+    return counts
@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from .config import CacheConfig
+from .metrics import CACHE_LOOKUPS
+from .models import ExtractedData, PageText, TextExtraction
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS text_cache (
+    key TEXT PRIMARY KEY,
+    pages TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS extraction_cache (
+    key TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+"""
+
+_TABLES = ("text_cache", "extraction_cache")
+
+
+def file_sha256(path: Path, chunk_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def text_sha256(*parts: str) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def connect_private(path: Path) -> sqlite3.Connection:
+    """Open the SQLite database at ``path`` in WAL mode, readable by the service user only.
+
+    The service's databases hold OCR text, IBANs and amounts. SQLite gives
+    the ``-wal``/``-shm`` files the mode of the database file.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    os.close(os.open(path, os.O_RDWR | os.O_CREAT, 0o600))
+    for existing in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+        if existing.exists():
+            os.chmod(existing, 0o600)  # also databases created before with the default umask
+    conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class ResultCache:
+    """Persistent SQLite cache for OCR text and validated LLM extractions.
+
+    Text is keyed by the content hash of the input file, extractions by a
+    hash of the text, the model and the schema, so a changed schema or model
+    never serves stale results.
+    """
+
+    def __init__(self, cfg: CacheConfig):
+        self.cfg = cfg
+        self._conn = connect_private(cfg.path)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._puts = 0
+        self.stats = {"text_hits": 0, "text_misses": 0, "extraction_hits": 0, "extraction_misses": 0}
+        self.evict()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def get_text(self, key: str) -> Optional[TextExtraction]:
+        row = self._get("text_cache", "pages", key, "text")
+        if row is None:
+            return None
+        return TextExtraction(pages=[PageText.from_dict(page) for page in json.loads(row)])
+
+    def put_text(self, key: str, extraction: TextExtraction) -> None:
+        self._put("text_cache", "pages", key, json.dumps([page.to_dict() for page in extraction.pages]))
+
+    def get_extraction(self, key: str) -> Optional[ExtractedData]:
+        row = self._get("extraction_cache", "data", key, "extraction")
+        if row is None:
+            return None
+        return ExtractedData.from_dict(json.loads(row))
+
+    def put_extraction(self, key: str, data: ExtractedData) -> None:
+        self._put("extraction_cache", "data", key, json.dumps(data.to_dict()))
+
+    def evict(self) -> None:
+        """Drop entries older than ``max_age_days`` and the least recently used beyond ``max_entries``."""
+        cutoff = time.time() - self.cfg.max_age_days * 86400
+        with self._lock:
+            for table in _TABLES:
+                self._conn.execute(f"DELETE FROM {table} WHERE created < ?", (cutoff,))
+                self._conn.execute(
+                    f"DELETE FROM {table} WHERE key IN ("
+                    f"SELECT key FROM {table} ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                    (self.cfg.max_entries,),
+                )
+
+    def _get(self, table: str, column: str, key: str, stat: str) -> Optional[str]:
+        cutoff = time.time() - self.cfg.max_age_days * 86400
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {column} FROM {table} WHERE key = ? AND created >= ?", (key, cutoff)
+            ).fetchone()
+            if row is not None:
+                self._conn.execute(f"UPDATE {table} SET last_used = ? WHERE key = ?", (time.time(), key))
+                self.stats[f"{stat}_hits"] += 1
+            else:
+                self.stats[f"{stat}_misses"] += 1
+        CACHE_LOOKUPS.inc(cache=stat, result="hit" if row is not None else "miss")
+        return row[0] if row else None
+
+    def _put(self, table: str, column: str, key: str, value: str) -> None:
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {table} (key, {column}, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self._puts += 1
+            evict = self._puts % 100 == 0
+        if evict:
+            self.evict()
@@ -1,54 +1,234 @@
 import argparse
 import logging
 import sys
+from dataclasses import replace
 from pathlib import Path
+from typing import Callable
 
-from .config import load_config
+from .batch import run_batch
+from .config import DEFAULT_PROFILE, ScannerConfig, load_config
+from .duplicates import DuplicateIndex
 from .graph import GraphClient
+from .jobs import JobStore
+from .metrics import MetricsServer, TraceIdFilter
+from .models import Job
+from .pipeline import build_pipeline
 from .processor import DocumentProcessor
-from .watcher import watch_directory
+from .replay import collect_files, run_replay
+from .scheduler import FairScheduler
+from .stable_write import StabilityTracker
+from .watcher import watch_directories
 
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(name)s - %(message)s",
+    format="%(asctime)s [%(levelname)s] %(name)s [%(trace_id)s] - %(message)s",
 )
+for _handler in logging.getLogger().handlers:
+    _handler.addFilter(TraceIdFilter())
 logger = logging.getLogger(__name__)
 
 
 def run_service(config_path: Path):
     cfg = load_config(config_path)
     root_dir = Path(__file__).resolve().parents[2]
+    metrics = MetricsServer(cfg.metrics).start() if cfg.metrics.enabled else None
+    profiles = cfg.profile_configs()
+    inputs = {profile_cfg.hotfolder.input_dir.resolve() for profile_cfg in profiles.values()}
+    if len(inputs) != len(profiles):
+        raise ValueError("Jedes Profil braucht einen eigenen Eingangsordner")
+    # one OCR pool, cache, LLM client and Graph session for all profiles
     processor = DocumentProcessor(cfg, root_dir / "config" / "llm_schema.json")
+    processors = {name: processor.for_profile(profile_cfg) for name, profile_cfg in profiles.items()}
     graph = GraphClient(cfg.graph)
+    store = JobStore(cfg.jobs) if cfg.jobs.enabled else None
+    duplicates = DuplicateIndex(cfg.duplicates) if cfg.duplicates.enabled else None
+    pipeline = build_pipeline(
+        cfg, processor, graph, store=store, duplicates=duplicates, processors=processors
+    ).start()
+    weights = {profile.name: profile.weight for profile in cfg.profiles} or {DEFAULT_PROFILE: 1}
+    scheduler = FairScheduler(pipeline.submit, weights).start()
 
-    def handle(path: Path):
-        try:
-            report_path, extracted = processor.process_file(path)
-            onedrive_link = processor.upload(graph, report_path, extracted)
-            processor.create_calendar_event(graph, extracted, onedrive_link)
-            archive_target = cfg.hotfolder.archive_dir / path.name
-            archive_target.parent.mkdir(parents=True, exist_ok=True)
-            path.rename(archive_target)
-        except Exception as exc:  # noqa: BLE001
-            logger.exception("Fehler bei Verarbeitung %s: %s", path, exc)
-            fail_target = cfg.hotfolder.failed_dir / path.name
-            fail_target.parent.mkdir(parents=True, exist_ok=True)
-            path.rename(fail_target)
-
-    observer = watch_directory(cfg.hotfolder.input_dir, handle)
+    def handler(profile: str) -> Callable[[Path], None]:
+        def handle(path: Path):
+            job = store.begin(path, profile) if store is not None else Job(source_path=path, profile=profile)
+            if job is not None:
+                scheduler.put(job)
+
+        return handle
+
+    trackers = {
+        profile_cfg.hotfolder.input_dir: StabilityTracker(
+            handler(name), settle=profile_cfg.hotfolder.settle_seconds, timeout=profile_cfg.hotfolder.stable_timeout
+        )
+        for name, profile_cfg in profiles.items()
+    }
+    observer = watch_directories(trackers)
+    if store is not None and cfg.jobs.rescan_on_start:
+        # files that arrived while the service was down, or were in flight during a crash
+        for input_dir, tracker in trackers.items():
+            pending = sorted(p for p in input_dir.iterdir() if p.is_file())
+            logger.info("Startup-Scan: %d Dateien in %s", len(pending), input_dir)
+            for path in pending:
+                tracker.touch(path)
     try:
         observer.join()
     except KeyboardInterrupt:
         logger.info("Beende Service")
         observer.stop()
         observer.join()
+    finally:
+        for tracker in trackers.values():
+            tracker.close()
+        # queued files stay in their hotfolders and are picked up (or resumed) on the next start;
+        # only the documents a worker is busy with finish their current stage
+        scheduler.close(drain=False)
+        pipeline.shutdown(drain=False)
+        processor.close()
+        graph.close()
+        if store is not None:
+            store.close()
+        if duplicates is not None:
+            duplicates.close()
+        if metrics is not None:
+            metrics.close()
+
+
+def run_batch_command(config_path: Path, directory: Path, poll_interval: float, timeout: float | None):
+    cfg = load_config(config_path)
+    root_dir = Path(__file__).resolve().parents[2]
+    metrics = MetricsServer(cfg.metrics).start() if cfg.metrics.enabled else None
+    processor = DocumentProcessor(cfg, root_dir / "config" / "llm_schema.json")
+    graph = GraphClient(cfg.graph)
+    try:
+        run_batch(cfg, processor, graph, directory, poll_interval=poll_interval, timeout=timeout)
+    finally:
+        processor.close()
+        graph.close()
+        if metrics is not None:
+            metrics.close()
+
+
+def run_process_command(
+    cfg: ScannerConfig,
+    source: str,
+    profile: str,
+    workers: int | None,
+    ocr_workers: int | None,
+    dry_run: bool,
+    resume: bool,
+    dedupe: bool,
+):
+    profile_cfg = cfg.profile_configs()[profile]
+    if workers is not None:
+        profile_cfg = replace(
+            profile_cfg,
+            pipeline=replace(
+                profile_cfg.pipeline,
+                dedupe_workers=workers,
+                text_workers=workers,
+                llm_workers=workers,
+                report_workers=workers,
+                upload_workers=workers,
+                calendar_workers=workers,
+            ),
+        )
+    if ocr_workers is not None:
+        profile_cfg = replace(profile_cfg, ocr=replace(profile_cfg.ocr, workers=ocr_workers))
+    files = collect_files(source)
+    logger.info("%d Dateien aus %s für Profil %s", len(files), source, profile)
+    root_dir = Path(__file__).resolve().parents[2]
+    metrics = MetricsServer(cfg.metrics).start() if cfg.metrics.enabled else None
+    processor = DocumentProcessor(profile_cfg, root_dir / "config" / "llm_schema.json")
+    graph = None if dry_run else GraphClient(cfg.graph)
+    store = JobStore(cfg.jobs) if cfg.jobs.enabled and not dry_run else None
+    # off unless asked for: reprocessing the archive would find every file as its own duplicate
+    duplicates = DuplicateIndex(cfg.duplicates) if dedupe and cfg.duplicates.enabled and not dry_run else None
+    try:
+        summary = run_replay(
+            profile_cfg,
+            processor,
+            graph,
+            files,
+            profile=profile,
+            store=store,
+            duplicates=duplicates,
+            resume=resume,
+            dry_run=dry_run,
+        )
+    finally:
+        processor.close()
+        if graph is not None:
+            graph.close()
+        if store is not None:
+            store.close()
+        if duplicates is not None:
+            duplicates.close()
+        if metrics is not None:
+            metrics.close()
+    print(summary.format())
+
+
+COMMANDS = {"serve", "batch", "process"}
 
 
 def main(argv: list[str] | None = None):
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # "cli config.yaml" without subcommand keeps starting the service
+    if argv and argv[0] not in COMMANDS and not argv[0].startswith("-"):
+        argv.insert(0, "serve")
     parser = argparse.ArgumentParser(description="Dokumenten-Scanner Service")
-    parser.add_argument("config", type=Path, help="Pfad zur config.yaml")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Hotfolder überwachen")
+    serve.add_argument("config", type=Path, help="Pfad zur config.yaml")
+
+    batch = commands.add_parser("batch", help="Verzeichnis über die OpenAI Batch API verarbeiten")
+    batch.add_argument("config", type=Path, help="Pfad zur config.yaml")
+    batch.add_argument("directory", type=Path, help="Verzeichnis mit Scans")
+    batch.add_argument("--poll-interval", type=float, default=30.0, help="Sekunden zwischen Statusabfragen")
+    batch.add_argument("--timeout", type=float, default=None, help="Maximale Wartezeit auf den Batch in Sekunden")
+
+    process = commands.add_parser(
+        "process", help="Verzeichnis oder Glob direkt verarbeiten, ohne Watcher (z.B. failed oder Archiv)"
+    )
+    process.add_argument("config", type=Path, help="Pfad zur config.yaml")
+    process.add_argument("source", help='Verzeichnis oder Glob-Muster, z.B. "archiv/2023/**/*.pdf"')
+    process.add_argument("--profile", default=None, help="Hotfolder-Profil (Standard: das erste)")
+    process.add_argument("--workers", type=int, default=None, help="Worker je Pipeline-Stage")
+    process.add_argument("--ocr-workers", type=int, default=None, help="OCR-Prozesse")
+    process.add_argument("--dry-run", action="store_true", help="Reports erzeugen, aber kein Upload/Termin/Archiv")
+    process.add_argument(
+        "--resume", action="store_true", help="Fertige Dateien überspringen, abgebrochene fortsetzen"
+    )
+    process.add_argument(
+        "--dedupe", action="store_true", help="Bereits verarbeitete Dokumente überspringen (Standard: aus)"
+    )
+
     args = parser.parse_args(argv)
-    run_service(args.config)
+    if args.command == "batch":
+        run_batch_command(args.config, args.directory, args.poll_interval, args.timeout)
+    elif args.command == "process":
+        cfg = load_config(args.config)
+        profiles = cfg.profile_configs()
+        profile = args.profile or next(iter(profiles))
+        if profile not in profiles:
+            parser.error(f"unbekanntes Profil: {profile} (vorhanden: {', '.join(profiles)})")
+        if args.resume and args.dry_run:
+            parser.error("--resume und --dry-run schließen sich aus")
+        if args.resume and not cfg.jobs.enabled:
+            parser.error("--resume braucht den Job-Speicher (jobs.enabled)")
+        run_process_command(
+            cfg,
+            args.source,
+            profile,
+            args.workers,
+            args.ocr_workers,
+            args.dry_run,
+            args.resume,
+            args.dedupe,
+        )
+    else:
+        run_service(args.config)
 
 
 if __name__ == "__main__":
@@ -1,5 +1,5 @@
 import os
-from dataclasses import dataclass, field
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from typing import Optional
 
@@ -26,6 +26,15 @@ class GraphConfig:
             "offline_access",
         ]
     )
+    base_url: str = "https://graph.microsoft.com/v1.0"
+    simple_upload_max: int = 4 * 1024 * 1024
+    upload_chunk_size: int = 10 * 320 * 1024  # Graph requires multiples of 320 KiB
+    upload_retries: int = 5
+    pool_size: int = 10
+    batch_requests: bool = True
+    batch_window: float = 0.5
+    token_cache_path: Optional[Path] = Path("./cache/graph_token.json")
+    refresh_margin: int = 300
 
 
 @dataclass
@@ -34,6 +43,8 @@ class HotfolderConfig:
     processed_dir: Path
     failed_dir: Path
     archive_dir: Path
+    settle_seconds: float = 1.0  # without close events: unchanged size/mtime for this long means complete
+    stable_timeout: float = 300.0
 
 
 @dataclass
@@ -42,13 +53,102 @@ class LLMConfig:
     model: str = "gpt-4o-mini"
     temperature: float = 0
     api_key_env: str = "OPENAI_API_KEY"
+    base_url: Optional[str] = None
+    timeout: float = 60.0
+    max_retries: int = 5
+    backoff_base: float = 1.0
+    backoff_max: float = 30.0
+    tokens_per_minute: Optional[int] = None
+    token_budget: Optional[int] = 4000
+
+
+@dataclass
+class RulesConfig:
+    enabled: bool = True
+    min_confidence: float = 0.8
+    required_fields: list[str] = field(
+        default_factory=lambda: ["document_type", "issuer", "document_date", "amount_total"]
+    )
+    known_issuers: list[str] = field(default_factory=list)
+
+
+@dataclass
+class PreprocessConfig:
+    enabled: bool = True
+    grayscale: bool = True
+    binarize: bool = True
+    deskew: bool = True
+    max_skew_degrees: float = 5.0
+    crop_borders: bool = True
+    border_fraction: float = 0.8  # rows/columns darker than this are scanner border, not content
+    crop_padding: int = 20
+    target_dpi: Optional[int] = 300  # larger scans and phone photos are scaled down to this
+    detect_orientation: bool = False  # needs tesseract's osd.traineddata and costs an extra run
+    measure_savings: bool = False  # also OCR the raw image to log the time saved (doubles OCR cost)
 
 
 @dataclass
 class OCRConfig:
     enabled: bool = True
+    engine: str = "auto"  # "tesserocr" (in-process, model loaded once), "pytesseract" (CLI) or "auto"
     tesseract_cmd: Optional[str] = None
     language: str = "deu"
+    workers: int = field(default_factory=lambda: os.cpu_count() or 1)
+    min_chars_per_sq_inch: float = 1.0
+    min_glyph_coverage: float = 0.8
+    searchable_output: bool = True  # invisible text layer on OCR'd pages of the output PDF
+    max_page_megapixels: Optional[float] = 12.0  # larger pages are rendered at a lower DPI
+    pages_in_flight_per_worker: int = 2  # rendered pages queued per OCR worker and document
+    preprocess: PreprocessConfig = field(default_factory=PreprocessConfig)
+
+
+@dataclass
+class PipelineConfig:
+    queue_size: int = 16
+    dedupe_workers: int = 2
+    text_workers: int = 2
+    llm_workers: int = 4
+    report_workers: int = 2
+    upload_workers: int = 4
+    calendar_workers: int = 20  # waiting threads let the Graph batcher fill full $batch requests
+    archive_workers: int = 1
+
+
+@dataclass
+class CacheConfig:
+    enabled: bool = True
+    path: Path = Path("./cache/results.sqlite3")
+    max_entries: int = 10000
+    max_age_days: int = 180
+
+
+@dataclass
+class JobsConfig:
+    enabled: bool = True
+    path: Path = Path("./cache/jobs.sqlite3")
+    rescan_on_start: bool = True
+
+
+@dataclass
+class DuplicatesConfig:
+    enabled: bool = True
+    path: Path = Path("./cache/duplicates.sqlite3")
+    pages: int = 2  # leading pages compared by perceptual hash
+    max_distance: int = 24  # differing bits (of 256 per page) for a page to count as similar
+    min_text_similarity: float = 0.8  # share of numbers a similar document must have in common
+
+
+@dataclass
+class ReportConfig:
+    renderer: str = "vector"  # "vector" (native PDF text) or "raster" (300-dpi image page)
+
+
+@dataclass
+class MetricsConfig:
+    enabled: bool = False
+    host: str = "127.0.0.1"  # only reachable locally unless bound elsewhere on purpose
+    port: Optional[int] = 9464  # Prometheus /metrics; None disables the endpoint
+    trace_path: Optional[Path] = None  # per-document spans as JSON lines
 
 
 @dataclass
@@ -62,31 +162,99 @@ class OneDriveConfig:
     base_path: str
 
 
+DEFAULT_PROFILE = "default"
+
+
+def _parse_hotfolder(hotfolder_cfg: dict) -> HotfolderConfig:
+    return HotfolderConfig(
+        input_dir=Path(hotfolder_cfg["input_dir"]),
+        processed_dir=Path(hotfolder_cfg["processed_dir"]),
+        failed_dir=Path(hotfolder_cfg["failed_dir"]),
+        archive_dir=Path(hotfolder_cfg["archive_dir"]),
+        settle_seconds=hotfolder_cfg.get("settle_seconds", HotfolderConfig.settle_seconds),
+        stable_timeout=hotfolder_cfg.get("stable_timeout", HotfolderConfig.stable_timeout),
+    )
+
+
+@dataclass
+class ProfileConfig:
+    """One hotfolder (e.g. a department) served by the shared service process.
+
+    Fields that a profile does not set in the YAML are taken from the
+    top-level config when it is parsed.
+    """
+
+    name: str
+    hotfolder: HotfolderConfig
+    onedrive: OneDriveConfig
+    calendar: CalendarConfig
+    llm_model: str
+    ocr_language: str
+    weight: int = 1  # files taken per round when several hotfolders have work queued
+
+
 @dataclass
 class ScannerConfig:
     hotfolder: HotfolderConfig
     onedrive: OneDriveConfig
     graph: GraphConfig
     llm: LLMConfig = field(default_factory=LLMConfig)
+    rules: RulesConfig = field(default_factory=RulesConfig)
     ocr: OCRConfig = field(default_factory=OCRConfig)
     calendar: CalendarConfig = field(default_factory=CalendarConfig)
+    pipeline: PipelineConfig = field(default_factory=PipelineConfig)
+    cache: CacheConfig = field(default_factory=CacheConfig)
+    jobs: JobsConfig = field(default_factory=JobsConfig)
+    report: ReportConfig = field(default_factory=ReportConfig)
+    duplicates: DuplicatesConfig = field(default_factory=DuplicatesConfig)
+    metrics: MetricsConfig = field(default_factory=MetricsConfig)
+    profiles: list[ProfileConfig] = field(default_factory=list)
     timezone: str = "Europe/Berlin"
     log_level: str = "INFO"
 
+    def profile_configs(self) -> dict[str, "ScannerConfig"]:
+        """Effective config per profile; without ``profiles`` the top-level hotfolder is the only one."""
+        if not self.profiles:
+            return {DEFAULT_PROFILE: self}
+        return {
+            profile.name: replace(
+                self,
+                hotfolder=profile.hotfolder,
+                onedrive=profile.onedrive,
+                calendar=profile.calendar,
+                llm=replace(self.llm, model=profile.llm_model),
+                ocr=replace(self.ocr, language=profile.ocr_language),
+                profiles=[],
+            )
+            for profile in self.profiles
+        }
+
     @classmethod
     def from_dict(cls, data: dict) -> "ScannerConfig":
         env = os.environ
-        hotfolder = HotfolderConfig(
-            input_dir=Path(data["hotfolder"]["input_dir"]),
-            processed_dir=Path(data["hotfolder"]["processed_dir"]),
-            failed_dir=Path(data["hotfolder"]["failed_dir"]),
-            archive_dir=Path(data["hotfolder"]["archive_dir"]),
-        )
+        # with profiles the top-level hotfolder is optional, the first profile's stands in for it
+        hotfolder = None
+        if data.get("hotfolder") or not data.get("profiles"):
+            hotfolder = _parse_hotfolder(data["hotfolder"])
         graph_cfg = data.get("graph", {})
         graph = GraphConfig(
             client_id=env.get("GRAPH_CLIENT_ID", graph_cfg.get("client_id", "")),
             tenant_id=env.get("GRAPH_TENANT_ID", graph_cfg.get("tenant_id", "")),
             authority=graph_cfg.get("authority", "https://login.microsoftonline.com/" + env.get("GRAPH_TENANT_ID", graph_cfg.get("tenant_id", ""))),
+            base_url=graph_cfg.get("base_url", GraphConfig.base_url),
+            simple_upload_max=graph_cfg.get("simple_upload_max", GraphConfig.simple_upload_max),
+            upload_chunk_size=graph_cfg.get("upload_chunk_size", GraphConfig.upload_chunk_size),
+            upload_retries=graph_cfg.get("upload_retries", GraphConfig.upload_retries),
+            pool_size=graph_cfg.get("pool_size", GraphConfig.pool_size),
+            batch_requests=graph_cfg.get("batch_requests", GraphConfig.batch_requests),
+            batch_window=graph_cfg.get("batch_window", GraphConfig.batch_window),
+            token_cache_path=(
+                # null or "" keeps the tokens in memory only
+                (Path(graph_cfg["token_cache_path"]) if graph_cfg["token_cache_path"] else None)
+                if "token_cache_path" in graph_cfg
+                else GraphConfig.token_cache_path
+            ),
+            refresh_margin=graph_cfg.get("refresh_margin", GraphConfig.refresh_margin),
         )
         llm_cfg = data.get("llm", {})
         llm = LLMConfig(
@@ -94,27 +262,139 @@ class ScannerConfig:
             model=llm_cfg.get("model", "gpt-4o-mini"),
             temperature=llm_cfg.get("temperature", 0),
             api_key_env=llm_cfg.get("api_key_env", "OPENAI_API_KEY"),
+            base_url=llm_cfg.get("base_url"),
+            timeout=llm_cfg.get("timeout", 60.0),
+            max_retries=llm_cfg.get("max_retries", 5),
+            backoff_base=llm_cfg.get("backoff_base", 1.0),
+            backoff_max=llm_cfg.get("backoff_max", 30.0),
+            tokens_per_minute=llm_cfg.get("tokens_per_minute"),
+            token_budget=llm_cfg.get("token_budget", 4000),
+        )
+        rules_cfg = data.get("rules", {})
+        rules = RulesConfig(
+            enabled=rules_cfg.get("enabled", True),
+            min_confidence=rules_cfg.get("min_confidence", 0.8),
+            required_fields=rules_cfg.get("required_fields", RulesConfig().required_fields),
+            known_issuers=rules_cfg.get("known_issuers", []),
         )
         ocr_cfg = data.get("ocr", {})
+        preprocess_cfg = ocr_cfg.get("preprocess", {})
         ocr = OCRConfig(
             enabled=ocr_cfg.get("enabled", True),
+            engine=ocr_cfg.get("engine", "auto"),
             tesseract_cmd=ocr_cfg.get("tesseract_cmd"),
             language=ocr_cfg.get("language", "deu"),
+            workers=ocr_cfg.get("workers", OCRConfig().workers),
+            min_chars_per_sq_inch=ocr_cfg.get("min_chars_per_sq_inch", 1.0),
+            min_glyph_coverage=ocr_cfg.get("min_glyph_coverage", 0.8),
+            searchable_output=ocr_cfg.get("searchable_output", True),
+            max_page_megapixels=ocr_cfg.get("max_page_megapixels", OCRConfig.max_page_megapixels),
+            pages_in_flight_per_worker=ocr_cfg.get(
+                "pages_in_flight_per_worker", OCRConfig.pages_in_flight_per_worker
+            ),
+            preprocess=PreprocessConfig(
+                enabled=preprocess_cfg.get("enabled", True),
+                grayscale=preprocess_cfg.get("grayscale", True),
+                binarize=preprocess_cfg.get("binarize", True),
+                deskew=preprocess_cfg.get("deskew", True),
+                max_skew_degrees=preprocess_cfg.get("max_skew_degrees", PreprocessConfig.max_skew_degrees),
+                crop_borders=preprocess_cfg.get("crop_borders", True),
+                border_fraction=preprocess_cfg.get("border_fraction", PreprocessConfig.border_fraction),
+                crop_padding=preprocess_cfg.get("crop_padding", PreprocessConfig.crop_padding),
+                target_dpi=preprocess_cfg.get("target_dpi", PreprocessConfig.target_dpi),
+                detect_orientation=preprocess_cfg.get("detect_orientation", False),
+                measure_savings=preprocess_cfg.get("measure_savings", False),
+            ),
         )
         calendar_cfg = data.get("calendar", {})
         calendar = CalendarConfig(
             calendar_id=calendar_cfg.get("calendar_id"),
             default_time=calendar_cfg.get("default_time", "09:00"),
         )
+        pipeline_cfg = data.get("pipeline", {})
+        defaults = PipelineConfig()
+        pipeline = PipelineConfig(
+            queue_size=pipeline_cfg.get("queue_size", defaults.queue_size),
+            dedupe_workers=pipeline_cfg.get("dedupe_workers", defaults.dedupe_workers),
+            text_workers=pipeline_cfg.get("text_workers", defaults.text_workers),
+            llm_workers=pipeline_cfg.get("llm_workers", defaults.llm_workers),
+            report_workers=pipeline_cfg.get("report_workers", defaults.report_workers),
+            upload_workers=pipeline_cfg.get("upload_workers", defaults.upload_workers),
+            calendar_workers=pipeline_cfg.get("calendar_workers", defaults.calendar_workers),
+            archive_workers=pipeline_cfg.get("archive_workers", defaults.archive_workers),
+        )
+        cache_cfg = data.get("cache", {})
+        cache = CacheConfig(
+            enabled=cache_cfg.get("enabled", True),
+            path=Path(cache_cfg.get("path", CacheConfig.path)),
+            max_entries=cache_cfg.get("max_entries", CacheConfig.max_entries),
+            max_age_days=cache_cfg.get("max_age_days", CacheConfig.max_age_days),
+        )
+        jobs_cfg = data.get("jobs", {})
+        jobs = JobsConfig(
+            enabled=jobs_cfg.get("enabled", True),
+            path=Path(jobs_cfg.get("path", JobsConfig.path)),
+            rescan_on_start=jobs_cfg.get("rescan_on_start", True),
+        )
+        report = ReportConfig(renderer=data.get("report", {}).get("renderer", ReportConfig.renderer))
+        duplicates_cfg = data.get("duplicates", {})
+        duplicates = DuplicatesConfig(
+            enabled=duplicates_cfg.get("enabled", True),
+            path=Path(duplicates_cfg.get("path", DuplicatesConfig.path)),
+            pages=duplicates_cfg.get("pages", DuplicatesConfig.pages),
+            max_distance=duplicates_cfg.get("max_distance", DuplicatesConfig.max_distance),
+            min_text_similarity=duplicates_cfg.get("min_text_similarity", DuplicatesConfig.min_text_similarity),
+        )
+        metrics_cfg = data.get("metrics", {})
+        metrics = MetricsConfig(
+            enabled=metrics_cfg.get("enabled", False),
+            host=metrics_cfg.get("host", MetricsConfig.host),
+            port=metrics_cfg.get("port", MetricsConfig.port),
+            trace_path=Path(metrics_cfg["trace_path"]) if metrics_cfg.get("trace_path") else None,
+        )
         onedrive_cfg = data.get("onedrive", {})
         onedrive = OneDriveConfig(base_path=onedrive_cfg.get("base_path", "/Dokumente"))
+        profiles = []
+        for profile_cfg in data.get("profiles") or []:
+            name = profile_cfg.get("name")
+            if not name:
+                raise ValueError("Profil ohne Namen in der Konfiguration")
+            if any(profile.name == name for profile in profiles):
+                raise ValueError(f"Profil doppelt definiert: {name}")
+            profile_calendar = profile_cfg.get("calendar", {})
+            profiles.append(
+                ProfileConfig(
+                    name=name,
+                    hotfolder=_parse_hotfolder(profile_cfg["hotfolder"]),
+                    onedrive=OneDriveConfig(
+                        base_path=profile_cfg.get("onedrive", {}).get("base_path", onedrive.base_path)
+                    ),
+                    calendar=CalendarConfig(
+                        calendar_id=profile_calendar.get("calendar_id", calendar.calendar_id),
+                        default_time=profile_calendar.get("default_time", calendar.default_time),
+                    ),
+                    llm_model=profile_cfg.get("llm", {}).get("model", llm.model),
+                    ocr_language=profile_cfg.get("ocr", {}).get("language", ocr.language),
+                    weight=max(1, int(profile_cfg.get("weight", ProfileConfig.weight))),
+                )
+            )
+        if hotfolder is None:
+            hotfolder = profiles[0].hotfolder
         return cls(
             hotfolder=hotfolder,
             onedrive=onedrive,
             graph=graph,
             llm=llm,
+            rules=rules,
             ocr=ocr,
             calendar=calendar,
+            pipeline=pipeline,
+            cache=cache,
+            jobs=jobs,
+            report=report,
+            duplicates=duplicates,
+            metrics=metrics,
+            profiles=profiles,
             timezone=data.get("timezone", "Europe/Berlin"),
             log_level=data.get("log_level", "INFO"),
         )
@@ -0,0 +1,132 @@
+import threading
+from io import BytesIO
+from pathlib import Path
+from typing import BinaryIO, Optional, Sequence, Union
+
+import pypdfium2 as pdfium
+from PIL import Image, ImageSequence
+
+# PDFium is not thread-safe; every call into it goes through this lock.
+PDFIUM_LOCK = threading.RLock()
+
+
+class SourceDocument:
+    """A PDF input parsed exactly once.
+
+    Text extraction, page rendering and merging with the report all work on
+    the same PDFium document, so a large scan is neither re-parsed per step
+    nor copied into memory; PDFium reads pages from the file on demand.
+    """
+
+    def __init__(self, path: Path, data: Optional[bytes] = None):
+        self.path = path
+        with PDFIUM_LOCK:
+            self._pdf = pdfium.PdfDocument(data if data is not None else str(path))
+            self._page_count = len(self._pdf)
+
+    @classmethod
+    def from_image(cls, path: Path, default_dpi: float = 300.0) -> "SourceDocument":
+        """Wrap a scanned image (every frame of a multi-page TIFF) as PDF pages at its scan resolution."""
+        with Image.open(path) as image:
+            dpi = image.info.get("dpi", (default_dpi,))[0] or default_dpi
+            frames = [
+                frame.copy() if frame.mode in ("1", "L", "RGB", "CMYK") else frame.convert("RGB")
+                for frame in ImageSequence.Iterator(image)
+            ]
+        buffer = BytesIO()
+        frames[0].save(buffer, format="PDF", save_all=True, append_images=frames[1:], resolution=float(dpi))
+        return cls(path, buffer.getvalue())
+
+    def __enter__(self) -> "SourceDocument":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._page_count
+
+    def close(self) -> None:
+        with PDFIUM_LOCK:
+            if self._pdf is not None:
+                self._pdf.close()
+                self._pdf = None
+
+    def page_size(self, index: int) -> tuple[float, float]:
+        """Page width and height in PDF points."""
+        with PDFIUM_LOCK:
+            page = self._pdf[index]
+            try:
+                return page.get_size()
+            finally:
+                page.close()
+
+    def page_text(self, index: int) -> str:
+        with PDFIUM_LOCK:
+            page = self._pdf[index]
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+                page.close()
+        return text.replace("\r\n", "\n")
+
+    def text_boxes(self, index: int) -> list[tuple[float, float, float, float]]:
+        """Boxes of the page's own text layer as (x0, y0, x1, y1), relative to the page size, origin top left."""
+        with PDFIUM_LOCK:
+            page = self._pdf[index]
+            textpage = page.get_textpage()
+            try:
+                width, height = page.get_size()
+                rects = [textpage.get_rect(n) for n in range(textpage.count_rects())]
+            finally:
+                textpage.close()
+                page.close()
+        return [
+            (left / width, 1 - top / height, right / width, 1 - bottom / height) for left, bottom, right, top in rects
+        ]
+
+    def render_page(self, index: int, dpi: float = 300) -> Image.Image:
+        with PDFIUM_LOCK:
+            page = self._pdf[index]
+            try:
+                bitmap = page.render(scale=dpi / 72)
+                image = bitmap.to_pil().copy()
+                bitmap.close()
+            finally:
+                page.close()
+        image.info["dpi"] = (dpi, dpi)
+        return image
+
+    def save_after(
+        self,
+        first_pages: Union[bytes, BinaryIO],
+        target: BinaryIO,
+        overlay: Optional[bytes] = None,
+        overlay_pages: Sequence[int] = (),
+    ) -> None:
+        """Write ``first_pages`` (a PDF) followed by all pages of this document to ``target``.
+
+        Page ``i`` of the ``overlay`` PDF is drawn on top of page
+        ``overlay_pages[i]`` of this document, e.g. an invisible OCR text layer.
+        """
+        if not isinstance(first_pages, bytes):
+            first_pages = first_pages.read()
+        with PDFIUM_LOCK:
+            merged = pdfium.PdfDocument(first_pages)
+            layer = pdfium.PdfDocument(overlay) if overlay is not None else None
+            try:
+                offset = len(merged)
+                merged.import_pages(self._pdf)
+                for layer_index, page_index in enumerate(overlay_pages):
+                    xobject = layer.page_as_xobject(layer_index, merged)
+                    page = merged[offset + page_index]
+                    page.insert_obj(xobject.as_pageobject())
+                    page.gen_content()
+                    page.close()
+                merged.save(target)
+            finally:
+                if layer is not None:
+                    layer.close()
+                merged.close()
@@ -0,0 +1,240 @@
+import json
+import logging
+import re
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from PIL import Image
+
+from .cache import connect_private, file_sha256
+from .config import DEFAULT_PROFILE, DuplicatesConfig
+from .document import SourceDocument
+from .models import Fingerprint, Job
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    profile TEXT NOT NULL,
+    sha256 TEXT NOT NULL,
+    page_count INTEGER NOT NULL,
+    page_hashes TEXT NOT NULL,
+    source_name TEXT NOT NULL,
+    reference TEXT,
+    signature TEXT,
+    created REAL NOT NULL,
+    PRIMARY KEY (profile, sha256)
+);
+"""
+
+HASH_SIZE = 16  # 16x16 gradient bits per page
+RENDER_DPI = 40  # plenty for a 17x16 thumbnail, and cheap to render
+MAX_CANDIDATES = 20
+
+_NUMBER = re.compile(r"\d[\d.,/ -]*\d")
+
+
+def dhash(image: Image.Image, size: int = HASH_SIZE) -> int:
+    """Difference hash: one bit per horizontally adjacent pixel pair of a tiny grayscale thumbnail.
+
+    Rescans, different resolutions, JPEG noise and slight brightness changes
+    flip only a few bits, while a different page layout flips many.
+    """
+    thumb = np.asarray(image.convert("L").resize((size + 1, size), Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = (thumb[:, 1:] > thumb[:, :-1]).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def text_signature(text: str) -> frozenset[str]:
+    """The numbers of a document (amounts, dates, invoice number, IBAN), separators removed.
+
+    Two invoices from the same sender share their layout and most words but
+    never all of these, while a rescan or the emailed original has the same.
+    """
+    tokens = set()
+    for match in _NUMBER.findall(text):
+        digits = re.sub(r"\D", "", match)
+        if len(digits) >= 3:
+            tokens.add(digits)
+    return frozenset(tokens)
+
+
+def signature_similarity(a: frozenset[str], b: frozenset[str]) -> float:
+    if not a or not b:
+        return 0.0  # nothing to confirm the match with
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class DuplicateMatch:
+    sha256: str
+    source_name: str
+    reference: str  # OneDrive link or report path of the processed original
+
+
+@dataclass
+class _Entry:
+    fingerprint: Fingerprint
+    source_name: str
+    reference: Optional[str] = None  # None while the document is still in flight
+    signature: Optional[frozenset[str]] = None
+    owner: Optional[str] = None  # trace ID of the job holding an in-flight claim
+
+
+class DuplicateIndex:
+    """Content and perceptual hashes of every processed document.
+
+    An identical file is recognised from its SHA-256 before anything else
+    runs. A second scan or the emailed PDF of an already scanned page is
+    found through per-page difference hashes, but those only nominate
+    candidates: invoices from the same sender look alike at thumbnail size,
+    so a candidate is confirmed by comparing the numbers in the extracted
+    text (``min_text_similarity``) before the LLM, upload and calendar
+    stages are skipped. Hashes are kept in memory; a lookup is a popcount
+    per known document. Each hotfolder profile has its own set, since a
+    document dropped into two departments' folders is needed by both.
+    """
+
+    def __init__(self, cfg: DuplicatesConfig):
+        self.cfg = cfg
+        self._conn = connect_private(cfg.path)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        # claims of documents that never finished (crash, failure) must not shadow a new copy
+        self._conn.execute("DELETE FROM documents WHERE reference IS NULL")
+        self._entries: dict[tuple[str, str], _Entry] = {}  # by (profile, SHA-256)
+        for profile, sha256, page_count, page_hashes, source_name, reference, signature in self._conn.execute(
+            "SELECT profile, sha256, page_count, page_hashes, source_name, reference, signature FROM documents"
+        ):
+            hashes = [int(value, 16) for value in page_hashes.split(",") if value]
+            self._entries[profile, sha256] = _Entry(
+                Fingerprint(sha256, page_count, hashes),
+                source_name,
+                reference,
+                frozenset(json.loads(signature)) if signature else None,
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def fingerprint(self, path: Path, document: Optional[SourceDocument]) -> Fingerprint:
+        if document is None:
+            return Fingerprint(file_sha256(path), 0)
+        pages = range(min(self.cfg.pages, len(document)))
+        return Fingerprint(
+            sha256=file_sha256(path),
+            page_count=len(document),
+            page_hashes=[dhash(document.render_page(index, dpi=RENDER_DPI)) for index in pages],
+        )
+
+    def claim(
+        self, fingerprint: Fingerprint, source_name: str, profile: str = DEFAULT_PROFILE, owner: Optional[str] = None
+    ) -> tuple[Optional[DuplicateMatch], list[str]]:
+        """Look ``fingerprint`` up and register it unless it is an identical copy.
+
+        Returns the exact match (if any) and the SHA-256s of visually similar
+        documents still to be confirmed via :meth:`confirm`. A copy of a
+        document that is still in flight is no duplicate yet: the original
+        may still fail, so the copy is processed as well. ``owner`` (the
+        job's trace ID) lets :meth:`forget` drop only the job's own claim.
+        """
+        with self._lock:
+            exact = self._entries.get((profile, fingerprint.sha256))
+            if exact is not None and exact.reference is not None:
+                return DuplicateMatch(fingerprint.sha256, exact.source_name, exact.reference), []
+            if exact is not None:
+                logger.info(
+                    "%s gleicht %s, das noch in Bearbeitung ist; wird ebenfalls verarbeitet",
+                    source_name,
+                    exact.source_name,
+                )
+                return None, []
+            candidates = self._similar(fingerprint, profile)
+            entry = self._entries[profile, fingerprint.sha256] = _Entry(fingerprint, source_name, owner=owner)
+            self._write(profile, entry)
+        return None, candidates
+
+    def confirm(self, candidates: list[str], text: str, profile: str = DEFAULT_PROFILE) -> Optional[DuplicateMatch]:
+        """The candidate whose extracted numbers match ``text``, if any."""
+        signature = text_signature(text)
+        best: Optional[tuple[float, str]] = None
+        with self._lock:
+            for sha256 in candidates:
+                entry = self._entries.get((profile, sha256))
+                if entry is None or entry.signature is None:
+                    continue  # still in flight or forgotten: nothing to compare against
+                similarity = signature_similarity(signature, entry.signature)
+                if similarity >= self.cfg.min_text_similarity and (best is None or similarity > best[0]):
+                    best = (similarity, sha256)
+            if best is None:
+                return None
+            entry = self._entries[profile, best[1]]
+            return DuplicateMatch(best[1], entry.source_name, entry.reference)
+
+    def complete(self, job: Job) -> None:
+        """Remember where the processed document ended up, for later duplicates to link to."""
+        if job.fingerprint is None or job.duplicate_of is not None:
+            return
+        reference = job.onedrive_link or (str(job.report_path) if job.report_path else job.source_path.name)
+        entry = _Entry(job.fingerprint, job.source_path.name, reference, text_signature(job.text or ""))
+        with self._lock:
+            # the claim may be gone if the service restarted in between
+            self._entries[job.profile, job.fingerprint.sha256] = entry
+            self._write(job.profile, entry)
+
+    def forget(self, job: Job) -> None:
+        """Drop the unfinished claim of ``job``, e.g. after a failure, so another copy is processed again."""
+        if job.fingerprint is None or job.duplicate_of is not None:
+            return
+        with self._lock:
+            entry = self._entries.get((job.profile, job.fingerprint.sha256))
+            if entry is not None and entry.reference is None and entry.owner == job.trace_id:
+                del self._entries[job.profile, job.fingerprint.sha256]
+                self._conn.execute(
+                    "DELETE FROM documents WHERE profile = ? AND sha256 = ?", (job.profile, job.fingerprint.sha256)
+                )
+
+    def _similar(self, fingerprint: Fingerprint, profile: str) -> list[str]:
+        if not fingerprint.page_hashes:
+            return []
+        scored = []
+        for (entry_profile, sha256), entry in self._entries.items():
+            if entry_profile != profile:
+                continue
+            known = entry.fingerprint
+            if known.page_count != fingerprint.page_count or len(known.page_hashes) != len(fingerprint.page_hashes):
+                continue
+            distance = max(hamming(a, b) for a, b in zip(known.page_hashes, fingerprint.page_hashes))
+            if distance <= self.cfg.max_distance:
+                scored.append((distance, sha256))
+        return [sha256 for _, sha256 in sorted(scored)[:MAX_CANDIDATES]]
+
+    def _write(self, profile: str, entry: _Entry) -> None:
+        fingerprint = entry.fingerprint
+        self._conn.execute(
+            "INSERT OR REPLACE INTO documents "
+            "(profile, sha256, page_count, page_hashes, source_name, reference, signature, created) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                profile,
+                fingerprint.sha256,
+                fingerprint.page_count,
+                ",".join(f"{value:x}" for value in fingerprint.page_hashes),
+                entry.source_name,
+                entry.reference,
+                json.dumps(sorted(entry.signature)) if entry.signature is not None else None,
+                time.time(),
+            ),
+        )
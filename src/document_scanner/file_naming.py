@@ -1,4 +1,6 @@
+import os
 import re
+import threading
 from datetime import date
 from pathlib import Path
 from typing import Optional
@@ -41,10 +43,50 @@ def build_filename(
     return f"{base}.pdf"
 
 
-def ensure_unique(path: Path) -> Path:
-    counter = 1
-    candidate = path
-    while candidate.exists():
-        counter += 1
-        candidate = path.with_name(path.stem + f"__v{counter}" + path.suffix)
-    return candidate
+_VERSIONED = re.compile(r"^(?P<base>.*?)(?:__v(?P<version>\d+))?$")
+
+
+class NameAllocator:
+    """Hands out unique file names in one directory without probing ``__v2``, ``__v3``, … one by one.
+
+    The highest version per base name is indexed once from the directory
+    listing and updated on every allocation, so the next free name is known
+    in O(1). The file is created with ``O_EXCL``: two workers can never get
+    the same name, and a file that appeared behind the index's back only
+    costs one extra attempt.
+    """
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._versions: dict[tuple[str, str], int] = {}
+        if directory.is_dir():
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    self._index(entry.name)
+
+    def _index(self, name: str) -> None:
+        stem, suffix = os.path.splitext(name)
+        match = _VERSIONED.match(stem)
+        version = int(match["version"]) if match["version"] else 1
+        key = (match["base"], suffix)
+        if version > self._versions.get(key, 0):
+            self._versions[key] = version
+
+    def reserve(self, name: str) -> Path:
+        """Create an empty file for ``name`` (or its next free ``__vN`` variant) and return its path."""
+        stem, suffix = os.path.splitext(name)
+        key = (stem, suffix)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            version = self._versions.get(key, 0) + 1
+            while True:
+                candidate = self.directory / (stem + (f"__v{version}" if version > 1 else "") + suffix)
+                try:
+                    fd = os.open(candidate, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o644)
+                except FileExistsError:
+                    version += 1
+                    continue
+                os.close(fd)
+                self._versions[key] = version
+                return candidate
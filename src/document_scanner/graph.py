@@ -1,50 +1,205 @@
 import logging
-from datetime import datetime, time
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from datetime import datetime
 from pathlib import Path
 from typing import Optional
 
 import msal
 import requests
-from zoneinfo import ZoneInfo
+from requests.adapters import HTTPAdapter
 
 from .config import CalendarConfig, GraphConfig, OneDriveConfig
+from .metrics import RETRIES, span
 
 logger = logging.getLogger(__name__)
 
+RESERVED_SCOPES = {"openid", "profile", "offline_access"}
+
 
 class GraphClient:
     def __init__(self, graph_cfg: GraphConfig):
         self.graph_cfg = graph_cfg
-        self.app = msal.PublicClientApplication(
-            graph_cfg.client_id, authority=graph_cfg.authority
-        )
+        self._app: Optional[msal.PublicClientApplication] = None
         self._token: Optional[dict] = None
+        self._token_lock = threading.Lock()
+        self._token_cache = msal.SerializableTokenCache()
+        self._load_token_cache()
+        # one pooled session for all Graph calls instead of a new connection per request
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=graph_cfg.pool_size, pool_maxsize=graph_cfg.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.batcher: Optional[GraphBatcher] = (
+            GraphBatcher(self, window=graph_cfg.batch_window) if graph_cfg.batch_requests else None
+        )
+
+    @property
+    def app(self) -> msal.PublicClientApplication:
+        # created on first use: MSAL resolves the authority over the network
+        if self._app is None:
+            self._app = msal.PublicClientApplication(
+                self.graph_cfg.client_id, authority=self.graph_cfg.authority, token_cache=self._token_cache
+            )
+        return self._app
+
+    def close(self) -> None:
+        if self.batcher is not None:
+            self.batcher.close()
+        self.session.close()
+
+    def _load_token_cache(self) -> None:
+        path = self.graph_cfg.token_cache_path
+        if path is not None and path.exists():
+            self._token_cache.deserialize(path.read_text(encoding="utf-8"))
+
+    def _save_token_cache(self) -> None:
+        path = self.graph_cfg.token_cache_path
+        if path is None or not self._token_cache.has_state_changed:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        # the cache holds a refresh token: readable by the service user only
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(self._token_cache.serialize())
+        os.replace(tmp_path, path)
+        os.chmod(path, 0o600)
+        self._token_cache.has_state_changed = False
+
+    def _scopes(self) -> list[str]:
+        # MSAL adds the reserved scopes itself and rejects them when passed explicitly
+        return [scope for scope in self.graph_cfg.scopes if scope not in RESERVED_SCOPES]
+
+    def _token_valid(self) -> bool:
+        return bool(self._token) and self._token["expires_at"] - self.graph_cfg.refresh_margin > time.time()
 
     def _acquire_token(self) -> str:
-        if self._token and "access_token" in self._token:
+        if self._token_valid():
+            return self._token["access_token"]
+        # single flight: one thread refreshes, the others wait and reuse its token
+        with self._token_lock:
+            if self._token_valid():
+                return self._token["access_token"]
+            result = self._acquire_token_silent() or self._acquire_token_device_flow()
+            self._token = {
+                "access_token": result["access_token"],
+                "expires_at": time.time() + int(result.get("expires_in", 3600)),
+            }
+            self._save_token_cache()
             return self._token["access_token"]
-        flow = self.app.initiate_device_flow(scopes=self.graph_cfg.scopes)
+
+    def _acquire_token_silent(self) -> Optional[dict]:
+        accounts = self.app.get_accounts()
+        if not accounts:
+            return None
+        result = self.app.acquire_token_silent(self._scopes(), account=accounts[0])
+        if result and "access_token" in result and int(result.get("expires_in", 0)) <= self.graph_cfg.refresh_margin:
+            result = self.app.acquire_token_silent(self._scopes(), account=accounts[0], force_refresh=True)
+        if result and "access_token" in result:
+            logger.info("Graph-Token still erneuert")
+            return result
+        logger.warning("Stille Token-Erneuerung fehlgeschlagen: %s", (result or {}).get("error_description"))
+        return None
+
+    def _acquire_token_device_flow(self) -> dict:
+        flow = self.app.initiate_device_flow(scopes=self._scopes())
         if "user_code" not in flow:
             raise RuntimeError("Keine Device-Code-Antwort erhalten")
         logger.info("Oeffne https://microsoft.com/devicelogin und gebe den Code %s ein", flow["user_code"])
         result = self.app.acquire_token_by_device_flow(flow)
         if "access_token" not in result:
             raise RuntimeError(f"Token konnte nicht geholt werden: {result}")
-        self._token = result
-        return result["access_token"]
+        return result
 
     def _headers(self) -> dict[str, str]:
         return {"Authorization": f"Bearer {self._acquire_token()}"}
 
     def upload_file(self, onedrive: OneDriveConfig, target_relative: str, file_path: Path) -> str:
-        url = f"https://graph.microsoft.com/v1.0/me/drive/root:{onedrive.base_path}/{target_relative}:/content"
+        item_path = f"{onedrive.base_path}/{target_relative}"
+        size = file_path.stat().st_size
+        if size > self.graph_cfg.simple_upload_max:
+            with span("graph.upload", bytes=size, session=True):
+                return self._upload_session(item_path, file_path)
+        url = f"{self.graph_cfg.base_url}/me/drive/root:{item_path}:/content"
         logger.info("Uploade Datei nach OneDrive: %s", url)
-        with file_path.open("rb") as f:
-            response = requests.put(url, headers=self._headers(), data=f)
+        with span("graph.upload", bytes=size, session=False), file_path.open("rb") as f:
+            response = self.session.put(url, headers=self._headers(), data=f)
         if response.status_code not in (200, 201):
             raise RuntimeError(f"Upload fehlgeschlagen: {response.status_code} {response.text}")
         return response.json().get("webUrl", target_relative)
 
+    def _create_upload_session(self, item_path: str) -> str:
+        url = f"{self.graph_cfg.base_url}/me/drive/root:{item_path}:/createUploadSession"
+        payload = {"item": {"@microsoft.graph.conflictBehavior": "replace"}}
+        response = self.session.post(url, headers=self._headers(), json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"Upload-Session fehlgeschlagen: {response.status_code} {response.text}")
+        return response.json()["uploadUrl"]
+
+    def _next_offset(self, upload_url: str) -> Optional[int]:
+        """Ask the session which byte Graph expects next; ``None`` if the session is gone."""
+        response = self.session.get(upload_url)
+        if response.status_code == 404:
+            return None
+        response.raise_for_status()
+        ranges = response.json().get("nextExpectedRanges") or ["0-"]
+        return int(ranges[0].split("-")[0])
+
+    def _upload_session(self, item_path: str, file_path: Path) -> str:
+        total = file_path.stat().st_size
+        chunk_size = self.graph_cfg.upload_chunk_size
+        logger.info("Uploade Datei in Teilen nach OneDrive: %s (%d Bytes)", item_path, total)
+        upload_url = self._create_upload_session(item_path)
+        offset = 0
+        failures = 0
+        with file_path.open("rb") as f:
+            while True:
+                f.seek(offset)
+                chunk = f.read(chunk_size)
+                end = offset + len(chunk) - 1
+                try:
+                    # the upload URL is pre-authenticated; Graph rejects an Authorization header here
+                    response = self.session.put(
+                        upload_url,
+                        data=chunk,
+                        headers={"Content-Length": str(len(chunk)), "Content-Range": f"bytes {offset}-{end}/{total}"},
+                    )
+                except requests.RequestException as exc:
+                    response = None
+                    error = str(exc)
+                else:
+                    if response.status_code in (200, 201):
+                        return response.json().get("webUrl", item_path)
+                    if response.status_code == 202:
+                        ranges = response.json().get("nextExpectedRanges") or [f"{end + 1}-"]
+                        offset = int(ranges[0].split("-")[0])
+                        failures = 0
+                        continue
+                    error = f"{response.status_code} {response.text}"
+                    if response.status_code < 500 and response.status_code not in (404, 409, 416, 429):
+                        raise RuntimeError(f"Upload fehlgeschlagen: {error}")
+                failures += 1
+                if failures > self.graph_cfg.upload_retries:
+                    raise RuntimeError(f"Upload fehlgeschlagen nach {failures} Versuchen: {error}")
+                RETRIES.inc(service="graph_upload")
+                time.sleep(min(30, 2 ** (failures - 1)))
+                try:
+                    next_offset = self._next_offset(upload_url)
+                except requests.RequestException as exc:
+                    logger.warning("Upload-Status nicht abrufbar, wiederhole Teil: %s", exc)
+                    continue
+                if next_offset is None:
+                    logger.warning("Upload-Session abgelaufen, starte neu: %s", item_path)
+                    upload_url = self._create_upload_session(item_path)
+                    next_offset = 0
+                logger.info("Setze Upload bei Byte %d fort (%s)", next_offset, error)
+                offset = next_offset
+
     def create_calendar_event(
         self,
         calendar_cfg: CalendarConfig,
@@ -55,7 +210,7 @@ class GraphClient:
         currency: str,
     ) -> str:
         calendar = calendar_cfg.calendar_id or "primary"
-        url = f"https://graph.microsoft.com/v1.0/me/calendars/{calendar}/events"
+        path = f"/me/calendars/{calendar}/events"
         payload = {
             "subject": title,
             "body": {"contentType": "text", "content": description},
@@ -63,7 +218,138 @@ class GraphClient:
             "end": {"dateTime": (event_date.replace(minute=59)).isoformat(), "timeZone": "UTC"},
             "location": {"displayName": "Automatischer Reminder"},
         }
-        response = requests.post(url, headers={**self._headers(), "Content-Type": "application/json"}, json=payload)
+        if self.batcher is not None:
+            try:
+                return self.batcher.submit("POST", path, payload).result().get("id", "")
+            except RuntimeError as exc:
+                raise RuntimeError(f"Event konnte nicht angelegt werden: {exc}") from exc
+        with span("graph.event"):
+            response = self.session.post(
+                f"{self.graph_cfg.base_url}{path}",
+                headers={**self._headers(), "Content-Type": "application/json"},
+                json=payload,
+            )
         if response.status_code not in (200, 201):
             raise RuntimeError(f"Event konnte nicht angelegt werden: {response.status_code} {response.text}")
         return response.json().get("id", "")
+
+
+class GraphBatcher:
+    """Coalesces individual Graph calls into JSON ``$batch`` requests.
+
+    Callers get a future per request. A batch is sent when ``max_size``
+    requests are queued or ``window`` seconds after the first one arrived;
+    sub-requests answered with 429/5xx are queued again on their own,
+    everything else is resolved individually.
+    """
+
+    def __init__(self, client: GraphClient, max_size: int = 20, window: float = 0.5, retries: int = 3):
+        self.client = client
+        self.max_size = min(max_size, 20)  # Graph limit per $batch
+        self.window = window
+        self.retries = retries
+        self._queue: "queue.Queue[Optional[_BatchItem]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="graph-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, method: str, path: str, body: Optional[dict] = None) -> Future:
+        future: Future = Future()
+        self._queue.put(_BatchItem(method, path, body, future))
+        return future
+
+    def close(self) -> None:
+        """Send everything still queued and stop the background thread."""
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self) -> None:
+        stopping = False
+        retry: list[_BatchItem] = []
+        while not stopping or retry:
+            items, retry = retry, []
+            if not items:
+                item = self._queue.get()
+                if item is None:
+                    return
+                items.append(item)
+            deadline = time.monotonic() + self.window
+            while len(items) < self.max_size and not stopping:
+                try:
+                    item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                else:
+                    items.append(item)
+            for start in range(0, len(items), self.max_size):
+                retry.extend(self._send(items[start : start + self.max_size]))
+
+    def _send(self, items: list["_BatchItem"]) -> list["_BatchItem"]:
+        """Send one batch, resolve futures and return the items that should be retried."""
+        payload = {
+            "requests": [
+                {
+                    "id": str(index),
+                    "method": item.method,
+                    "url": item.path,
+                    **({"body": item.body, "headers": {"Content-Type": "application/json"}} if item.body else {}),
+                }
+                for index, item in enumerate(items)
+            ]
+        }
+        try:
+            with span("graph.batch", requests=len(items)):
+                response = self.client.session.post(
+                    f"{self.client.graph_cfg.base_url}/$batch",
+                    headers={**self.client._headers(), "Content-Type": "application/json"},
+                    json=payload,
+                )
+            if response.status_code != 200:
+                raise RuntimeError(f"$batch fehlgeschlagen: {response.status_code} {response.text}")
+            responses = {r["id"]: r for r in response.json().get("responses", [])}
+        except Exception as exc:  # noqa: BLE001
+            logger.warning("Graph-$batch mit %d Anfragen fehlgeschlagen: %s", len(items), exc)
+            return self._retry_or_fail(items, exc, delay=1.0)
+
+        retry: list[_BatchItem] = []
+        delay = 0.0
+        for index, item in enumerate(items):
+            result = responses.get(str(index))
+            status = result.get("status", 0) if result else 0
+            if 200 <= status < 300:
+                item.future.set_result(result.get("body") or {})
+            elif status == 429 or status >= 500 or result is None:
+                retry_after = (result or {}).get("headers", {}).get("Retry-After")
+                delay = max(delay, float(retry_after) if retry_after else 1.0)
+                retry.extend(
+                    self._retry_or_fail([item], RuntimeError(f"{status} {result and result.get('body')}"), delay=0)
+                )
+            else:
+                item.future.set_exception(RuntimeError(f"{status} {result.get('body')}"))
+        if retry:
+            logger.info("Wiederhole %d Graph-Teilanfragen", len(retry))
+            time.sleep(min(delay, 30))
+        return retry
+
+    def _retry_or_fail(self, items: list["_BatchItem"], exc: Exception, delay: float) -> list["_BatchItem"]:
+        retry = []
+        for item in items:
+            item.attempts += 1
+            if item.attempts > self.retries:
+                item.future.set_exception(RuntimeError(str(exc)))
+            else:
+                retry.append(item)
+        RETRIES.inc(len(retry), service="graph_batch")
+        if retry and delay:
+            time.sleep(delay)
+        return retry
+
+
+@dataclass
+class _BatchItem:
+    method: str
+    path: str
+    body: Optional[dict]
+    future: Future
+    attempts: int = 0
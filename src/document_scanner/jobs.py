@@ -0,0 +1,172 @@
+import json
+import logging
+import threading
+import time
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Optional
+
+from .cache import connect_private
+from .config import DEFAULT_PROFILE, JobsConfig
+from .models import ExtractedData, Fingerprint, Job, PageText
+
+logger = logging.getLogger(__name__)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    path TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    stage TEXT,
+    state TEXT NOT NULL,
+    data TEXT NOT NULL,
+    error TEXT,
+    updated REAL NOT NULL
+);
+"""
+
+FINISHED = "finished"
+FAILED = "failed"
+ACTIVE = "active"
+
+
+def file_fingerprint(path: Path) -> str:
+    """Size and mtime, enough to tell a re-used file name from the file a record belongs to."""
+    stat = path.stat()
+    return f"{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def job_to_dict(job: Job) -> dict[str, Any]:
+    return {
+        "text": job.text,
+        "pages": [page.to_dict() for page in job.pages],
+        "extracted": job.extracted.to_dict() if job.extracted else None,
+        "report_path": str(job.report_path) if job.report_path else None,
+        "onedrive_link": job.onedrive_link,
+        "calendar_event_id": job.calendar_event_id,
+        "trace_id": job.trace_id,
+        "fingerprint": job.fingerprint.to_dict() if job.fingerprint else None,
+        "duplicate_candidates": job.duplicate_candidates,
+        "duplicate_of": job.duplicate_of,
+    }
+
+
+def job_from_dict(path: Path, stage: Optional[str], data: dict[str, Any]) -> Job:
+    job = Job(
+        source_path=path,
+        text=data.get("text"),
+        pages=[PageText.from_dict(page) for page in data.get("pages", [])],
+        extracted=ExtractedData.from_dict(data["extracted"]) if data.get("extracted") else None,
+        report_path=Path(data["report_path"]) if data.get("report_path") else None,
+        onedrive_link=data.get("onedrive_link"),
+        calendar_event_id=data.get("calendar_event_id"),
+        stage=stage,
+        fingerprint=Fingerprint.from_dict(data["fingerprint"]) if data.get("fingerprint") else None,
+        duplicate_candidates=data.get("duplicate_candidates", []),
+        duplicate_of=data.get("duplicate_of"),
+    )
+    if data.get("trace_id"):
+        # a resumed document keeps its correlation ID
+        job.trace_id = data["trace_id"]
+    return job
+
+
+class JobStore:
+    """Durable record of every hotfolder file and the last pipeline stage it completed.
+
+    Each stage writes the job's intermediate results (text, extraction,
+    report path, OneDrive link, event id), so after a crash or restart a
+    file resumes after its last completed stage instead of being OCR'd and
+    sent to the LLM again.
+    """
+
+    def __init__(self, cfg: JobsConfig):
+        self.cfg = cfg
+        self._conn = connect_private(cfg.path)
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+        self._active: set[str] = set()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def begin(self, path: Path, profile: str = DEFAULT_PROFILE, resume: bool = True) -> Optional[Job]:
+        """Claim ``path`` for processing and return the job to submit.
+
+        Returns ``None`` if the file is already in flight in this process
+        (e.g. reported by both the startup rescan and the watcher). An
+        unfinished record for the same file is resumed unless ``resume`` is
+        false; anything else starts from scratch.
+        """
+        key = str(path.resolve())
+        try:
+            fingerprint = file_fingerprint(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            if key in self._active:
+                return None
+            self._active.add(key)
+            row = self._conn.execute(
+                "SELECT fingerprint, stage, state, data FROM jobs WHERE path = ?", (key,)
+            ).fetchone()
+            if resume and row is not None and row[0] == fingerprint and row[2] == ACTIVE and row[1] is not None:
+                logger.info("Setze %s nach Stage %s fort", path.name, row[1])
+                return replace(job_from_dict(path, row[1], json.loads(row[3])), profile=profile)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO jobs (path, fingerprint, stage, state, data, error, updated) "
+                "VALUES (?, ?, NULL, ?, '{}', NULL, ?)",
+                (key, fingerprint, ACTIVE, time.time()),
+            )
+        return Job(source_path=path, profile=profile)
+
+    def finished(self, path: Path) -> bool:
+        """Whether exactly this file (same size and mtime) already went through all stages."""
+        try:
+            fingerprint = file_fingerprint(path)
+        except FileNotFoundError:
+            return False
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT fingerprint, state FROM jobs WHERE path = ?", (self._key(path),)
+            ).fetchone()
+        return row is not None and row[0] == fingerprint and row[1] == FINISHED
+
+    def record(self, job: Job, stage: str) -> None:
+        """Persist ``job`` as having completed ``stage``."""
+        data = json.dumps(job_to_dict(job), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET stage = ?, data = ?, updated = ? WHERE path = ?",
+                (stage, data, time.time(), self._key(job.source_path)),
+            )
+
+    def finish(self, job: Job) -> None:
+        self._close_job(job, FINISHED, None)
+
+    def fail(self, job: Job, exc: Exception) -> None:
+        self._close_job(job, FAILED, str(exc))
+
+    def release(self, job: Job) -> None:
+        """Stop tracking ``job`` in this process; its record stays resumable."""
+        with self._lock:
+            self._active.discard(self._key(job.source_path))
+
+    def counts(self) -> dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall()
+        return dict(rows)
+
+    def _close_job(self, job: Job, state: str, error: Optional[str]) -> None:
+        key = self._key(job.source_path)
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE path = ?",
+                (state, error, time.time(), key),
+            )
+            self._active.discard(key)
+
+    @staticmethod
+    def _key(path: Path) -> str:
+        return str(path.resolve())
@@ -1,38 +1,158 @@
 import json
-from datetime import datetime
-from typing import Any, Optional
+import logging
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Optional, TypeVar
 
-from openai import OpenAI
+from openai import APIConnectionError, APIStatusError, APITimeoutError, OpenAI
+
+from .config import LLMConfig
+from .metrics import LLM_TOKENS, RETRIES, span
+
+logger = logging.getLogger(__name__)
 
 SCHEMA_PROMPT = """Du bist ein Extraktionsassistent. Antworte nur mit JSON, das dem vorgegebenen Schema entspricht."""
 
+T = TypeVar("T")
+
+
+def system_prompt(schema: dict[str, Any]) -> str:
+    return f"{SCHEMA_PROMPT}\nSchema: {json.dumps(schema, ensure_ascii=False)}"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for German/English text)."""
+    return len(text) // 4 + 1
+
+
+class TokenRateLimiter:
+    """Token bucket that keeps requests below a tokens-per-minute quota across threads."""
+
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = float(tokens_per_minute)
+        self.rate = tokens_per_minute / 60.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: int) -> float:
+        """Block until ``tokens`` are available; returns the seconds waited."""
+        needed = min(float(tokens), self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= needed:
+                    self._tokens -= needed
+                    return waited
+                delay = (needed - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (APIConnectionError, APITimeoutError)):
+        return True
+    if isinstance(exc, APIStatusError):
+        return exc.status_code == 429 or exc.status_code >= 500
+    return False
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
 
 class LLMExtractor:
-    def __init__(self, api_key: str, model: str = "gpt-4o-mini", temperature: float = 0):
-        self.client = OpenAI(api_key=api_key)
+    """Long-lived, thread-safe extractor; one instance (and one pooled HTTP client) per process."""
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str = "gpt-4o-mini",
+        temperature: float = 0,
+        base_url: Optional[str] = None,
+        timeout: float = 60.0,
+        max_retries: int = 5,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        tokens_per_minute: Optional[int] = None,
+    ):
+        # retries are handled here so 429/5xx get jittered backoff and count against the limiter
+        self.client = OpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
         self.model = model
         self.temperature = temperature
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.limiter = TokenRateLimiter(tokens_per_minute) if tokens_per_minute else None
 
-    def extract(self, text: str, schema: dict[str, Any]) -> dict[str, Any]:
-        response = self.client.responses.create(
-            model=self.model,
-            temperature=self.temperature,
-            messages=[
-                {"role": "system", "content": SCHEMA_PROMPT},
-                {"role": "user", "content": text},
-            ],
-            response_format={"type": "json_object", "schema": schema},
+    @classmethod
+    def from_config(cls, llm_cfg: LLMConfig) -> "LLMExtractor":
+        api_key = os.environ.get(llm_cfg.api_key_env)
+        if not api_key:
+            raise RuntimeError("LLM aktiviert aber kein API-Key gefunden")
+        return cls(
+            api_key=api_key,
+            model=llm_cfg.model,
+            temperature=llm_cfg.temperature,
+            base_url=llm_cfg.base_url,
+            timeout=llm_cfg.timeout,
+            max_retries=llm_cfg.max_retries,
+            backoff_base=llm_cfg.backoff_base,
+            backoff_max=llm_cfg.backoff_max,
+            tokens_per_minute=llm_cfg.tokens_per_minute,
         )
-        content = response.output_parsed or {}
-        if not content:
-            content = json.loads(response.output_text)
-        return content
 
+    def close(self) -> None:
+        self.client.close()
+
+    def extract(self, text: str, schema: dict[str, Any], model: Optional[str] = None) -> dict[str, Any]:
+        """``model`` overrides the configured one, e.g. for a hotfolder profile sharing this client."""
+        model = model or self.model
+        system = system_prompt(schema)
+        tokens = estimate_tokens(system) + estimate_tokens(text)
+        if self.limiter is not None:
+            waited = self.limiter.acquire(tokens)
+            if waited:
+                logger.info("LLM-Ratenlimit: %.1fs gewartet", waited)
+        LLM_TOKENS.inc(tokens, kind="sent")
+        with span("llm.request", model=model, tokens=tokens):
+            response = self.call_with_retries(
+                lambda: self.client.chat.completions.create(
+                    model=model,
+                    temperature=self.temperature,
+                    messages=[
+                        {"role": "system", "content": system},
+                        {"role": "user", "content": text},
+                    ],
+                    response_format={"type": "json_object"},
+                )
+            )
+        return json.loads(response.choices[0].message.content or "{}")
+
+    def call_with_retries(self, call: Callable[[], T]) -> T:
+        attempt = 0
+        while True:
+            try:
+                return call()
+            except Exception as exc:  # noqa: BLE001
+                if attempt >= self.max_retries or not _is_retryable(exc):
+                    raise
+                delay = _retry_after(exc)
+                if delay is None:
+                    # full jitter: spreads concurrent workers out instead of retrying in lockstep
+                    delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+                attempt += 1
+                RETRIES.inc(service="llm")
+                logger.warning("LLM-Anfrage fehlgeschlagen (%s), Versuch %d in %.1fs", exc, attempt, delay)
+                time.sleep(delay)
 
-def parse_date(value: Optional[str]) -> Optional[datetime.date]:
-    if not value:
-        return None
-    try:
-        return datetime.fromisoformat(value).date()
-    except ValueError:
-        return None
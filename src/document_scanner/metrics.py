@@ -0,0 +1,301 @@
+import bisect
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator, Optional
+
+from .config import MetricsConfig
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+_trace_id: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("trace_id", default=None)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict[str, Any]) -> tuple[str, ...]:
+        if set(labels) != set(self.labels):
+            raise ValueError(f"{self.name}: Labels {sorted(labels)} erwartet {list(self.labels)}")
+        return tuple(str(labels[name]) for name in self.labels)
+
+    def header(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: dict[tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> float:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = self.header()
+        for key, value in values:
+            lines.append(f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self, name: str, help_text: str, labels: tuple[str, ...] = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS
+    ):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: counts per bucket (non-cumulative, last one is +Inf), sum
+        self._values: dict[tuple[str, ...], tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            counts[index] += 1
+            total[0] += value
+
+    def count(self, **labels: Any) -> int:
+        with self._lock:
+            entry = self._values.get(self._key(labels))
+            return sum(entry[0]) if entry else 0
+
+    def render(self) -> list[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total[0])) for key, (counts, total) in self._values.items())
+        lines = self.header()
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> Any:
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metrik bereits registriert: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(line for metric in metrics for line in metric.render()) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram("scanner_stage_duration_seconds", "Dauer je Pipeline-Stage und Teilschritt", ("stage",))
+)
+OCR_PAGE_SECONDS: Histogram = REGISTRY.register(
+    Histogram("scanner_ocr_page_seconds", "OCR-Dauer je Seite inkl. Vorverarbeitung")
+)
+PAGES: Counter = REGISTRY.register(Counter("scanner_pages_total", "Verarbeitete Seiten", ("method",)))
+LLM_TOKENS: Counter = REGISTRY.register(
+    Counter("scanner_llm_tokens_total", "Geschätzte LLM-Tokens (gesendet / durch Kürzung gespart)", ("kind",))
+)
+RETRIES: Counter = REGISTRY.register(Counter("scanner_retries_total", "Wiederholte Anfragen", ("service",)))
+CACHE_LOOKUPS: Counter = REGISTRY.register(
+    Counter("scanner_cache_lookups_total", "Cache-Abfragen", ("cache", "result"))
+)
+QUEUE_DEPTH: Gauge = REGISTRY.register(Gauge("scanner_queue_depth", "Wartende Jobs vor einer Stage", ("stage",)))
+FAILURES: Counter = REGISTRY.register(Counter("scanner_failures_total", "Fehlgeschlagene Jobs", ("stage",)))
+DUPLICATES: Counter = REGISTRY.register(
+    Counter("scanner_duplicates_total", "Übersprungene Duplikate", ("match",))
+)
+DOCUMENTS: Counter = REGISTRY.register(Counter("scanner_documents_total", "Jobs, die alle Stages durchlaufen haben"))
+PROFILE_BACKLOG: Gauge = REGISTRY.register(
+    Gauge("scanner_profile_backlog", "Dateien je Hotfolder-Profil, die auf die Pipeline warten", ("profile",))
+)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+@contextmanager
+def trace_context(trace_id: Optional[str]) -> Iterator[str]:
+    """Attach ``trace_id`` (or a new one) to everything logged and traced in this block."""
+    token = _trace_id.set(trace_id or new_trace_id())
+    try:
+        yield _trace_id.get()
+    finally:
+        _trace_id.reset(token)
+
+
+class _TraceWriter:
+    def __init__(self):
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+            self._file = path.open("a", encoding="utf-8", buffering=1)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def write(self, event: dict[str, Any]) -> None:
+        if self._file is None:
+            return
+        line = json.dumps(event, ensure_ascii=False, default=str)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(line + "\n")
+
+
+_traces = _TraceWriter()
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[dict[str, Any]]:
+    """Time a step: observed in ``scanner_stage_duration_seconds`` and written as a trace span.
+
+    The yielded dict can be filled with further attributes while the step runs.
+    """
+    start_wall = time.time()
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield attributes
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        seconds = time.perf_counter() - start
+        STAGE_SECONDS.observe(seconds, stage=name)
+        _traces.write(
+            {
+                "trace_id": _trace_id.get(),
+                "span": name,
+                "start": round(start_wall, 6),
+                "seconds": round(seconds, 6),
+                "status": status,
+                **attributes,
+            }
+        )
+
+
+class TraceIdFilter(logging.Filter):
+    """Adds ``%(trace_id)s`` to log records, ``-`` outside of a document."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.trace_id = _trace_id.get() or "-"
+        return True
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MetricsServer:
+    """Serves ``/metrics`` in the Prometheus text format and writes trace spans as JSON lines."""
+
+    def __init__(self, cfg: MetricsConfig):
+        self.cfg = cfg
+        self._server: Optional[ThreadingHTTPServer] = None
+
+    def start(self) -> "MetricsServer":
+        if self.cfg.trace_path is not None:
+            _traces.open(self.cfg.trace_path)
+        if self.cfg.port is not None:
+            self._server = ThreadingHTTPServer((self.cfg.host, self.cfg.port), _MetricsHandler)
+            threading.Thread(target=self._server.serve_forever, name="metrics", daemon=True).start()
+            logger.info("Metriken unter http://%s:%d/metrics", self.cfg.host, self.port)
+        return self
+
+    @property
+    def port(self) -> Optional[int]:
+        return self._server.server_address[1] if self._server is not None else None
+
+    def close(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        _traces.close()
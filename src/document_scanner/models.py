@@ -1,7 +1,11 @@
+import uuid
 from dataclasses import dataclass, field
-from datetime import date
+from datetime import date, datetime
 from pathlib import Path
-from typing import Optional
+from typing import TYPE_CHECKING, Any, Optional
+
+if TYPE_CHECKING:
+    from .document import SourceDocument
 
 
 @dataclass
@@ -19,6 +23,117 @@ class ExtractedData:
     confidence: dict[str, float] = field(default_factory=dict)
     summary: list[str] = field(default_factory=list)
 
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any]) -> "ExtractedData":
+        """Build from a payload shaped like ``config/llm_schema.json``."""
+        return cls(
+            document_type=raw.get("document_type", "Sonstiges"),
+            issuer=raw.get("issuer", "Unbekannt"),
+            document_date=_parse_date(raw.get("document_date")),
+            amount_total=raw.get("amount_total"),
+            currency=raw.get("currency", "EUR"),
+            due_date=_parse_date(raw.get("due_date")),
+            iban=raw.get("iban"),
+            invoice_number=raw.get("invoice_number"),
+            is_tax_relevant=bool(raw.get("is_tax_relevant", False)),
+            tax_category=raw.get("tax_category"),
+            confidence=raw.get("confidence", {}),
+            summary=raw.get("summary", []),
+        )
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "document_type": self.document_type,
+            "issuer": self.issuer,
+            "document_date": self.document_date.isoformat() if self.document_date else None,
+            "amount_total": self.amount_total,
+            "currency": self.currency,
+            "due_date": self.due_date.isoformat() if self.due_date else None,
+            "iban": self.iban,
+            "invoice_number": self.invoice_number,
+            "is_tax_relevant": self.is_tax_relevant,
+            "tax_category": self.tax_category,
+            "confidence": dict(self.confidence),
+            "summary": list(self.summary),
+        }
+
+
+def _parse_date(value: Optional[str]) -> Optional[date]:
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return None
+
+
+@dataclass
+class PageText:
+    index: int
+    method: str  # "text" (PDF text layer) or "ocr"
+    text: str
+    seconds: float
+    # OCR word boxes as (word, x0, y0, x1, y1), relative to the page size with the origin top left
+    words: list[tuple[str, float, float, float, float]] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "index": self.index,
+            "method": self.method,
+            "text": self.text,
+            "seconds": self.seconds,
+            "words": [list(word) for word in self.words],
+        }
+
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any]) -> "PageText":
+        return cls(
+            index=raw["index"],
+            method=raw["method"],
+            text=raw["text"],
+            seconds=raw["seconds"],
+            words=[tuple(word) for word in raw.get("words", [])],
+        )
+
+
+@dataclass
+class Fingerprint:
+    sha256: str  # exact file content
+    page_count: int
+    # perceptual difference hashes of the first rendered pages
+    page_hashes: list[int] = field(default_factory=list)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "sha256": self.sha256,
+            "page_count": self.page_count,
+            "page_hashes": [f"{value:x}" for value in self.page_hashes],
+        }
+
+    @classmethod
+    def from_dict(cls, raw: dict[str, Any]) -> "Fingerprint":
+        return cls(
+            sha256=raw["sha256"],
+            page_count=raw["page_count"],
+            page_hashes=[int(value, 16) for value in raw.get("page_hashes", [])],
+        )
+
+
+@dataclass
+class TextExtraction:
+    pages: list[PageText] = field(default_factory=list)
+
+    @property
+    def text(self) -> str:
+        return "\n".join(page.text for page in self.pages).strip()
+
+    @property
+    def ocr_pages(self) -> int:
+        return sum(1 for page in self.pages if page.method == "ocr")
+
+    def timing_summary(self) -> str:
+        return ", ".join(f"S{page.index + 1}:{page.method}={page.seconds:.2f}s" for page in self.pages)
+
 
 @dataclass
 class ProcessingResult:
@@ -27,3 +142,22 @@ class ProcessingResult:
     new_filename: str
     one_drive_path: str
     calendar_event_id: Optional[str]
+
+
+@dataclass
+class Job:
+    source_path: Path
+    text: Optional[str] = None
+    pages: list[PageText] = field(default_factory=list)
+    document: Optional["SourceDocument"] = None
+    extracted: Optional[ExtractedData] = None
+    report_path: Optional[Path] = None
+    onedrive_link: Optional[str] = None
+    calendar_event_id: Optional[str] = None
+    stage: Optional[str] = None  # last completed pipeline stage
+    fingerprint: Optional[Fingerprint] = None
+    duplicate_candidates: list[str] = field(default_factory=list)  # similar-looking documents, by SHA-256
+    duplicate_of: Optional[str] = None  # report/link of the document this one duplicates
+    trace_id: str = field(default_factory=lambda: uuid.uuid4().hex[:16])  # correlation ID in logs and traces
+    profile: str = "default"  # hotfolder profile the file arrived in, see ScannerConfig.profile_configs
+    keep_source: bool = False  # reprocessed from outside the hotfolder: the original is not moved
@@ -1,35 +1,435 @@
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import re
+import threading
+import time
+import xml.etree.ElementTree as ET
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from dataclasses import asdict, astuple, dataclass, field
 from pathlib import Path
-from typing import Optional
+from typing import Iterable, Iterator, Optional, Union
 
-import pdfplumber
 import pytesseract
-from PIL import Image
+from PIL import Image, ImageSequence
 
+from .config import OCRConfig, PreprocessConfig
+from .document import SourceDocument
+from .metrics import OCR_PAGE_SECONDS, PAGES, STAGE_SECONDS, span
+from .models import PageText, TextExtraction
+from .preprocess import ImagePreprocessor
 
-def extract_text_from_image(path: Path, language: str = "deu", tesseract_cmd: Optional[str] = None) -> str:
+logger = logging.getLogger(__name__)
+
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".tiff"}
+
+_BBOX = re.compile(r"bbox (\d+) (\d+) (\d+) (\d+)")
+
+Word = tuple[str, float, float, float, float]
+
+
+def _init_worker() -> None:
+    # parallelism comes from the worker processes; tesseract's own OpenMP threads would oversubscribe the CPUs
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def settings_key(ocr_cfg: OCRConfig) -> str:
+    """Short hash of every OCR setting that changes the recognised text, for cache keys."""
+    settings = asdict(ocr_cfg)
+    # throughput and logging only
+    for name in ("workers", "pages_in_flight_per_worker"):
+        del settings[name]
+    del settings["preprocess"]["measure_savings"]
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def create_ocr_executor(ocr_cfg: OCRConfig) -> Executor:
+    """Process pool for page-level OCR, shared by all documents in flight."""
+    return ProcessPoolExecutor(
+        max_workers=max(1, ocr_cfg.workers),
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+    )
+
+
+def ocr_image(image: Image.Image, language: str = "deu", tesseract_cmd: Optional[str] = None) -> str:
     if tesseract_cmd:
         pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
-    image = Image.open(path)
     return pytesseract.image_to_string(image, lang=language)
 
 
-def pdf_to_images(path: Path, max_pages: int = 5) -> list[Image.Image]:
-    images: list[Image.Image] = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages[:max_pages]:
-            images.append(page.to_image(resolution=300).original)
-    return images
-
-
-def extract_text_from_pdf(path: Path, language: str = "deu", tesseract_cmd: Optional[str] = None) -> str:
-    text_parts: list[str] = []
-    with pdfplumber.open(path) as pdf:
-        for page in pdf.pages:
-            page_text = page.extract_text() or ""
-            text_parts.append(page_text)
-    text = "\n".join(text_parts).strip()
-    if text:
-        return text
-    images = pdf_to_images(path)
-    ocr_results = [pytesseract.image_to_string(img, lang=language) for img in images]
-    return "\n".join(ocr_results)
+def parse_hocr(hocr: Union[bytes, str]) -> list[Word]:
+    """Word boxes from tesseract hOCR, relative to the page size (origin top left)."""
+    root = ET.fromstring(hocr)
+    words: list[Word] = []
+    width = height = None
+    for element in root.iter():
+        css_class = element.get("class")
+        if css_class not in ("ocr_page", "ocrx_word"):
+            continue
+        match = _BBOX.search(element.get("title", ""))
+        if match is None:
+            continue
+        x0, y0, x1, y1 = (int(value) for value in match.groups())
+        if css_class == "ocr_page":
+            width, height = max(x1, 1), max(y1, 1)
+            continue
+        text = "".join(element.itertext()).strip()
+        if text and width:
+            words.append((text, x0 / width, y0 / height, x1 / width, y1 / height))
+    return words
+
+
+def ocr_image_with_words(
+    image: Image.Image, language: str = "deu", tesseract_cmd: Optional[str] = None
+) -> tuple[str, list[Word]]:
+    """Plain text and word boxes from a single tesseract run (txt and hocr output together)."""
+    if tesseract_cmd:
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+    text, hocr = pytesseract.run_and_get_multiple_output(image, extensions=["txt", "hocr"], lang=language)
+    return text, parse_hocr(hocr)
+
+
+class PytesseractEngine:
+    """Runs the tesseract CLI per page (temp files, model loaded on every call)."""
+
+    name = "pytesseract"
+
+    def __init__(self, language: str, tesseract_cmd: Optional[str] = None):
+        self.language = language
+        self.tesseract_cmd = tesseract_cmd
+
+    def recognize(self, image: Image.Image, with_words: bool = False) -> tuple[str, list[Word]]:
+        if with_words:
+            return ocr_image_with_words(image, self.language, self.tesseract_cmd)
+        return ocr_image(image, self.language, self.tesseract_cmd), []
+
+    def close(self) -> None:
+        pass
+
+
+class TesserocrEngine:
+    """Long-lived tesseract instance via the C API: the language model is loaded once, images stay in memory."""
+
+    name = "tesserocr"
+
+    def __init__(self, language: str):
+        import tesserocr
+
+        self.language = language
+        self._api = tesserocr.PyTessBaseAPI(lang=language)
+
+    def recognize(self, image: Image.Image, with_words: bool = False) -> tuple[str, list[Word]]:
+        self._api.SetImage(image)
+        text = self._api.GetUTF8Text()
+        # hOCR is rendered from the same recognition result, tesseract does not run twice
+        words = parse_hocr(self._api.GetHOCRText(0).strip()) if with_words else []
+        return text, words
+
+    def close(self) -> None:
+        self._api.End()
+
+
+OcrEngine = Union[PytesseractEngine, TesserocrEngine]
+ENGINES = ("auto", "tesserocr", "pytesseract")
+
+
+def create_engine(ocr_cfg: OCRConfig) -> OcrEngine:
+    if ocr_cfg.engine not in ENGINES:
+        raise ValueError(f"Unbekannte OCR-Engine: {ocr_cfg.engine}")
+    if ocr_cfg.engine != "pytesseract":
+        try:
+            return TesserocrEngine(ocr_cfg.language)
+        except (ImportError, RuntimeError) as exc:
+            if ocr_cfg.engine == "tesserocr":
+                raise RuntimeError(f"tesserocr nicht nutzbar: {exc}") from None
+            logger.info("tesserocr nicht verfügbar (%s), nutze pytesseract", exc)
+    return PytesseractEngine(ocr_cfg.language, ocr_cfg.tesseract_cmd)
+
+
+_engines = threading.local()
+
+
+def _get_engine(ocr_cfg: OCRConfig) -> OcrEngine:
+    # one engine per OCR worker (process or thread) and language, created on its first page; the
+    # workers are shared by all hotfolder profiles, so alternating languages must not reload models
+    key = (ocr_cfg.engine, ocr_cfg.language, ocr_cfg.tesseract_cmd)
+    engines = getattr(_engines, "engines", None)
+    if engines is None:
+        engines = _engines.engines = {}
+    engine = engines.get(key)
+    if engine is None:
+        engine = engines[key] = create_engine(ocr_cfg)
+    return engine
+
+
+@dataclass
+class OcrResult:
+    text: str
+    seconds: float
+    words: list[Word] = field(default_factory=list)
+    preprocess_seconds: float = 0.0
+    pixels_before: int = 0
+    pixels_after: int = 0
+    raw_seconds: Optional[float] = None  # OCR time of the unprocessed image, if measured
+
+
+def _get_preprocessor(cfg: PreprocessConfig) -> ImagePreprocessor:
+    # like the engines one per OCR worker and setting: its scratch buffers are reused across pages
+    # but must never be shared by two threads
+    key = astuple(cfg)
+    preprocessors = getattr(_engines, "preprocessors", None)
+    if preprocessors is None:
+        preprocessors = _engines.preprocessors = {}
+    preprocessor = preprocessors.get(key)
+    if preprocessor is None:
+        preprocessor = preprocessors[key] = ImagePreprocessor(cfg)
+    return preprocessor
+
+
+def _ocr_image_timed(image: Image.Image, ocr_cfg: OCRConfig, dpi: Optional[float] = None) -> OcrResult:
+    # pytesseract's exceptions cannot be unpickled and would break the whole pool
+    try:
+        return _ocr_page(image, ocr_cfg, dpi)
+    except Exception as exc:  # noqa: BLE001
+        raise RuntimeError(f"OCR fehlgeschlagen: {exc}") from None
+
+
+def _ocr_page(image: Image.Image, ocr_cfg: OCRConfig, dpi: Optional[float]) -> OcrResult:
+    engine = _get_engine(ocr_cfg)
+    result = OcrResult(text="", seconds=0.0, pixels_before=image.width * image.height)
+    prepared = None
+    if ocr_cfg.preprocess.enabled:
+        if ocr_cfg.preprocess.measure_savings:
+            start = time.perf_counter()
+            engine.recognize(image)
+            result.raw_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        prepared = _get_preprocessor(ocr_cfg.preprocess).prepare(image, dpi)
+        result.preprocess_seconds = time.perf_counter() - start
+        image = prepared.image
+    result.pixels_after = image.width * image.height
+
+    start = time.perf_counter()
+    result.text, words = engine.recognize(image, with_words=ocr_cfg.searchable_output)
+    if prepared is not None:
+        words = [(word, *prepared.map_box(*box)) for word, *box in words]
+    result.words = words
+    result.seconds = time.perf_counter() - start + result.preprocess_seconds
+    return result
+
+
+def _image_dpi(image: Image.Image, default: Optional[float]) -> Optional[float]:
+    dpi = image.info.get("dpi", (None,))[0]
+    return float(dpi) if dpi else default
+
+
+def _ocr_images(
+    images: Iterable[Image.Image],
+    ocr_cfg: OCRConfig,
+    executor: Optional[Executor],
+    dpi: Optional[float] = None,
+) -> list[OcrResult]:
+    """OCR pages in order while holding at most a few rendered pages in memory.
+
+    ``images`` may be a generator: the next page is only pulled once fewer
+    than ``workers * pages_in_flight_per_worker`` pages are queued, and
+    every image is closed as soon as its result is in, so memory stays flat
+    however long the document is. ``dpi`` applies to images without own
+    DPI information.
+    """
+    results: list[OcrResult] = []
+    with span("ocr") as attributes:
+        if executor is None:
+            for image in images:
+                results.append(_ocr_image_timed(image, ocr_cfg, _image_dpi(image, dpi)))
+                image.close()
+        else:
+            limit = max(1, ocr_cfg.workers * ocr_cfg.pages_in_flight_per_worker)
+            pending: deque[tuple[Future, Image.Image]] = deque()
+            for image in images:
+                if len(pending) >= limit:
+                    results.append(_collect(*pending.popleft()))
+                pending.append((executor.submit(_ocr_image_timed, image, ocr_cfg, _image_dpi(image, dpi)), image))
+            while pending:
+                results.append(_collect(*pending.popleft()))
+        attributes["pages"] = len(results)
+    # the workers are separate processes; their timings are recorded here
+    for result in results:
+        OCR_PAGE_SECONDS.observe(result.seconds)
+    PAGES.inc(len(results), method="ocr")
+    return results
+
+
+def _collect(future: Future, image: Image.Image) -> OcrResult:
+    try:
+        return future.result()
+    finally:
+        # closed only now: the pool pickles the image in a background thread after submit()
+        image.close()
+
+
+def _log_preprocessing(name: str, results: list[OcrResult]) -> None:
+    processed = [r for r in results if r.pixels_after != r.pixels_before or r.preprocess_seconds]
+    if not processed:
+        return
+    before = sum(r.pixels_before for r in processed)
+    after = sum(r.pixels_after for r in processed)
+    message = "Vorverarbeitung %s: %.1f -> %.1f Megapixel in %.2fs" % (
+        name,
+        before / 1e6,
+        after / 1e6,
+        sum(r.preprocess_seconds for r in processed),
+    )
+    raw = [r for r in processed if r.raw_seconds is not None]
+    if raw:
+        saved = sum(r.raw_seconds - r.seconds for r in raw)
+        message += ", OCR %.2fs schneller als mit Rohbild" % saved
+    logger.info(message)
+
+
+def extract_text_from_image(
+    path: Path,
+    ocr_cfg: Optional[OCRConfig] = None,
+    executor: Optional[Executor] = None,
+) -> TextExtraction:
+    ocr_cfg = ocr_cfg or OCRConfig()
+    with Image.open(path) as image:
+        # one frame of a long multi-page TIFF at a time
+        frames = (frame.copy() for frame in ImageSequence.Iterator(image))
+        results = _ocr_images(frames, ocr_cfg, executor)
+    _log_preprocessing(path.name, results)
+    return TextExtraction(
+        pages=[
+            PageText(index=index, method="ocr", text=result.text, seconds=result.seconds, words=result.words)
+            for index, result in enumerate(results)
+        ]
+    )
+
+
+def page_dpi(width: float, height: float, dpi: float, max_megapixels: Optional[float]) -> float:
+    """Render resolution for a page of ``width`` x ``height`` points.
+
+    Normal pages get ``dpi``; oversized pages (plans, A3 and larger scans)
+    get a lower one so no single page exceeds ``max_megapixels``.
+    """
+    if not max_megapixels:
+        return dpi
+    pixels = (width / 72 * dpi) * (height / 72 * dpi)
+    limit = max_megapixels * 1e6
+    if pixels <= limit:
+        return dpi
+    return dpi * math.sqrt(limit / pixels)
+
+
+def render_pages(
+    document: SourceDocument,
+    indices: Iterable[int],
+    dpi: float,
+    max_megapixels: Optional[float] = None,
+    seconds: Optional[dict[int, float]] = None,
+) -> Iterator[Image.Image]:
+    """Render ``indices`` lazily; the render time per page goes into ``seconds``."""
+    for index in indices:
+        start = time.perf_counter()
+        image = document.render_page(index, dpi=page_dpi(*document.page_size(index), dpi, max_megapixels))
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, stage="ocr.render")
+        if seconds is not None:
+            seconds[index] = elapsed
+        yield image
+
+
+def page_needs_ocr(text: str, width: float, height: float, ocr_cfg: OCRConfig) -> bool:
+    """Decide per page whether the PDF text layer is good enough or the page has to be OCR'd.
+
+    Scanned pages have no (or only a stray scanner header) text layer, so the
+    density of visible characters per square inch is tiny. Fonts without a
+    Unicode mapping produce replacement or control characters, which lowers
+    the glyph coverage.
+    """
+    glyphs = [c for c in text if not c.isspace()]
+    if not glyphs:
+        return True
+    mapped = sum(1 for c in glyphs if c.isprintable() and c not in "\ufffd\ufffe")
+    if mapped / len(glyphs) < ocr_cfg.min_glyph_coverage:
+        return True
+    area_sq_inch = max(width * height / (72 * 72), 1e-6)
+    return mapped / area_sq_inch < ocr_cfg.min_chars_per_sq_inch
+
+
+def words_outside(words: list[Word], boxes: list[tuple[float, float, float, float]]) -> list[Word]:
+    """OCR words whose centre lies outside ``boxes``, so the invisible layer never repeats the page's own text."""
+
+    def covered(x: float, y: float) -> bool:
+        return any(x0 <= x <= x1 and y0 <= y <= y1 for x0, y0, x1, y1 in boxes)
+
+    return [word for word in words if not covered((word[1] + word[3]) / 2, (word[2] + word[4]) / 2)]
+
+
+def extract_text_from_pdf(
+    document: SourceDocument,
+    ocr_cfg: Optional[OCRConfig] = None,
+    executor: Optional[Executor] = None,
+) -> TextExtraction:
+    ocr_cfg = ocr_cfg or OCRConfig()
+    pages: list[PageText] = []
+    ocr_indices: list[int] = []
+    for index in range(len(document)):
+        start = time.perf_counter()
+        page_text = document.page_text(index)
+        seconds = time.perf_counter() - start
+        if ocr_cfg.enabled and page_needs_ocr(page_text, *document.page_size(index), ocr_cfg):
+            ocr_indices.append(index)
+        pages.append(PageText(index=index, method="text", text=page_text, seconds=seconds))
+    PAGES.inc(len(pages) - len(ocr_indices), method="text")
+    if ocr_indices:
+        dpi = ocr_cfg.preprocess.target_dpi if ocr_cfg.preprocess.enabled and ocr_cfg.preprocess.target_dpi else 300
+        render_seconds: dict[int, float] = {}
+        images = render_pages(document, ocr_indices, dpi, ocr_cfg.max_page_megapixels, render_seconds)
+        results = _ocr_images(images, ocr_cfg, executor)
+        _log_preprocessing(document.path.name, results)
+        for index, result in zip(ocr_indices, results):
+            words = result.words
+            if words and pages[index].text.strip():
+                # sparse digital page: only overlay what the text layer lacks (e.g. a scanned stamp or logo)
+                words = words_outside(words, document.text_boxes(index))
+            pages[index] = PageText(
+                index=index,
+                method="ocr",
+                text=result.text,
+                seconds=pages[index].seconds + render_seconds.get(index, 0.0) + result.seconds,
+                words=words,
+            )
+    return TextExtraction(pages=pages)
+
+
+def extract_text(
+    path: Path,
+    ocr_cfg: OCRConfig,
+    executor: Optional[Executor] = None,
+    document: Optional[SourceDocument] = None,
+) -> TextExtraction:
+    suffix = path.suffix.lower()
+    if suffix in IMAGE_SUFFIXES:
+        if not ocr_cfg.enabled:
+            raise ValueError(f"OCR deaktiviert, Bild kann nicht gelesen werden: {path.name}")
+        return extract_text_from_image(path, ocr_cfg, executor=executor)
+    if suffix == ".pdf":
+        if document is None:
+            with SourceDocument(path) as document:
+                return extract_text(path, ocr_cfg, executor, document)
+        extraction = extract_text_from_pdf(document, ocr_cfg, executor=executor)
+        logger.info(
+            "Text aus %s: %d Seiten, davon %d per OCR (%s)",
+            path.name,
+            len(extraction.pages),
+            extraction.ocr_pages,
+            extraction.timing_summary(),
+        )
+        return extraction
+    raise ValueError(f"Nicht unterstütztes Format: {suffix}")
@@ -0,0 +1,400 @@
+import logging
+import os
+import queue
+import threading
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Any, Callable, Optional
+
+from .config import HotfolderConfig, ScannerConfig
+from .duplicates import DuplicateIndex, DuplicateMatch
+from .graph import GraphClient
+from .jobs import JobStore
+from .metrics import DOCUMENTS, DUPLICATES, FAILURES, QUEUE_DEPTH, span, trace_context
+from .models import Job
+from .processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+@dataclass
+class Stage:
+    """One pipeline step, run by ``workers`` threads.
+
+    ``func`` returns the job for the next stage or ``None`` to drop it.
+    CPU-bound work (OCR) is handed to its own process pool by ``func``.
+    """
+
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+
+
+class Pipeline:
+    """Runs jobs through a chain of stages, each with its own worker pool.
+
+    Stages are connected by bounded queues; a full queue blocks the producer,
+    so a slow stage throttles everything upstream instead of buffering
+    unbounded work in memory.
+    """
+
+    def __init__(
+        self,
+        stages: list[Stage],
+        queue_size: int = 16,
+        on_error: Optional[Callable[[Any, Exception], None]] = None,
+        on_drop: Optional[Callable[[Any], None]] = None,
+    ):
+        if not stages:
+            raise ValueError("Pipeline braucht mindestens eine Stage")
+        self.stages = stages
+        self.on_error = on_error
+        self.on_drop = on_drop
+        self._draining = True
+        self._queues: list[queue.Queue] = [queue.Queue(maxsize=max(1, queue_size)) for _ in stages]
+        self._threads: list[list[threading.Thread]] = [[] for _ in stages]
+        self._started = False
+
+    def start(self) -> "Pipeline":
+        for index, stage in enumerate(self.stages):
+            for n in range(max(1, stage.workers)):
+                thread = threading.Thread(
+                    target=self._worker,
+                    args=(index,),
+                    name=f"pipeline-{stage.name}-{n}",
+                    daemon=True,
+                )
+                thread.start()
+                self._threads[index].append(thread)
+        self._started = True
+        logger.info(
+            "Pipeline gestartet: %s",
+            ", ".join(f"{s.name}={max(1, s.workers)}" for s in self.stages),
+        )
+        return self
+
+    def submit(self, job: Any, timeout: Optional[float] = None) -> None:
+        """Queue a job for the first stage, blocking while the queue is full."""
+        if not self._started:
+            raise RuntimeError("Pipeline wurde nicht gestartet")
+        self._queues[0].put(job, timeout=timeout)
+        QUEUE_DEPTH.set(self._queues[0].qsize(), stage=self.stages[0].name)
+
+    def shutdown(self, drain: bool = True) -> None:
+        """Stop the workers.
+
+        With ``drain`` every queued job first runs through all stages.
+        Otherwise only the jobs a worker is busy with finish their current
+        stage; everything still queued is handed to ``on_drop`` instead.
+        """
+        if not self._started:
+            return
+        if not drain:
+            self._draining = False
+            for inbox in self._queues:
+                self._drop_queued(inbox)
+        for index, stage in enumerate(self.stages):
+            for _ in self._threads[index]:
+                self._queues[index].put(_STOP)
+            for thread in self._threads[index]:
+                thread.join()
+        for inbox in self._queues:
+            self._drop_queued(inbox)  # put by a worker that finished after the clean-up above
+        self._started = False
+
+    def _drop_queued(self, inbox: queue.Queue) -> None:
+        while True:
+            try:
+                job = inbox.get_nowait()
+            except queue.Empty:
+                return
+            if job is not _STOP:
+                self._drop(job)
+
+    def _drop(self, job: Any) -> None:
+        if self.on_drop is not None:
+            try:
+                self.on_drop(job)
+            except Exception:  # noqa: BLE001
+                logger.exception("Verwerfen eines Jobs fehlgeschlagen")
+
+    def _worker(self, index: int) -> None:
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        outbox = self._queues[index + 1] if index + 1 < len(self._queues) else None
+        next_name = self.stages[index + 1].name if outbox is not None else None
+        while True:
+            job = inbox.get()
+            if job is _STOP:
+                return
+            if not self._draining:
+                self._drop(job)
+                continue
+            QUEUE_DEPTH.set(inbox.qsize(), stage=stage.name)
+            with trace_context(getattr(job, "trace_id", None)):
+                try:
+                    with span(stage.name):
+                        result = stage.func(job)
+                except Exception as exc:  # noqa: BLE001
+                    FAILURES.inc(stage=stage.name)
+                    logger.exception("Stage %s fehlgeschlagen: %s", stage.name, exc)
+                    if self.on_error is not None:
+                        try:
+                            self.on_error(job, exc)
+                        except Exception:  # noqa: BLE001
+                            logger.exception("Fehlerbehandlung für Stage %s fehlgeschlagen", stage.name)
+                    continue
+            if result is None:
+                continue
+            if outbox is None:
+                DOCUMENTS.inc()
+            elif not self._draining:
+                self._drop(result)  # its progress so far is kept by the job store, if any
+            else:
+                outbox.put(result)
+                QUEUE_DEPTH.set(outbox.qsize(), stage=next_name)
+
+
+def move_into(source: Path, directory: Path) -> Path:
+    """Move ``source`` into ``directory`` without replacing a file of the same name.
+
+    A name that is taken gets a ``__vN`` suffix, as the report names do.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    target = directory / source.name
+    if target.exists() and target.samefile(source):
+        return target
+    version = 1
+    while True:
+        try:
+            os.link(source, target)  # unlike rename, never replaces an existing file
+        except FileExistsError:
+            pass
+        except OSError:
+            # no hard links on this file system (e.g. some network shares)
+            if not target.exists():
+                source.rename(target)
+                return target
+        else:
+            source.unlink()
+            return target
+        version += 1
+        target = directory / f"{source.stem}__v{version}{source.suffix}"
+
+
+def archive_job(job: Job, hotfolder: HotfolderConfig) -> Job:
+    if not job.keep_source:
+        move_into(job.source_path, hotfolder.archive_dir)
+    return job
+
+
+def fail_job(
+    job: Job,
+    exc: Exception,
+    hotfolder: HotfolderConfig,
+    store: Optional[JobStore] = None,
+    duplicates: Optional[DuplicateIndex] = None,
+) -> None:
+    if job.document is not None:
+        job.document.close()
+    if store is not None:
+        store.fail(job, exc)
+    if duplicates is not None:
+        duplicates.forget(job)
+    if not job.keep_source:
+        move_into(job.source_path, hotfolder.failed_dir)
+
+
+def _tracked(stage: Stage, order: list[str], store: JobStore) -> Stage:
+    """Skip ``stage`` for jobs resumed past it and record the job once it completes."""
+    position = order.index(stage.name)
+
+    def run(job: Job) -> Optional[Job]:
+        if job.stage in order and order.index(job.stage) >= position:
+            return job
+        result = stage.func(job)
+        if result is None:
+            store.release(job)
+            return None
+        result = replace(result, stage=stage.name)
+        if position == len(order) - 1:
+            store.finish(result)
+        else:
+            store.record(result, stage.name)
+        return result
+
+    return replace(stage, func=run)
+
+
+def _unless_duplicate(stage: Stage) -> Stage:
+    """Pass duplicates through ``stage`` untouched, straight on to the archive."""
+
+    def run(job: Job) -> Optional[Job]:
+        if job.duplicate_of is not None:
+            return job
+        return stage.func(job)
+
+    return replace(stage, func=run)
+
+
+def _notify(stage: Stage, on_done: Callable[[Job], None]) -> Stage:
+    def run(job: Job) -> Optional[Job]:
+        result = stage.func(job)
+        if result is not None:
+            on_done(result)
+        return result
+
+    return replace(stage, func=run)
+
+
+def _duplicate(job: Job, match: DuplicateMatch, kind: str) -> Job:
+    DUPLICATES.inc(match=kind)
+    logger.info(
+        "%s ist ein Duplikat von %s (%s), überspringe Verarbeitung",
+        job.source_path.name,
+        match.source_name,
+        match.reference,
+    )
+    return replace(job, duplicate_of=match.reference)
+
+
+def build_pipeline(
+    cfg: ScannerConfig,
+    processor: DocumentProcessor,
+    graph: GraphClient,
+    first_stage: str = "dedupe",
+    store: Optional[JobStore] = None,
+    duplicates: Optional[DuplicateIndex] = None,
+    processors: Optional[dict[str, DocumentProcessor]] = None,
+    dry_run: bool = False,
+    on_done: Optional[Callable[[Job], None]] = None,
+    on_failed: Optional[Callable[[Job, Exception], None]] = None,
+) -> Pipeline:
+    """Wire the document stages: dedupe, text, LLM, report, upload, calendar, archive.
+
+    ``first_stage`` lets callers that already have part of the job (e.g. the
+    batch mode, which brings text and extraction) skip the earlier stages.
+    With a ``store`` every completed stage is persisted and jobs resumed
+    from it skip the stages they already finished. With ``duplicates``,
+    documents already processed once skip everything up to the archive.
+    ``processors`` maps hotfolder profiles to their processor (see
+    :meth:`DocumentProcessor.for_profile`); each job is handled by the one
+    of its ``profile``, all of them sharing the stages' worker pools. With
+    ``dry_run`` the upload, calendar and archive stages are left out: nothing
+    is sent to Graph and the originals, failed ones included, stay in place.
+    ``on_done`` is called with every job that passed the last stage,
+    ``on_failed`` after a failed job has been handled.
+    """
+    workers = cfg.pipeline
+
+    def processor_for(job: Job) -> DocumentProcessor:
+        return processors[job.profile] if processors else processor
+
+    def hotfolder_for(job: Job) -> HotfolderConfig:
+        return processors[job.profile].cfg.hotfolder if processors else cfg.hotfolder
+
+    def dedupe_stage(job: Job) -> Job:
+        if duplicates is None:
+            return job
+        document = processor_for(job).open_document(job.source_path)
+        try:
+            fingerprint = duplicates.fingerprint(job.source_path, document)
+            match, candidates = duplicates.claim(
+                fingerprint, job.source_path.name, job.profile, owner=job.trace_id
+            )
+        except Exception:
+            if document is not None:
+                document.close()
+            raise
+        if match is None:
+            # the text stage continues with the already opened document
+            return replace(job, fingerprint=fingerprint, duplicate_candidates=candidates, document=document)
+        if document is not None:
+            document.close()
+        return _duplicate(replace(job, fingerprint=fingerprint), match, "exact")
+
+    def text_stage(job: Job) -> Job:
+        logger.info("Verarbeite %s", job.source_path)
+        processor = processor_for(job)
+        document = job.document if job.document is not None else processor.open_document(job.source_path)
+        try:
+            sha256 = job.fingerprint.sha256 if job.fingerprint is not None else None
+            extraction = processor.extract_text(job.source_path, document, sha256=sha256)
+        except Exception:
+            if document is not None:
+                document.close()
+            raise
+        job = replace(job, text=extraction.text, pages=extraction.pages, document=document)
+        if duplicates is not None and job.duplicate_candidates:
+            # looking alike is not enough: the numbers in the text have to match as well
+            match = duplicates.confirm(job.duplicate_candidates, job.text, job.profile)
+            if match is not None:
+                duplicates.forget(job)
+                if document is not None:
+                    document.close()
+                return _duplicate(replace(job, document=None), match, "similar")
+        return job
+
+    def llm_stage(job: Job) -> Job:
+        pages = [page.text for page in job.pages] or None
+        return replace(job, extracted=processor_for(job).extract_data(job.text or "", pages))
+
+    def report_stage(job: Job) -> Job:
+        report_path = processor_for(job).write_report(job.source_path, job.extracted, job.document, job.pages)
+        if job.document is not None:
+            job.document.close()
+        return replace(job, report_path=report_path, document=None)
+
+    def upload_stage(job: Job) -> Job:
+        return replace(job, onedrive_link=processor_for(job).upload(graph, job.report_path, job.extracted))
+
+    def calendar_stage(job: Job) -> Job:
+        event_id = processor_for(job).create_calendar_event(graph, job.extracted, job.onedrive_link)
+        return replace(job, calendar_event_id=event_id)
+
+    def archive_stage(job: Job) -> Job:
+        job = archive_job(job, hotfolder_for(job))
+        if duplicates is not None:
+            duplicates.complete(job)
+        return job
+
+    stages = [
+        Stage("dedupe", dedupe_stage, workers.dedupe_workers),
+        _unless_duplicate(Stage("text", text_stage, workers.text_workers)),
+        _unless_duplicate(Stage("llm", llm_stage, workers.llm_workers)),
+        _unless_duplicate(Stage("report", report_stage, workers.report_workers)),
+        _unless_duplicate(Stage("upload", upload_stage, workers.upload_workers)),
+        _unless_duplicate(Stage("calendar", calendar_stage, workers.calendar_workers)),
+        Stage("archive", archive_stage, workers.archive_workers),
+    ]
+    if dry_run:
+        stages = [stage for stage in stages if stage.name not in ("upload", "calendar", "archive")]
+    names = [stage.name for stage in stages]
+    if first_stage not in names:
+        raise ValueError(f"Unbekannte Stage: {first_stage}")
+    if store is not None:
+        stages = [_tracked(stage, names, store) for stage in stages]
+    if on_done is not None:
+        stages[-1] = _notify(stages[-1], on_done)
+
+    def on_error(job: Job, exc: Exception) -> None:
+        if dry_run:
+            if job.document is not None:
+                job.document.close()
+        else:
+            fail_job(job, exc, hotfolder_for(job), store=store, duplicates=duplicates)
+        if on_failed is not None:
+            on_failed(job, exc)
+
+    def on_drop(job: Job) -> None:
+        # stopped without draining: the file stays in the hotfolder and resumes on the next start
+        if job.document is not None:
+            job.document.close()
+        if store is not None:
+            store.release(job)
+
+    return Pipeline(
+        stages[names.index(first_stage):], queue_size=workers.queue_size, on_error=on_error, on_drop=on_drop
+    )
@@ -0,0 +1,223 @@
+import math
+from dataclasses import dataclass, field
+from typing import Optional
+
+import numpy as np
+import pytesseract
+from PIL import Image
+
+from .config import PreprocessConfig
+
+A4_LONG_SIDE_INCH = 11.69
+MAX_PAGE_INCH = 17.0
+
+
+@dataclass
+class PreparedImage:
+    image: Image.Image
+    # maps processed pixel coordinates back to the input image (3x3 affine, homogeneous)
+    to_source: np.ndarray
+    source_size: tuple[int, int]
+    pixels_before: int
+    pixels_after: int
+    steps: list[str] = field(default_factory=list)
+
+    def map_box(self, x0: float, y0: float, x1: float, y1: float) -> tuple[float, float, float, float]:
+        """Box relative to the processed image -> box relative to the input image."""
+        width, height = self.image.size
+        corners = np.array(
+            [[x0 * width, x1 * width, x0 * width, x1 * width],
+             [y0 * height, y0 * height, y1 * height, y1 * height],
+             [1, 1, 1, 1]]
+        )
+        xs, ys, _ = self.to_source @ corners
+        src_w, src_h = self.source_size
+        return (
+            float(np.clip(xs.min() / src_w, 0, 1)),
+            float(np.clip(ys.min() / src_h, 0, 1)),
+            float(np.clip(xs.max() / src_w, 0, 1)),
+            float(np.clip(ys.max() / src_h, 0, 1)),
+        )
+
+
+def _translate(dx: float, dy: float) -> np.ndarray:
+    return np.array([[1.0, 0, dx], [0, 1.0, dy], [0, 0, 1.0]])
+
+
+def _scale(factor: float) -> np.ndarray:
+    return np.array([[factor, 0, 0], [0, factor, 0], [0, 0, 1.0]])
+
+
+def _rotate(degrees: float) -> np.ndarray:
+    # PIL rotates counter-clockwise with the y axis pointing down
+    rad = math.radians(degrees)
+    cos, sin = math.cos(rad), math.sin(rad)
+    return np.array([[cos, sin, 0], [-sin, cos, 0], [0, 0, 1.0]])
+
+
+def otsu_threshold(gray: np.ndarray) -> int:
+    """Global Otsu threshold; pixels ``<=`` the result are dark."""
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    weights = np.cumsum(hist)
+    means = np.cumsum(hist * np.arange(256))
+    background = weights
+    foreground = total - weights
+    valid = (background > 0) & (foreground > 0)
+    between = np.zeros(256)
+    between[valid] = (
+        (means[-1] * background[valid] - means[valid] * total) ** 2 / (background[valid] * foreground[valid])
+    )
+    # two-tone pages have a plateau of equally good thresholds; take its middle
+    best = np.flatnonzero(between == between.max())
+    return int(best.mean())
+
+
+class ImagePreprocessor:
+    """Grayscale, downscale, orientation, border crop, deskew and binarization before OCR.
+
+    One instance lives per OCR worker and keeps its scratch arrays between
+    pages, so pages of similar size are processed without new allocations.
+    """
+
+    def __init__(self, cfg: PreprocessConfig):
+        self.cfg = cfg
+        self._buffers: dict[str, np.ndarray] = {}
+
+    def _buffer(self, name: str, shape: tuple[int, ...], dtype) -> np.ndarray:
+        size = math.prod(shape)
+        buffer = self._buffers.get(name)
+        if buffer is None or buffer.size < size or buffer.dtype != dtype:
+            buffer = np.empty(size, dtype=dtype)
+            self._buffers[name] = buffer
+        return buffer[:size].reshape(shape)
+
+    def prepare(self, image: Image.Image, dpi: Optional[float] = None) -> PreparedImage:
+        cfg = self.cfg
+        source_size = image.size
+        matrix = np.eye(3)  # source -> processed
+        steps: list[str] = []
+
+        if cfg.grayscale and image.mode != "L":
+            image = image.convert("L")
+            steps.append("gray")
+
+        factor = self._downscale_factor(image, dpi)
+        if factor < 1:
+            size = (max(1, round(image.width * factor)), max(1, round(image.height * factor)))
+            matrix = _scale(size[0] / image.width) @ matrix
+            image = image.resize(size, Image.Resampling.LANCZOS)
+            steps.append(f"scale={factor:.2f}")
+
+        if cfg.detect_orientation:
+            angle = self._orientation(image)
+            if angle:
+                width, height = image.size
+                image = image.rotate(angle, expand=True)
+                # rotate about the old centre, then move into the expanded canvas
+                matrix = (
+                    _translate(image.width / 2, image.height / 2)
+                    @ _rotate(angle)
+                    @ _translate(-width / 2, -height / 2)
+                    @ matrix
+                )
+                steps.append(f"orientation={angle}")
+
+        gray = np.asarray(image if image.mode == "L" else image.convert("L"))
+        threshold = otsu_threshold(gray)
+        dark = self._buffer("dark", gray.shape, np.bool_)
+        np.less_equal(gray, threshold, out=dark)
+
+        if cfg.crop_borders:
+            box = self._content_box(dark)
+            if box is not None and box != (0, 0, gray.shape[1], gray.shape[0]):
+                left, top, right, bottom = box
+                image = image.crop(box)
+                gray = gray[top:bottom, left:right]
+                dark = dark[top:bottom, left:right]
+                matrix = _translate(-left, -top) @ matrix
+                steps.append("crop")
+
+        if cfg.deskew:
+            angle = self._skew_angle(dark)
+            if abs(angle) >= 0.1:
+                fill = 255 if image.mode == "L" else "white"
+                center = (image.width / 2, image.height / 2)
+                image = image.rotate(angle, resample=Image.Resampling.BICUBIC, fillcolor=fill)
+                matrix = _translate(*center) @ _rotate(angle) @ _translate(-center[0], -center[1]) @ matrix
+                gray = np.asarray(image if image.mode == "L" else image.convert("L"))
+                steps.append(f"deskew={angle:.2f}")
+
+        if cfg.binarize:
+            binary = self._buffer("binary", gray.shape, np.uint8)
+            np.greater(gray, threshold, out=binary)
+            np.multiply(binary, 255, out=binary)
+            image = Image.fromarray(binary).convert("1")
+            steps.append("binarize")
+
+        return PreparedImage(
+            image=image,
+            to_source=np.linalg.inv(matrix),
+            source_size=source_size,
+            pixels_before=source_size[0] * source_size[1],
+            pixels_after=image.width * image.height,
+            steps=steps,
+        )
+
+    def _downscale_factor(self, image: Image.Image, dpi: Optional[float]) -> float:
+        if not self.cfg.target_dpi:
+            return 1.0
+        if not dpi or max(image.size) / dpi > MAX_PAGE_INCH:
+            # phone photos carry no usable DPI (often 72); assume the page fills the frame like an A4 sheet
+            dpi = max(image.size) / A4_LONG_SIDE_INCH
+        return min(1.0, self.cfg.target_dpi / dpi)
+
+    def _orientation(self, image: Image.Image) -> int:
+        try:
+            osd = pytesseract.image_to_osd(image, output_type=pytesseract.Output.DICT)
+        except pytesseract.TesseractError:
+            return 0  # too little text to decide
+        # tesseract reports the clockwise correction, PIL rotates counter-clockwise
+        return -int(osd.get("rotate", 0)) % 360
+
+    def _content_box(self, dark: np.ndarray) -> Optional[tuple[int, int, int, int]]:
+        """Bounding box of the content, ignoring black scanner borders and empty margins."""
+        height, width = dark.shape
+        rows = dark.mean(axis=1)
+        cols = dark.mean(axis=0)
+        border = self.cfg.border_fraction
+        content_rows = np.flatnonzero((rows > 0.002) & (rows < border))
+        content_cols = np.flatnonzero((cols > 0.002) & (cols < border))
+        if content_rows.size == 0 or content_cols.size == 0:
+            return None
+        pad = self.cfg.crop_padding
+        return (
+            max(0, int(content_cols[0]) - pad),
+            max(0, int(content_rows[0]) - pad),
+            min(width, int(content_cols[-1]) + 1 + pad),
+            min(height, int(content_rows[-1]) + 1 + pad),
+        )
+
+    def _skew_angle(self, dark: np.ndarray) -> float:
+        """Projection-profile deskew on the dark pixels of a downsampled page.
+
+        Text lines produce sharp peaks in the row histogram when the page is
+        rotated by the right angle; the angle with the highest variance wins.
+        """
+        step = max(1, max(dark.shape) // 1000)
+        ys, xs = np.nonzero(dark[::step, ::step])
+        if ys.size < 100:
+            return 0.0
+        ys = ys.astype(np.float64)
+        xs = xs.astype(np.float64)
+        limit = self.cfg.max_skew_degrees
+        best_angle, best_score = 0.0, -1.0
+        for angle in np.arange(-limit, limit + 1e-9, 0.25):
+            rad = math.radians(angle)
+            rows = ys * math.cos(rad) - xs * math.sin(rad)
+            profile = np.bincount((rows - rows.min()).astype(np.int64))
+            score = float(np.var(profile))
+            if score > best_score:
+                best_angle, best_score = float(angle), score
+        # lines sloping down to the right by this angle are straightened by a counter-clockwise rotation
+        return best_angle
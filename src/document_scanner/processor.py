@@ -1,19 +1,25 @@
+import copy
 import json
 import logging
-import os
+import threading
 from datetime import datetime, time
 from pathlib import Path
-from typing import Optional
+from typing import Optional, Sequence
 
 from jsonschema import validate
 
+from .cache import ResultCache, file_sha256, text_sha256
 from .config import ScannerConfig
-from .file_naming import build_filename, ensure_unique
+from .document import SourceDocument
+from .file_naming import NameAllocator, build_filename
 from .graph import GraphClient
-from .llm_client import LLMExtractor, parse_date
-from .models import ExtractedData
-from .ocr import extract_text_from_image, extract_text_from_pdf
+from .llm_client import LLMExtractor
+from .metrics import LLM_TOKENS, current_trace_id, span, trace_context
+from .models import ExtractedData, PageText, TextExtraction
+from .ocr import IMAGE_SUFFIXES, create_ocr_executor, extract_text, settings_key
 from .report import build_report_page, merge_report_with_original
+from .rules import RuleExtractor
+from .text_preprocess import prepare_llm_text
 
 logger = logging.getLogger(__name__)
 
@@ -23,70 +29,149 @@ class DocumentProcessor:
         self.cfg = cfg
         self.schema_path = schema_path
         self.schema = json.loads(schema_path.read_text(encoding="utf-8"))
+        self.schema_version = text_sha256(json.dumps(self.schema, sort_keys=True))
+        self._ocr_executor = create_ocr_executor(cfg.ocr)
+        self.cache = ResultCache(cfg.cache) if cfg.cache.enabled else None
+        self.rules = RuleExtractor(cfg.rules)
+        self.names = NameAllocator(cfg.hotfolder.processed_dir)
+        self._extractor: Optional[LLMExtractor] = None
+        self._extractor_lock = threading.Lock()
+        self._shared: Optional["DocumentProcessor"] = None
 
-    def _extract_text(self, path: Path) -> str:
+    def for_profile(self, cfg: ScannerConfig) -> "DocumentProcessor":
+        """A processor for one hotfolder profile that shares this one's OCR pool, caches and LLM client.
+
+        Only the per-profile settings (folders, OneDrive path, calendar, LLM
+        model, OCR language) come from ``cfg``; closing the view is a no-op.
+        """
+        if cfg is self.cfg:
+            return self
+        view = copy.copy(self)
+        view.cfg = cfg
+        view.names = NameAllocator(cfg.hotfolder.processed_dir)
+        view._shared = self._shared or self
+        return view
+
+    def close(self) -> None:
+        if self._shared is not None:
+            return
+        self._ocr_executor.shutdown()
+        if self._extractor is not None:
+            self._extractor.close()
+        if self.cache is not None:
+            logger.info("Cache-Statistik: %s", self.cache.stats)
+            self.cache.close()
+
+    def open_document(self, path: Path) -> Optional[SourceDocument]:
         suffix = path.suffix.lower()
-        if suffix in {".png", ".jpg", ".jpeg", ".tiff"}:
-            return extract_text_from_image(
-                path,
-                language=self.cfg.ocr.language,
-                tesseract_cmd=self.cfg.ocr.tesseract_cmd,
-            )
         if suffix == ".pdf":
-            return extract_text_from_pdf(
-                path,
-                language=self.cfg.ocr.language,
-                tesseract_cmd=self.cfg.ocr.tesseract_cmd,
-            )
-        raise ValueError(f"Nicht unterstütztes Format: {suffix}")
+            return SourceDocument(path)
+        if suffix in IMAGE_SUFFIXES:
+            return SourceDocument.from_image(path)
+        return None
 
-    def _llm_extract(self, text: str) -> ExtractedData:
-        if not self.cfg.llm.enabled:
-            logger.warning("LLM deaktiviert, nutze Minimalwerte")
-            return ExtractedData(
-                document_type="Sonstiges",
-                issuer="Unbekannt",
-                document_date=None,
-                amount_total=None,
-                currency="EUR",
-                due_date=None,
-                iban=None,
-                invoice_number=None,
-                is_tax_relevant=False,
-                tax_category=None,
-                summary=[text[:200]],
-            )
-        api_key = os.environ.get(self.cfg.llm.api_key_env)
-        if not api_key:
-            raise RuntimeError("LLM aktiviert aber kein API-Key gefunden")
-        extractor = LLMExtractor(
-            api_key=api_key,
-            model=self.cfg.llm.model,
-            temperature=self.cfg.llm.temperature,
+    def extract_text(
+        self, path: Path, document: Optional[SourceDocument] = None, sha256: Optional[str] = None
+    ) -> TextExtraction:
+        """Text of ``path``; ``sha256`` is the file hash if the caller already has it (dedupe stage)."""
+        if self.cache is None:
+            return extract_text(path, self.cfg.ocr, executor=self._ocr_executor, document=document)
+        # a changed OCR setting (engine, preprocessing, thresholds, ...) must not serve old text
+        key = f"{sha256 or file_sha256(path)}:{self.cfg.ocr.language}:{settings_key(self.cfg.ocr)}"
+        cached = self.cache.get_text(key)
+        if cached is not None:
+            logger.info("Text aus Cache: %s", path.name)
+            return cached
+        extraction = extract_text(path, self.cfg.ocr, executor=self._ocr_executor, document=document)
+        self.cache.put_text(key, extraction)
+        return extraction
+
+    def prepare_text(self, pages: list[str]) -> str:
+        """Trim OCR output to what the LLM needs, within ``llm.token_budget``."""
+        prepared = prepare_llm_text(pages, self.cfg.llm.token_budget)
+        LLM_TOKENS.inc(prepared.tokens_saved, kind="saved")
+        logger.info(
+            "LLM-Eingabe: %d -> %d Tokens (%d gespart)",
+            prepared.tokens_before,
+            prepared.tokens_after,
+            prepared.tokens_saved,
         )
-        raw = extractor.extract(text, self.schema)
+        return prepared.text
+
+    def extract_local(self, text: str) -> Optional[ExtractedData]:
+        """Rule-based result if it is confident enough to skip the LLM, else ``None``."""
+        if not self.cfg.rules.enabled:
+            return None
+        with span("rules"):
+            local = self.rules.extract(text)
+        if self.rules.is_confident(local):
+            logger.info("Regelbasierte Extraktion ausreichend, LLM wird übersprungen")
+            return local
+        return None
+
+    def extract_data(self, text: str, pages: Optional[list[str]] = None) -> ExtractedData:
+        if not self.cfg.llm.enabled:
+            logger.info("LLM deaktiviert, nutze regelbasierte Extraktion")
+            return self.rules.extract(text)
+        local = self.extract_local(text)
+        if local is not None:
+            return local
+        text = self.prepare_text(pages if pages is not None else [text])
+        if self.cache is None:
+            return self._llm_extract(text)
+        key = self.extraction_key(text)
+        cached = self.cache.get_extraction(key)
+        if cached is not None:
+            logger.info("LLM-Ergebnis aus Cache")
+            return cached
+        extracted = self._llm_extract(text)
+        self.cache.put_extraction(key, extracted)
+        return extracted
+
+    def extraction_key(self, text: str) -> str:
+        return text_sha256(text, self.cfg.llm.model, str(self.cfg.llm.temperature), self.schema_version)
+
+    def parse_extraction(self, raw: dict) -> ExtractedData:
         validate(raw, self.schema)
-        return ExtractedData(
-            document_type=raw.get("document_type", "Sonstiges"),
-            issuer=raw.get("issuer", "Unbekannt"),
-            document_date=parse_date(raw.get("document_date")),
-            amount_total=raw.get("amount_total"),
-            currency=raw.get("currency", "EUR"),
-            due_date=parse_date(raw.get("due_date")),
-            iban=raw.get("iban"),
-            invoice_number=raw.get("invoice_number"),
-            is_tax_relevant=bool(raw.get("is_tax_relevant", False)),
-            tax_category=raw.get("tax_category"),
-            confidence=raw.get("confidence", {}),
-            summary=raw.get("summary", []),
-        )
+        return ExtractedData.from_dict(raw)
+
+    def _llm_extract(self, text: str) -> ExtractedData:
+        return self.parse_extraction(self.get_extractor().extract(text, self.schema, model=self.cfg.llm.model))
+
+    def get_extractor(self) -> LLMExtractor:
+        if self._shared is not None:
+            return self._shared.get_extractor()
+        with self._extractor_lock:
+            if self._extractor is None:
+                self._extractor = LLMExtractor.from_config(self.cfg.llm)
+            return self._extractor
 
     def process_file(self, path: Path) -> tuple[Path, ExtractedData]:
-        logger.info("Verarbeite %s", path)
-        text = self._extract_text(path)
-        extracted = self._llm_extract(text)
-        report_pdf = build_report_page(extracted, path.name)
-        merged = merge_report_with_original(report_pdf, path)
+        with trace_context(current_trace_id()), span("process_file"):
+            logger.info("Verarbeite %s", path)
+            document = self.open_document(path)
+            try:
+                extraction = self.extract_text(path, document)
+                extracted = self.extract_data(extraction.text, [page.text for page in extraction.pages])
+                return self.write_report(path, extracted, document, extraction.pages), extracted
+            finally:
+                if document is not None:
+                    document.close()
+
+    def write_report(
+        self,
+        path: Path,
+        extracted: ExtractedData,
+        document: Optional[SourceDocument] = None,
+        pages: Sequence[PageText] = (),
+    ) -> Path:
+        if document is None:
+            document = self.open_document(path)
+            if document is None:
+                raise ValueError(f"Nicht unterstütztes Format: {path.suffix}")
+            with document:
+                return self.write_report(path, extracted, document, pages)
+        report_pdf = build_report_page(extracted, path.name, self.cfg.report.renderer)
         target_name = build_filename(
             extracted.document_date,
             extracted.document_type,
@@ -96,10 +181,14 @@ class DocumentProcessor:
             extracted.due_date,
             extracted.is_tax_relevant,
         )
-        target_path = ensure_unique(self.cfg.hotfolder.processed_dir / target_name)
-        with target_path.open("wb") as f:
-            f.write(merged.read())
-        return target_path, extracted
+        target_path = self.names.reserve(target_name)
+        try:
+            with target_path.open("wb") as f:
+                merge_report_with_original(report_pdf, document, f, pages if self.cfg.ocr.searchable_output else ())
+        except BaseException:
+            target_path.unlink(missing_ok=True)
+            raise
+        return target_path
 
     def upload(self, graph: GraphClient, local_path: Path, extracted: ExtractedData) -> str:
         folder = (
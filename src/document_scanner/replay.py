@@ -0,0 +1,121 @@
+import glob
+import logging
+import threading
+import time
+from dataclasses import dataclass, replace
+from pathlib import Path
+from typing import Optional
+
+from .config import DEFAULT_PROFILE, ScannerConfig
+from .duplicates import DuplicateIndex
+from .graph import GraphClient
+from .jobs import JobStore
+from .models import Job
+from .ocr import IMAGE_SUFFIXES
+from .pipeline import build_pipeline
+from .processor import DocumentProcessor
+
+logger = logging.getLogger(__name__)
+
+SUFFIXES = IMAGE_SUFFIXES | {".pdf"}
+
+
+def collect_files(source: str) -> list[Path]:
+    """Scans in directory ``source``, or the files matching ``source`` as a glob (``**`` recurses)."""
+    path = Path(source)
+    if path.is_dir():
+        candidates = path.iterdir()
+    else:
+        candidates = (Path(match) for match in glob.glob(source, recursive=True))
+    return sorted(p for p in candidates if p.is_file() and p.suffix.lower() in SUFFIXES)
+
+
+@dataclass
+class ReplaySummary:
+    files: int = 0
+    processed: int = 0
+    duplicates: int = 0
+    skipped: int = 0  # already finished in an earlier run (--resume)
+    failed: int = 0
+    pages: int = 0
+    seconds: float = 0.0
+
+    @property
+    def documents_per_second(self) -> float:
+        return (self.processed + self.duplicates) / self.seconds if self.seconds else 0.0
+
+    @property
+    def pages_per_second(self) -> float:
+        return self.pages / self.seconds if self.seconds else 0.0
+
+    def format(self) -> str:
+        return (
+            f"{self.files} Dateien in {self.seconds:.1f}s: {self.processed} verarbeitet, "
+            f"{self.duplicates} Duplikate, {self.skipped} übersprungen, {self.failed} fehlgeschlagen\n"
+            f"Durchsatz: {self.documents_per_second:.2f} Dokumente/s, {self.pages_per_second:.2f} Seiten/s"
+        )
+
+
+def run_replay(
+    cfg: ScannerConfig,
+    processor: DocumentProcessor,
+    graph: Optional[GraphClient],
+    files: list[Path],
+    profile: str = DEFAULT_PROFILE,
+    store: Optional[JobStore] = None,
+    duplicates: Optional[DuplicateIndex] = None,
+    resume: bool = False,
+    dry_run: bool = False,
+) -> ReplaySummary:
+    """Push ``files`` straight through the pipeline, without watcher and stability checks.
+
+    Originals from the input or failed folder of ``cfg.hotfolder`` are
+    archived or moved to ``failed_dir`` as in the service; all others (e.g.
+    from an archive with subfolders) stay where they are. With ``resume``
+    files finished in an earlier run are skipped and interrupted ones
+    continue after their last completed stage. ``dry_run`` writes the reports but makes no Graph
+    calls and leaves the originals, the job store and the duplicate index
+    untouched.
+    """
+    if dry_run:
+        store = duplicates = None
+    summary = ReplaySummary(files=len(files))
+    hotfolder = {cfg.hotfolder.input_dir.resolve(), cfg.hotfolder.failed_dir.resolve()}
+    lock = threading.Lock()
+
+    def done(job: Job) -> None:
+        with lock:
+            if job.duplicate_of is not None:
+                summary.duplicates += 1
+            else:
+                summary.processed += 1
+                summary.pages += len(job.pages)
+
+    def fail(job: Job, exc: Exception) -> None:
+        with lock:
+            summary.failed += 1
+
+    pipeline = build_pipeline(
+        cfg, processor, graph, store=store, duplicates=duplicates, dry_run=dry_run, on_done=done, on_failed=fail
+    )
+    start = time.perf_counter()
+    pipeline.start()
+    try:
+        for path in files:
+            if resume and store is not None and store.finished(path):
+                logger.info("Bereits verarbeitet, überspringe %s", path.name)
+                summary.skipped += 1
+                continue
+            if store is not None:
+                job = store.begin(path, profile, resume=resume)
+            else:
+                job = Job(source_path=path, profile=profile)
+            if job is None:
+                summary.skipped += 1
+                continue
+            pipeline.submit(replace(job, keep_source=path.parent.resolve() not in hotfolder))
+    finally:
+        pipeline.shutdown()
+    summary.seconds = time.perf_counter() - start
+    logger.info("Verarbeitung beendet: %s", summary)
+    return summary
@@ -1,44 +1,72 @@
+import unicodedata
+import zlib
+from functools import lru_cache, partial
 from io import BytesIO
-from pathlib import Path
-from typing import Iterable
+from typing import BinaryIO, Callable, Sequence
 
 from PIL import Image, ImageDraw, ImageFont
-from pypdf import PdfReader, PdfWriter
 
-from .models import ExtractedData
+from .document import SourceDocument
+from .metrics import span
+from .models import ExtractedData, PageText
 
 
 A4_SIZE = (2480, 3508)  # 300dpi
+A4_POINTS = (595, 842)
 
+# Helvetica advance widths (1/1000 em) from the standard Adobe AFM, ASCII range.
+_HELVETICA_ASCII = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+_HELVETICA_WIDTHS = {chr(32 + i): width for i, width in enumerate(_HELVETICA_ASCII)}
+_HELVETICA_WIDTHS.update({
+    "ß": 611, "€": 556, "§": 556, "°": 400, "·": 278, "•": 350, "–": 556, "—": 1000, "…": 1000,
+    "„": 333, "“": 333, "”": 333, "‚": 222, "‘": 222, "’": 222, "«": 556, "»": 556, "×": 584,
+})
 
-def _draw_text_block(draw: ImageDraw.ImageDraw, text: str, position: tuple[int, int], max_width: int, line_height: int = 40):
-    x, y = position
-    words = text.split()
-    line = []
-    for word in words:
-        test_line = " ".join(line + [word])
-        if draw.textlength(test_line) > max_width:
-            draw.text((x, y), " ".join(line), fill="black")
-            y += line_height
-            line = [word]
+
+@lru_cache(maxsize=4096)
+def _char_width(char: str) -> int:
+    width = _HELVETICA_WIDTHS.get(char)
+    if width is None:
+        # accented letters are as wide as their base letter (Ä -> A)
+        base = unicodedata.normalize("NFKD", char)[:1]
+        width = _HELVETICA_WIDTHS.get(base, 556)
+    return width
+
+
+@lru_cache(maxsize=8192)
+def text_width(text: str, size: float) -> float:
+    """Width of ``text`` set in Helvetica at ``size`` points."""
+    return sum(_char_width(char) for char in text) * size / 1000
+
+
+def wrap_text(text: str, max_width: float, measure: Callable[[str], float]) -> list[str]:
+    """Greedy word wrap; every word is measured once and line widths are summed."""
+    lines: list[str] = []
+    space = measure(" ")
+    line: list[str] = []
+    width = 0.0
+    for word in text.split():
+        word_width = measure(word)
+        if line and width + space + word_width > max_width:
+            lines.append(" ".join(line))
+            line, width = [word], word_width
         else:
+            width += word_width + (space if line else 0)
             line.append(word)
     if line:
-        draw.text((x, y), " ".join(line), fill="black")
+        lines.append(" ".join(line))
+    return lines
 
 
-def build_report_page(data: ExtractedData, source_name: str) -> BytesIO:
-    image = Image.new("RGB", A4_SIZE, color="white")
-    draw = ImageDraw.Draw(image)
-    title_font = ImageFont.load_default()
-    draw.text((80, 60), "Scan Report", fill="black", font=title_font)
-    draw.text((80, 120), f"Quelle: {source_name}", fill="black")
-    draw.text((80, 180), "Summary:", fill="black")
-    summary_text = "\n".join(f"- {item}" for item in data.summary)
-    _draw_text_block(draw, summary_text, (120, 220), max_width=2200)
-
-    y = 520
-    fields = {
+def _report_fields(data: ExtractedData) -> dict[str, str]:
+    return {
         "Dokumenttyp": data.document_type,
         "Absender": data.issuer,
         "Dokumentdatum": data.document_date.isoformat() if data.document_date else "unbekannt",
@@ -49,7 +77,150 @@ def build_report_page(data: ExtractedData, source_name: str) -> BytesIO:
         "Steuerrelevant": "Ja" if data.is_tax_relevant else "Nein",
         "Kategorie": data.tax_category or "-",
     }
-    for key, value in fields.items():
+
+
+def build_report_page(data: ExtractedData, source_name: str, renderer: str = "vector") -> BytesIO:
+    if renderer not in ("vector", "raster"):
+        raise ValueError(f"Unbekannter Report-Renderer: {renderer}")
+    with span("report.build", renderer=renderer):
+        if renderer == "vector":
+            return build_vector_report_page(data, source_name)
+        return build_raster_report_page(data, source_name)
+
+
+# letters without a decomposition into a cp1252 base letter
+_TRANSLITERATE = str.maketrans({"ł": "l", "Ł": "L", "đ": "d", "Đ": "D", "ı": "i", "ħ": "h", "Ħ": "H"})
+
+
+def _cp1252(text: str) -> bytes:
+    """Encode for WinAnsiEncoding; other characters are transliterated (č -> c, ﬁ -> fi) instead of dropped."""
+    try:
+        return text.encode("cp1252")
+    except UnicodeEncodeError:
+        pass
+    out = bytearray()
+    for char in text.translate(_TRANSLITERATE):
+        try:
+            out += char.encode("cp1252")
+        except UnicodeEncodeError:
+            decomposed = unicodedata.normalize("NFKD", char)
+            out += decomposed.encode("cp1252", errors="ignore") or b"?"
+    return bytes(out)
+
+
+def _pdf_string(text: str) -> bytes:
+    raw = _cp1252(text)
+    return b"(" + raw.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _pdf_document(pages: list[tuple[bytes, tuple[float, float]]]) -> bytes:
+    """Minimal PDF with one page per (content stream, size) using Helvetica as /F1 and /F2 (bold)."""
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>"
+        % (b" ".join(b"%d 0 R" % (5 + 2 * n) for n in range(len(pages))), len(pages)),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>",
+    ]
+    for n, (content, size) in enumerate(pages):
+        stream = zlib.compress(content)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %.2f %.2f] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>" % (*size, 6 + 2 * n)
+        )
+        objects.append(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(stream) + stream + b"\nendstream")
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+def build_text_layer(pages: list[PageText], sizes: list[tuple[float, float]]) -> bytes:
+    """Invisible text (render mode 3) at the OCR word positions, one PDF page per OCR'd page.
+
+    Each word is set in Helvetica at the height of its box and scaled
+    horizontally to the box width, so selecting and searching matches the
+    scanned image underneath.
+    """
+    layer = []
+    for page, (width, height) in zip(pages, sizes):
+        ops = [b"BT 3 Tr"]
+        for word, x0, y0, x1, y1 in page.words:
+            size = max((y1 - y0) * height, 1.0)
+            natural = text_width(word, 1.0) * size
+            if natural <= 0:
+                continue
+            scale = 100 * (x1 - x0) * width / natural
+            ops.append(
+                b"/F1 %.2f Tf %.1f Tz 1 0 0 1 %.2f %.2f Tm %s Tj"
+                % (size, scale, x0 * width, (1 - y1) * height, _pdf_string(word))
+            )
+        ops.append(b"ET")
+        layer.append((b"\n".join(ops), (width, height)))
+    return _pdf_document(layer)
+
+
+def build_vector_report_page(data: ExtractedData, source_name: str) -> BytesIO:
+    """Report page(s) as native PDF text in Helvetica: selectable, searchable and only a few KB."""
+    width, height = A4_POINTS
+    margin, size, leading = 56, 10.5, 14
+    max_width = width - 2 * margin
+    measure = partial(text_width, size=size)
+    pages: list[list[bytes]] = [[]]
+    y = height - margin
+
+    def line(text: str, x: float, font: bytes = b"F1", font_size: float = size) -> None:
+        nonlocal y
+        if y < margin:
+            # long summaries continue on another report page
+            pages.append([])
+            y = height - margin
+        pages[-1].append(b"BT /%s %.1f Tf %.2f %.2f Td %s Tj ET" % (font, font_size, x, y, _pdf_string(text)))
+        y -= leading
+
+    line("Scan Report", margin, b"F2", 18)
+    y -= 10
+    line(f"Quelle: {source_name}", margin)
+    y -= 8
+    line("Summary:", margin, b"F2")
+    for item in data.summary:
+        wrapped = wrap_text(item, max_width - 24, measure)
+        for index, text in enumerate(wrapped):
+            line(("- " if index == 0 else "  ") + text, margin + 12)
+    y -= 12
+    for key, value in _report_fields(data).items():
+        for index, text in enumerate(wrap_text(f"{key}: {value}", max_width, measure)):
+            line(text, margin + (12 if index else 0))
+    y -= 12
+    line("Original folgt auf den naechsten Seiten.", margin)
+    return BytesIO(_pdf_document([(b"\n".join(ops), A4_POINTS) for ops in pages]))
+
+
+def _draw_text_block(draw: ImageDraw.ImageDraw, text: str, position: tuple[int, int], max_width: int, line_height: int = 40):
+    x, y = position
+    for line in wrap_text(text, max_width, draw.textlength):
+        draw.text((x, y), line, fill="black")
+        y += line_height
+
+
+def build_raster_report_page(data: ExtractedData, source_name: str) -> BytesIO:
+    image = Image.new("RGB", A4_SIZE, color="white")
+    draw = ImageDraw.Draw(image)
+    title_font = ImageFont.load_default()
+    draw.text((80, 60), "Scan Report", fill="black", font=title_font)
+    draw.text((80, 120), f"Quelle: {source_name}", fill="black")
+    draw.text((80, 180), "Summary:", fill="black")
+    summary_text = "\n".join(f"- {item}" for item in data.summary)
+    _draw_text_block(draw, summary_text, (120, 220), max_width=2200)
+
+    y = 520
+    for key, value in _report_fields(data).items():
         draw.text((80, y), f"{key}: {value}", fill="black")
         y += 60
     draw.text((80, y + 40), "Original folgt auf den naechsten Seiten.", fill="black")
@@ -60,17 +231,17 @@ def build_report_page(data: ExtractedData, source_name: str) -> BytesIO:
     return buffer
 
 
-def merge_report_with_original(report: BytesIO, original_path: Path) -> BytesIO:
-    writer = PdfWriter()
-    report_reader = PdfReader(report)
-    for page in report_reader.pages:
-        writer.add_page(page)
-
-    original_reader = PdfReader(str(original_path))
-    for page in original_reader.pages:
-        writer.add_page(page)
-
-    output = BytesIO()
-    writer.write(output)
-    output.seek(0)
-    return output
+def merge_report_with_original(
+    report: BytesIO,
+    original: SourceDocument,
+    target: BinaryIO,
+    ocr_pages: Sequence[PageText] = (),
+) -> None:
+    """Report first, then the original; OCR'd pages get an invisible text layer so the output is searchable."""
+    pages = [page for page in ocr_pages if page.words]
+    with span("report.merge", text_layer_pages=len(pages)):
+        if not pages:
+            original.save_after(report, target)
+            return
+        layer = build_text_layer(pages, [original.page_size(page.index) for page in pages])
+        original.save_after(report, target, overlay=layer, overlay_pages=[page.index for page in pages])
@@ -0,0 +1,191 @@
+import re
+from datetime import date, timedelta
+from typing import Optional
+
+from .config import RulesConfig
+from .models import ExtractedData
+
+_IBAN = re.compile(r"\b([A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){3,7}(?: ?[A-Z0-9]{1,3})?)\b")
+_DATE = r"(\d{1,2})\.\s?(\d{1,2})\.\s?(\d{4}|\d{2})\b|\b(\d{4})-(\d{2})-(\d{2})"
+_DATE_RE = re.compile(_DATE)
+_AMOUNT = r"(-?\d{1,3}(?:[.\s']\d{3})*,\d{2}|-?\d+,\d{2}|-?\d{1,3}(?:,\d{3})*\.\d{2}|-?\d+\.\d{2})"
+_AMOUNT_RE = re.compile(_AMOUNT)
+
+_LABELED_DATE = re.compile(r"(?i)(?:rechnungsdatum|belegdatum|datum|date|vom)\s*:?\s*(?:" + _DATE + ")")
+_DUE_DATE = re.compile(
+    r"(?i)(?:fällig(?:keit)?(?:\s*(?:am|bis|zum))?|faellig(?:\s*am)?|zahlbar\s*(?:bis|am)(?:\s*zum)?|"
+    r"zahlungsziel|due\s*date|bis\s*zum)\s*:?\s*(?:" + _DATE + ")"
+)
+_DUE_DAYS = re.compile(r"(?i)(?:zahlbar\s*)?innerhalb\s*(?:von\s*)?(\d{1,3})\s*tagen")
+_TOTAL = re.compile(
+    r"(?i)\b(?:gesamtbetrag|rechnungsbetrag|endbetrag|zahlbetrag|bruttobetrag|gesamtsumme|"
+    r"zu\s*zahlen|auszahlungsbetrag|auszahlung|summe|gesamt|total)\b[^\n\d-]{0,30}" + _AMOUNT
+)
+_INVOICE_NUMBER = re.compile(
+    r"(?i)(?:rechnungs-?\s*nr\.?|rechnungsnummer|rechnung\s*nr\.?|beleg-?\s*nr\.?|belegnummer|"
+    r"invoice\s*(?:no\.?|number))\s*:?\s*([A-Z0-9][A-Z0-9/_-]{2,})"
+)
+_LEGAL_FORM = re.compile(r"(?i)\b(?:gmbh|ag|kg|ohg|gbr|e\.\s?v\.|se|ug|mbh|stadtwerke|versicherung|bank|sparkasse)\b")
+
+DOCUMENT_TYPES = [
+    ("Gehaltsabrechnung", re.compile(r"(?i)gehaltsabrechnung|lohnabrechnung|entgeltabrechnung|verdienstabrechnung")),
+    ("Mahnung", re.compile(r"(?i)\bmahnung|zahlungserinnerung")),
+    ("Gutschrift", re.compile(r"(?i)\bgutschrift")),
+    ("Rechnung", re.compile(r"(?i)\brechnung\b|rechnungsnummer|\binvoice\b")),
+    ("Kontoauszug", re.compile(r"(?i)kontoauszug")),
+    ("Bescheid", re.compile(r"(?i)\bbescheid\b|steuerbescheid")),
+    ("Vertrag", re.compile(r"(?i)\bvertrag\b|vertragsbestätigung")),
+    ("Versicherung", re.compile(r"(?i)versicherungsschein|beitragsrechnung")),
+]
+_TAX_HINTS = re.compile(
+    r"(?i)zuwendungsbestätigung|spendenbescheinigung|lohnsteuer|steuerbescheid|handwerkerleistung|"
+    r"haushaltsnahe|nebenkostenabrechnung|steuerbescheinigung"
+)
+
+
+def parse_amount(value: str) -> float:
+    value = value.replace(" ", "").replace("'", "")
+    if re.search(r",\d{2}$", value):
+        value = value.replace(".", "").replace(",", ".")
+    else:
+        value = value.replace(",", "")
+    return float(value)
+
+
+def _to_date(match: re.Match) -> Optional[date]:
+    day, month, year, iso_year, iso_month, iso_day = match.groups()[:6]
+    try:
+        if iso_year:
+            return date(int(iso_year), int(iso_month), int(iso_day))
+        year_value = int(year)
+        if year_value < 100:
+            year_value += 2000
+        return date(year_value, int(month), int(day))
+    except (TypeError, ValueError):
+        return None
+
+
+def iban_is_valid(iban: str) -> bool:
+    iban = iban.replace(" ", "").upper()
+    if not 15 <= len(iban) <= 34:
+        return False
+    rearranged = iban[4:] + iban[:4]
+    digits = "".join(str(int(c, 36)) for c in rearranged)
+    return int(digits) % 97 == 1
+
+
+class RuleExtractor:
+    """Regex-based extraction for documents with well-known layouts.
+
+    Produces the same ``ExtractedData`` as the LLM, with a confidence per
+    field, so the processor can decide whether the LLM is needed at all.
+    """
+
+    def __init__(self, cfg: RulesConfig):
+        self.cfg = cfg
+        self._issuers = [(issuer, re.compile(re.escape(issuer), re.IGNORECASE)) for issuer in cfg.known_issuers]
+
+    def extract(self, text: str) -> ExtractedData:
+        confidence: dict[str, float] = {}
+        lines = [line.strip() for line in text.splitlines() if line.strip()]
+
+        document_type, confidence["document_type"] = self._document_type(lines)
+        issuer, confidence["issuer"] = self._issuer(text, lines)
+        document_date, confidence["document_date"] = self._document_date(text)
+        amount, confidence["amount_total"] = self._amount(text)
+        due_date, confidence["due_date"] = self._due_date(text, document_date)
+
+        iban = None
+        for match in _IBAN.finditer(text):
+            if iban_is_valid(match.group(1)):
+                iban = match.group(1).replace(" ", "")
+                break
+        confidence["iban"] = 0.99 if iban else 0.5
+
+        invoice = _INVOICE_NUMBER.search(text)
+        invoice_number = invoice.group(1) if invoice else None
+        confidence["invoice_number"] = 0.9 if invoice_number else 0.5
+
+        if "€" in text or re.search(r"\bEUR\b", text):
+            currency, confidence["currency"] = "EUR", 0.95
+        elif re.search(r"\bCHF\b", text):
+            currency, confidence["currency"] = "CHF", 0.9
+        elif re.search(r"\bUSD\b|\$", text):
+            currency, confidence["currency"] = "USD", 0.9
+        else:
+            currency, confidence["currency"] = "EUR", 0.5
+
+        tax_relevant = bool(_TAX_HINTS.search(text))
+        confidence["is_tax_relevant"] = 0.7 if tax_relevant else 0.5
+
+        return ExtractedData(
+            document_type=document_type,
+            issuer=issuer,
+            document_date=document_date,
+            amount_total=amount,
+            currency=currency,
+            due_date=due_date,
+            iban=iban,
+            invoice_number=invoice_number,
+            is_tax_relevant=tax_relevant,
+            tax_category=None,
+            confidence=confidence,
+            summary=lines[:3],
+        )
+
+    def is_confident(self, data: ExtractedData) -> bool:
+        """True if every required field was found with at least ``min_confidence``."""
+        values = data.to_dict()
+        return all(
+            values.get(name) is not None and data.confidence.get(name, 0.0) >= self.cfg.min_confidence
+            for name in self.cfg.required_fields
+        )
+
+    def _document_type(self, lines: list[str]) -> tuple[str, float]:
+        head = "\n".join(lines[:30])
+        for name, pattern in DOCUMENT_TYPES:
+            if pattern.search(head):
+                return name, 0.85
+        body = "\n".join(lines)
+        for name, pattern in DOCUMENT_TYPES:
+            if pattern.search(body):
+                return name, 0.6
+        return "Sonstiges", 0.3
+
+    def _issuer(self, text: str, lines: list[str]) -> tuple[str, float]:
+        for issuer, pattern in self._issuers:
+            if pattern.search(text):
+                return issuer, 0.95
+        for index, line in enumerate(lines[:10]):
+            if _LEGAL_FORM.search(line) and len(line) <= 80:
+                # a company name in the letterhead is far more reliable than one further down
+                return line, 0.85 if index < 3 else 0.7
+        return (lines[0][:80], 0.3) if lines else ("Unbekannt", 0.0)
+
+    def _document_date(self, text: str) -> tuple[Optional[date], float]:
+        match = _LABELED_DATE.search(text)
+        if match and (value := _to_date(match)):
+            return value, 0.9
+        for match in _DATE_RE.finditer(text):
+            if value := _to_date(match):
+                return value, 0.6
+        return None, 0.0
+
+    def _due_date(self, text: str, document_date: Optional[date]) -> tuple[Optional[date], float]:
+        match = _DUE_DATE.search(text)
+        if match and (value := _to_date(match)):
+            return value, 0.9
+        days = _DUE_DAYS.search(text)
+        if days and document_date:
+            return document_date + timedelta(days=int(days.group(1))), 0.75
+        return None, 0.5
+
+    def _amount(self, text: str) -> tuple[Optional[float], float]:
+        totals = [parse_amount(m.group(1)) for m in _TOTAL.finditer(text)]
+        if totals:
+            # the last labelled total is usually the gross amount after subtotals and VAT
+            return totals[-1], 0.9
+        amounts = [parse_amount(m.group(1)) for m in _AMOUNT_RE.finditer(text)]
+        if amounts:
+            return max(amounts), 0.5
+        return None, 0.0
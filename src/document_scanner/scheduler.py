@@ -0,0 +1,99 @@
+import logging
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from .metrics import PROFILE_BACKLOG
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+
+class FairScheduler:
+    """Feeds the jobs of several hotfolder profiles into one pipeline, round-robin.
+
+    Every profile has its own backlog. A feeder thread takes up to
+    ``weight`` jobs from one profile, then moves on to the next one with
+    work queued, and blocks on the pipeline's bounded first queue in
+    between. A folder that receives hundreds of scans at once therefore
+    delays the files of the other folders by at most its weight per round.
+    """
+
+    def __init__(self, submit: Callable[[Job], None], weights: dict[str, int]):
+        if not weights:
+            raise ValueError("Scheduler braucht mindestens ein Profil")
+        self._submit = submit
+        self._weights = {name: max(1, weight) for name, weight in weights.items()}
+        self._order = list(self._weights)
+        self._backlogs: dict[str, deque[Job]] = {name: deque() for name in self._order}
+        self._turn = 0
+        self._served = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "FairScheduler":
+        self._thread = threading.Thread(target=self._run, name="scheduler", daemon=True)
+        self._thread.start()
+        return self
+
+    def put(self, job: Job) -> None:
+        backlog = self._backlogs.get(job.profile)
+        if backlog is None:
+            raise ValueError(f"Unbekanntes Profil: {job.profile}")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("Scheduler ist bereits beendet")
+            backlog.append(job)
+            PROFILE_BACKLOG.set(len(backlog), profile=job.profile)
+            self._cond.notify()
+
+    def pending(self) -> dict[str, int]:
+        with self._cond:
+            return {name: len(backlog) for name, backlog in self._backlogs.items()}
+
+    def close(self, drain: bool = True) -> None:
+        """Stop accepting jobs and stop the feeder thread.
+
+        With ``drain`` the remaining backlog is handed to the pipeline first,
+        otherwise it is dropped (the files stay in their hotfolders).
+        """
+        with self._cond:
+            self._closed = True
+            if not drain:
+                dropped = sum(len(backlog) for backlog in self._backlogs.values())
+                if dropped:
+                    logger.info("%d wartende Dateien werden beim nächsten Start verarbeitet", dropped)
+                for name, backlog in self._backlogs.items():
+                    backlog.clear()
+                    PROFILE_BACKLOG.set(0, profile=name)
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._closed and not any(self._backlogs.values()):
+                    self._cond.wait()
+                if not any(self._backlogs.values()):
+                    return
+                job = self._next()
+            try:
+                self._submit(job)
+            except Exception:  # noqa: BLE001
+                logger.exception("Übergabe von %s an die Pipeline fehlgeschlagen", job.source_path.name)
+
+    def _next(self) -> Job:
+        # caller holds the lock and made sure at least one backlog has work
+        while True:
+            name = self._order[self._turn]
+            backlog = self._backlogs[name]
+            if backlog and self._served < self._weights[name]:
+                self._served += 1
+                job = backlog.popleft()
+                PROFILE_BACKLOG.set(len(backlog), profile=name)
+                return job
+            self._turn = (self._turn + 1) % len(self._order)
+            self._served = 0
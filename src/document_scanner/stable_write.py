@@ -1,27 +1,128 @@
+import heapq
+import logging
+import os
+import threading
 import time
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional
+from typing import Callable, Optional
 
+logger = logging.getLogger(__name__)
 
-def wait_for_stable_file(path: Path, timeout: float = 30.0, interval: float = 0.5) -> bool:
-    """Return True when file size stays constant for two checks within timeout."""
-    end_time = time.time() + timeout
-    last_size: Optional[int] = None
-    while time.time() < end_time:
+
+@dataclass
+class _Pending:
+    size: int
+    deadline: float
+    give_up: float
+
+
+class StabilityTracker:
+    """Detects when files in the hotfolder are completely written, for many files at once.
+
+    Driven by watchdog events instead of polling per file: ``closed`` (inotify
+    ``IN_CLOSE_WRITE``) and ``moved`` into the folder report a file as ready
+    immediately; on platforms without close events a file is ready once its
+    size and mtime have not changed for ``settle`` seconds. A single timer
+    thread with a deadline heap serves all pending files.
+    """
+
+    def __init__(self, on_ready: Callable[[Path], None], settle: float = 1.0, timeout: float = 300.0):
+        self.on_ready = on_ready
+        self.settle = settle
+        self.timeout = timeout
+        self._pending: dict[Path, _Pending] = {}
+        self._emitted: dict[Path, tuple[int, int]] = {}
+        self._heap: list[tuple[float, Path]] = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name="stability-tracker", daemon=True)
+        self._thread.start()
+
+    def close(self) -> None:
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._pending)
+
+    def touch(self, path: Path) -> None:
+        """A file was created or written to; (re)start its settle window."""
+        stat = self._stat(path)
+        if stat is None:
+            return
+        now = time.time()
+        with self._cond:
+            entry = self._pending.get(path)
+            give_up = entry.give_up if entry else now + self.timeout
+            # an mtime older than the settle window (e.g. found by the startup scan) is ready right away
+            deadline = max(stat.st_mtime, now - self.settle) + self.settle
+            self._pending[path] = _Pending(stat.st_size, deadline, give_up)
+            heapq.heappush(self._heap, (deadline, path))
+            self._cond.notify()
+
+    def closed(self, path: Path) -> None:
+        """The writer closed the file (or it was moved in atomically): ready if not empty."""
+        with self._cond:
+            self._pending.pop(path, None)
+        self._emit(path)
+
+    def forget(self, path: Path) -> None:
+        """The file was deleted or moved away."""
+        with self._cond:
+            self._pending.pop(path, None)
+            self._emitted.pop(path, None)
+
+    def _stat(self, path: Path) -> Optional[os.stat_result]:
         try:
-            size = path.stat().st_size
+            return path.stat()
         except FileNotFoundError:
-            time.sleep(interval)
-            continue
-        if size == 0:
-            time.sleep(interval)
-            continue
-        if last_size is None:
-            last_size = size
-            time.sleep(interval)
-            continue
-        if size == last_size:
-            return True
-        last_size = size
-        time.sleep(interval)
-    return False
+            return None
+
+    def _emit(self, path: Path) -> None:
+        stat = self._stat(path)
+        if stat is None or stat.st_size == 0:
+            return
+        fingerprint = (stat.st_size, stat.st_mtime_ns)
+        with self._cond:
+            # late modified/closed events for a file that was already handed over
+            if self._emitted.get(path) == fingerprint:
+                return
+            self._emitted[path] = fingerprint
+        self.on_ready(path)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._stopped and (not self._heap or self._heap[0][0] > time.time()):
+                    timeout = self._heap[0][0] - time.time() if self._heap else None
+                    self._cond.wait(timeout)
+                if self._stopped:
+                    return
+                deadline, path = heapq.heappop(self._heap)
+                entry = self._pending.get(path)
+                if entry is None or entry.deadline != deadline:
+                    continue  # superseded by a newer event
+            stat = self._stat(path)
+            now = time.time()
+            with self._cond:
+                if self._pending.get(path) is not entry:
+                    continue
+                if stat is None:
+                    del self._pending[path]
+                    continue
+                settled = stat.st_size == entry.size and stat.st_size > 0 and now - stat.st_mtime >= self.settle
+                if not settled:
+                    if now >= entry.give_up:
+                        del self._pending[path]
+                        logger.warning("Datei wurde nicht stabil: %s", path)
+                        continue
+                    entry.size = stat.st_size
+                    entry.deadline = max(stat.st_mtime, now) + self.settle
+                    heapq.heappush(self._heap, (entry.deadline, path))
+                    continue
+                del self._pending[path]
+            self._emit(path)
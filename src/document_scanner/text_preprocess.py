@@ -0,0 +1,139 @@
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from .llm_client import estimate_tokens
+
+GAP_MARKER = "[...]"
+
+_CONTROL_CHARS = re.compile(r"[\x00-\x08\x0b-\x1f\x7f\ufffd]")
+_HYPHEN_BREAK = re.compile(r"(\w)-\n(\w)")
+_SPACES = re.compile(r"[ \t\u00a0]+")
+_DIGITS = re.compile(r"\d+")
+
+_FIELD_PATTERNS = [
+    (re.compile(r"\b[A-Z]{2}\d{2}(?: ?[A-Z0-9]{4}){3,7}(?: ?[A-Z0-9]{1,3})?\b"), 5),  # IBAN
+    (re.compile(r"\d{1,3}(?:[.\s]\d{3})*,\d{2}\b|\b\d+\.\d{2}\b"), 3),  # Betrag
+    (re.compile(r"\b\d{1,2}\.\s?\d{1,2}\.\s?(?:\d{4}|\d{2})\b|\b\d{4}-\d{2}-\d{2}\b"), 3),  # Datum
+    (re.compile(r"(?i)\b(?:EUR|€|USD|CHF)\b|€"), 2),
+    (
+        re.compile(
+            r"(?i)\b(?:rechnung|betrag|summe|gesamt|zahlbar|fällig|faellig|zahlung|mwst|ust|steuer|"
+            r"kunden-?nr|rechnungs-?nr|referenz|verwendungszweck|bic|datum|invoice|total|due)"
+        ),
+        2,
+    ),
+]
+
+
+@dataclass
+class PreparedText:
+    text: str
+    tokens_before: int
+    tokens_after: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.tokens_before - self.tokens_after
+
+
+def normalize_ocr_text(text: str) -> str:
+    """Remove control characters, rejoin hyphenated line breaks and drop lines that are pure OCR noise."""
+    text = _CONTROL_CHARS.sub("", text.replace("\r\n", "\n"))
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    lines = []
+    for line in text.split("\n"):
+        line = _SPACES.sub(" ", line).strip()
+        if not line:
+            if lines and lines[-1]:
+                lines.append("")
+            continue
+        alnum = sum(1 for c in line if c.isalnum())
+        if alnum == 0 or (len(line) > 3 and alnum / len(line) < 0.3):
+            continue
+        lines.append(line)
+    return "\n".join(lines).strip()
+
+
+def _line_key(line: str) -> str:
+    # page numbers and dates differ between otherwise identical headers/footers
+    return _DIGITS.sub("#", line.lower())
+
+
+def remove_repeated_lines(pages: list[str], edge_lines: int = 4) -> list[str]:
+    """Drop header/footer lines that repeat on most pages, keeping them on the first page only."""
+    if len(pages) < 2:
+        return pages
+    split_pages = [page.split("\n") for page in pages]
+    counts: Counter[str] = Counter()
+    for lines in split_pages:
+        edges = lines[:edge_lines] + lines[-edge_lines:]
+        counts.update({_line_key(line) for line in edges if line})
+    threshold = max(2, (len(pages) + 1) // 2)
+    repeated = {key for key, count in counts.items() if count >= threshold}
+    result = ["\n".join(split_pages[0])]
+    for lines in split_pages[1:]:
+        kept = [
+            line
+            for index, line in enumerate(lines)
+            if not ((index < edge_lines or index >= len(lines) - edge_lines) and _line_key(line) in repeated)
+        ]
+        result.append("\n".join(kept))
+    return result
+
+
+def score_line(line: str) -> int:
+    return sum(weight for pattern, weight in _FIELD_PATTERNS if pattern.search(line))
+
+
+def select_within_budget(pages: list[str], budget: int) -> str:
+    """Keep the lines most likely to hold the schema fields until ``budget`` tokens are used.
+
+    The first page (issuer, dates, reference numbers) and the last page
+    (totals, payment details) get a bonus; lines with amounts, IBANs, dates
+    or payment keywords rank above plain body text. Selected lines are
+    emitted in document order with a gap marker where lines were left out.
+    """
+    lines = [
+        (page_index, line)
+        for page_index, page in enumerate(pages)
+        for line in page.split("\n")
+        if line.strip()
+    ]
+    last_page = len(pages) - 1
+
+    def priority(position: int) -> int:
+        page_index, line = lines[position]
+        score = score_line(line)
+        if page_index == 0:
+            score += 3
+        elif page_index == last_page:
+            score += 1
+        return score
+
+    order = sorted(range(len(lines)), key=lambda position: (-priority(position), position))
+    chosen: set[int] = set()
+    used = 0
+    for position in order:
+        cost = estimate_tokens(lines[position][1])
+        if used + cost <= budget:
+            chosen.add(position)
+            used += cost
+
+    output: list[str] = []
+    for position, (_, line) in enumerate(lines):
+        if position in chosen:
+            output.append(line)
+        elif output and output[-1] != GAP_MARKER:
+            output.append(GAP_MARKER)
+    return "\n".join(output)
+
+
+def prepare_llm_text(pages: list[str], token_budget: Optional[int] = None) -> PreparedText:
+    tokens_before = estimate_tokens("\n".join(pages))
+    cleaned = remove_repeated_lines([normalize_ocr_text(page) for page in pages])
+    text = "\n".join(page for page in cleaned if page).strip()
+    if token_budget and estimate_tokens(text) > token_budget:
+        text = select_within_budget(cleaned, token_budget)
+    return PreparedText(text=text, tokens_before=tokens_before, tokens_after=estimate_tokens(text))
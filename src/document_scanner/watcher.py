@@ -1,34 +1,53 @@
 import logging
 from pathlib import Path
-from typing import Callable
 
 from watchdog.events import FileSystemEventHandler
 from watchdog.observers import Observer
 
-from .stable_write import wait_for_stable_file
+from .stable_write import StabilityTracker
 
 logger = logging.getLogger(__name__)
 
 
 class HotfolderHandler(FileSystemEventHandler):
-    def __init__(self, callback: Callable[[Path], None]):
-        self.callback = callback
+    """Forwards write events to the tracker, which reports files once they are complete."""
+
+    def __init__(self, tracker: StabilityTracker):
+        self.tracker = tracker
 
     def on_created(self, event):
         if event.is_directory:
             return
         path = Path(event.src_path)
         logger.info("Neue Datei erkannt: %s", path)
-        if wait_for_stable_file(path):
-            self.callback(path)
-        else:
-            logger.warning("Datei wurde nicht stabil: %s", path)
+        self.tracker.touch(path)
+
+    def on_modified(self, event):
+        if not event.is_directory:
+            self.tracker.touch(Path(event.src_path))
+
+    def on_closed(self, event):
+        if not event.is_directory:
+            self.tracker.closed(Path(event.src_path))
+
+    def on_moved(self, event):
+        if event.is_directory:
+            return
+        self.tracker.forget(Path(event.src_path))
+        # renamed into the folder (e.g. "scan.tmp" -> "scan.pdf"): the content is complete
+        if Path(event.dest_path).parent == Path(event.src_path).parent:
+            self.tracker.closed(Path(event.dest_path))
+
+    def on_deleted(self, event):
+        if not event.is_directory:
+            self.tracker.forget(Path(event.src_path))
 
 
-def watch_directory(path: Path, callback: Callable[[Path], None]):
+def watch_directories(trackers: dict[Path, StabilityTracker]):
+    """One observer thread for all hotfolders, each reporting to its own tracker."""
     observer = Observer()
-    handler = HotfolderHandler(callback)
-    observer.schedule(handler, str(path), recursive=False)
+    for path, tracker in trackers.items():
+        observer.schedule(HotfolderHandler(tracker), str(path), recursive=False)
+        logger.info("Watcher gestartet auf %s", path)
     observer.start()
-    logger.info("Watcher gestartet auf %s", path)
     return observer
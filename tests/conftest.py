@@ -0,0 +1,69 @@
+from datetime import date
+
+import pytest
+
+from document_scanner.models import ExtractedData, PageText, TextExtraction
+
+EXTRACTED = ExtractedData(
+    document_type="Rechnung",
+    issuer="Beispiel GmbH",
+    document_date=date(2024, 1, 2),
+    amount_total=49.99,
+    currency="EUR",
+    due_date=date(2024, 1, 16),
+    iban=None,
+    invoice_number="R-1",
+    is_tax_relevant=False,
+    tax_category=None,
+)
+
+
+class FakeProcessor:
+    """DocumentProcessor without OCR, LLM and Graph; records what the pipeline asked for.
+
+    Files named ``kaputt*`` fail in the text stage.
+    """
+
+    def __init__(self, cfg=None, extracted=EXTRACTED):
+        self.cfg = cfg
+        self.extracted = extracted
+        self.processed = []
+        self.hashes = []
+        self.uploads = []
+        self.calendar_calls = []
+
+    def open_document(self, path):
+        return None
+
+    def extract_text(self, path, document=None, sha256=None):
+        if path.name.startswith("kaputt"):
+            raise ValueError("kaputt")
+        self.hashes.append(sha256)
+        text = document.page_text(0) if document is not None else path.read_text()
+        return TextExtraction(pages=[PageText(0, "text", text, 0.0)])
+
+    def extract_data(self, text, pages):
+        self.processed.append(text)
+        return self.extracted
+
+    def write_report(self, path, extracted, document, pages):
+        return path
+
+    def upload(self, graph, report_path, extracted):
+        self.uploads.append(report_path.name)
+        return f"https://onedrive/{report_path.name}"
+
+    def create_calendar_event(self, graph, extracted, link):
+        self.calendar_calls.append(link)
+        return "event"
+
+
+@pytest.fixture
+def extracted():
+    return EXTRACTED
+
+
+@pytest.fixture
+def fake_processor():
+    """Factory for :class:`FakeProcessor`, e.g. ``fake_processor(profile_cfg)``."""
+    return FakeProcessor
@@ -0,0 +1,136 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from document_scanner.batch import BatchExtractor, run_batch
+from document_scanner.config import GraphConfig, HotfolderConfig, LLMConfig, OneDriveConfig, ScannerConfig
+from document_scanner.llm_client import LLMExtractor
+from document_scanner.rules import RuleExtractor
+
+PAYLOAD = {
+    "document_type": "Rechnung",
+    "issuer": "Beispiel GmbH",
+    "document_date": "2024-01-02",
+    "amount_total": 49.99,
+    "currency": "EUR",
+    "due_date": None,
+    "iban": None,
+    "invoice_number": None,
+    "is_tax_relevant": False,
+    "tax_category": None,
+    "confidence": {},
+    "summary": [],
+}
+
+
+class FakeBatchAPI(BaseHTTPRequestHandler):
+    """Minimal stand-in for the OpenAI files and batches endpoints."""
+
+    requests: list[dict] = []
+    polls = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _json(self, body):
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _batch(self, status):
+        return {
+            "id": "batch-1",
+            "object": "batch",
+            "endpoint": "/v1/chat/completions",
+            "input_file_id": "file-in",
+            "completion_window": "24h",
+            "created_at": 0,
+            "status": status,
+            "output_file_id": "file-out" if status == "completed" else None,
+            "error_file_id": None,
+        }
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+        if self.path == "/v1/files":
+            FakeBatchAPI.requests = [json.loads(l) for l in body.splitlines() if l.startswith('{"custom_id"')]
+            self._json({"id": "file-in", "object": "file", "bytes": len(body), "created_at": 0,
+                        "filename": "batch.jsonl", "purpose": "batch", "status": "processed"})
+        elif self.path == "/v1/batches":
+            self._json(self._batch("validating"))
+
+    def do_GET(self):
+        if self.path == "/v1/batches/batch-1":
+            FakeBatchAPI.polls += 1
+            self._json(self._batch("completed" if FakeBatchAPI.polls > 1 else "in_progress"))
+        elif self.path == "/v1/files/file-out/content":
+            lines = []
+            for request in FakeBatchAPI.requests:
+                if "kaputt" in request["body"]["messages"][1]["content"]:
+                    lines.append({"custom_id": request["custom_id"], "response": {"status_code": 500, "body": {}}})
+                    continue
+                answer = {"choices": [{"message": {"content": json.dumps(PAYLOAD)}}]}
+                lines.append({"custom_id": request["custom_id"], "response": {"status_code": 200, "body": answer}})
+            data = "\n".join(json.dumps(line) for line in lines).encode()
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+
+@pytest.fixture
+def fake_api():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeBatchAPI)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+
+
+def test_batch_roundtrip_against_fake_server(fake_api):
+    extractor = LLMExtractor(api_key="test", base_url=fake_api)
+    batch_extractor = BatchExtractor(extractor, poll_interval=0.01)
+    batch_id = batch_extractor.submit({"doc-0": "Rechnung 49,99", "doc-1": "kaputt"}, schema={})
+    batch = batch_extractor.wait(batch_id, timeout=5)
+    results = batch_extractor.results(batch)
+    assert results["doc-0"] == PAYLOAD
+    assert isinstance(results["doc-1"], RuntimeError)
+    assert [r["url"] for r in FakeBatchAPI.requests] == ["/v1/chat/completions"] * 2
+
+
+def test_batch_without_llm_uses_rules_and_counts_every_failure(tmp_path, fake_processor):
+    cfg = ScannerConfig(
+        hotfolder=HotfolderConfig(
+            input_dir=tmp_path / "in",
+            processed_dir=tmp_path / "processed",
+            failed_dir=tmp_path / "failed",
+            archive_dir=tmp_path / "archive",
+        ),
+        onedrive=OneDriveConfig(base_path="/Dokumente"),
+        graph=GraphConfig(client_id="", tenant_id="", authority=""),
+        llm=LLMConfig(enabled=False),
+    )
+    archive = tmp_path / "archiv"
+    archive.mkdir()
+    for name in ("a.pdf", "b.pdf", "kaputt.pdf"):
+        (archive / name).write_text("Rechnung Gesamtbetrag 49,99 EUR")
+    processor = fake_processor()
+    processor.rules = RuleExtractor(cfg.rules)
+    upload = processor.upload
+
+    def flaky_upload(graph, report_path, extracted):
+        if report_path.name == "b.pdf":
+            raise RuntimeError("Upload fehlgeschlagen")
+        return upload(graph, report_path, extracted)
+
+    processor.upload = flaky_upload
+    counts = run_batch(cfg, processor, graph=None, directory=archive)
+    assert (counts["local"], counts["batched"], counts["failed"]) == (2, 0, 2)
+    assert processor.uploads == ["a.pdf"]
+    assert sorted(p.name for p in archive.iterdir()) == ["a.pdf", "b.pdf", "kaputt.pdf"]
+    assert not cfg.hotfolder.archive_dir.exists() and not cfg.hotfolder.failed_dir.exists()
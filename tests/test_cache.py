@@ -0,0 +1,65 @@
+import os
+import stat
+import time
+from datetime import date
+
+from document_scanner.cache import ResultCache, file_sha256, text_sha256
+from document_scanner.config import CacheConfig
+from document_scanner.models import ExtractedData, PageText, TextExtraction
+
+
+def _data():
+    return ExtractedData(
+        document_type="Rechnung",
+        issuer="Beispiel GmbH",
+        document_date=date(2024, 1, 2),
+        amount_total=49.99,
+        currency="EUR",
+        due_date=None,
+        iban=None,
+        invoice_number="INV-1",
+        is_tax_relevant=True,
+        tax_category=None,
+        confidence={"amount_total": 0.9},
+        summary=["Dienstleistung"],
+    )
+
+
+def test_cache_roundtrip_and_counters(tmp_path):
+    cache = ResultCache(CacheConfig(path=tmp_path / "cache.sqlite3"))
+    source = tmp_path / "scan.pdf"
+    source.write_bytes(b"%PDF-1.4 test")
+    key = file_sha256(source)
+    assert cache.get_text(key) is None
+    cache.put_text(key, TextExtraction(pages=[PageText(0, "ocr", "Hallo", 1.5)]))
+    assert cache.get_text(key).text == "Hallo"
+
+    data_key = text_sha256("Hallo", "gpt-4o-mini", "v1")
+    cache.put_extraction(data_key, _data())
+    assert cache.get_extraction(data_key) == _data()
+    assert cache.get_extraction(text_sha256("Hallo", "gpt-4o", "v1")) is None
+    assert cache.stats == {"text_hits": 1, "text_misses": 1, "extraction_hits": 1, "extraction_misses": 1}
+    cache.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(CacheConfig(path=tmp_path / "cache.sqlite3", max_entries=2))
+    for key in ("a", "b", "c"):
+        cache.put_extraction(key, _data())
+        time.sleep(0.01)
+    cache.get_extraction("a")
+    cache.evict()
+    assert cache.get_extraction("a") is not None
+    assert cache.get_extraction("b") is None
+    assert cache.get_extraction("c") is not None
+
+
+def test_cache_files_are_private(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    path.write_bytes(b"")
+    os.chmod(path, 0o644)  # created by an older version with the default umask
+    cache = ResultCache(CacheConfig(path=path))
+    cache.put_text("key", TextExtraction(pages=[PageText(0, "ocr", "IBAN DE89 3704 0044 0532 0130 00", 1.0)]))
+    for name in ("cache.sqlite3", "cache.sqlite3-wal", "cache.sqlite3-shm"):
+        assert stat.S_IMODE((tmp_path / name).stat().st_mode) == 0o600
+    cache.close()
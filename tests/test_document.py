@@ -0,0 +1,41 @@
+from io import BytesIO
+
+from PIL import Image
+
+from document_scanner.document import SourceDocument
+
+
+def _pdf(path, pages):
+    images = [Image.new("RGB", (200, 280), "white") for _ in range(pages)]
+    images[0].save(path, format="PDF", save_all=True, append_images=images[1:])
+    return path
+
+
+def test_save_after_prepends_report_pages(tmp_path):
+    original = _pdf(tmp_path / "scan.pdf", pages=3)
+    report = BytesIO()
+    Image.new("RGB", (200, 280), "white").save(report, format="PDF")
+    report.seek(0)
+    target = tmp_path / "merged.pdf"
+    with SourceDocument(original) as document, target.open("wb") as f:
+        assert len(document) == 3
+        document.save_after(report, f)
+    with SourceDocument(target) as merged:
+        assert len(merged) == 4
+
+
+def test_render_page_uses_dpi(tmp_path):
+    original = _pdf(tmp_path / "scan.pdf", pages=1)
+    with SourceDocument(original) as document:
+        width, height = document.page_size(0)
+        image = document.render_page(0, dpi=72)
+    assert image.size == (round(width), round(height))
+
+
+def test_image_input_becomes_pdf_pages(tmp_path):
+    scan = tmp_path / "scan.tiff"
+    frames = [Image.new("RGB", (300, 600), "white"), Image.new("L", (300, 600), 255)]
+    frames[0].save(scan, save_all=True, append_images=frames[1:], dpi=(150, 150))
+    with SourceDocument.from_image(scan) as document:
+        assert len(document) == 2
+        assert document.page_size(1) == (144, 288)
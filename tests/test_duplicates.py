@@ -0,0 +1,134 @@
+import stat
+from dataclasses import replace
+from datetime import date
+from hashlib import sha256
+
+from PIL import Image, ImageDraw
+
+from document_scanner.config import (
+    DuplicatesConfig,
+    GraphConfig,
+    HotfolderConfig,
+    OneDriveConfig,
+    ScannerConfig,
+)
+from document_scanner.document import SourceDocument
+from document_scanner.duplicates import DuplicateIndex, dhash, hamming, signature_similarity, text_signature
+from document_scanner.models import ExtractedData, Fingerprint, Job
+from document_scanner.pipeline import build_pipeline
+from document_scanner.report import build_report_page
+
+INVOICE = ExtractedData(
+    document_type="Rechnung",
+    issuer="Stadtwerke Musterstadt GmbH",
+    document_date=date(2024, 5, 2),
+    amount_total=123.45,
+    currency="EUR",
+    due_date=date(2024, 5, 16),
+    iban="DE89370400440532013000",
+    invoice_number="R-12345",
+    is_tax_relevant=False,
+    tax_category=None,
+)
+
+
+def _page(lines: list[str], dpi: int) -> Image.Image:
+    image = Image.new("L", (int(8.27 * dpi), int(11.69 * dpi)), 255)
+    draw = ImageDraw.Draw(image)
+    for n, line in enumerate(lines):
+        draw.rectangle((dpi, dpi * (1 + n / 3), dpi * (1 + len(line) / 12), dpi * (1.15 + n / 3)), fill=0)
+    return image
+
+
+def test_dhash_tolerates_rescans_but_not_other_layouts():
+    letter = ["Absender", "Empfänger", "Betreff", "Sehr geehrte Damen und Herren"] + ["Text " * 12] * 8
+    table = ["Position        Menge     Preis"] * 12
+    original = dhash(_page(letter, 150))
+    rescan = dhash(_page(letter, 300).rotate(0.5, fillcolor=255))
+    assert hamming(original, rescan) <= DuplicatesConfig.max_distance
+    assert hamming(original, dhash(_page(table, 150))) > DuplicatesConfig.max_distance
+
+
+def test_text_signature_compares_the_numbers():
+    scan = "Rechnung Nr. R-12345 vom 02.05.2024\nGesamt: 123,45 EUR\nIBAN DE89 3704 0044 0532 0130 00"
+    ocr = "Rechnunq Nr. R-12345 vorn 02.05.2024\nGesarnt: 123,45 EUR\nIBAN DE89 3704 0044 0532 0130 00"
+    other = "Rechnung Nr. R-12346 vom 02.06.2024\nGesamt: 98,10 EUR\nIBAN DE89 3704 0044 0532 0130 00"
+    assert signature_similarity(text_signature(scan), text_signature(ocr)) == 1.0
+    assert signature_similarity(text_signature(scan), text_signature(other)) < 0.8
+    assert signature_similarity(text_signature("Kein Betrag"), text_signature("Auch keiner")) == 0.0
+
+
+def test_index_persists_completed_documents_and_drops_stale_claims(tmp_path):
+    cfg = DuplicatesConfig(path=tmp_path / "duplicates.sqlite3")
+    index = DuplicateIndex(cfg)
+    done = Fingerprint("a" * 64, 1, [0])
+    pending = Fingerprint("b" * 64, 1, [(1 << 256) - 1])
+    assert index.claim(done, "a.pdf") == (None, [])
+    assert index.claim(pending, "b.pdf") == (None, [])
+    index.complete(Job(source_path=tmp_path / "a.pdf", fingerprint=done, onedrive_link="https://onedrive/a.pdf"))
+    index.close()
+
+    index = DuplicateIndex(cfg)
+    assert stat.S_IMODE(cfg.path.stat().st_mode) == 0o600
+    assert len(index) == 1
+    match, _ = index.claim(done, "a-kopie.pdf")
+    assert (match.source_name, match.reference) == ("a.pdf", "https://onedrive/a.pdf")
+    # b.pdf never finished, so a copy of it is processed again
+    assert index.claim(pending, "b-kopie.pdf") == (None, [])
+    # another department's hotfolder gets its own copy
+    assert index.claim(done, "a.pdf", profile="personal") == (None, [])
+    index.close()
+
+
+def test_copy_of_an_in_flight_document_is_processed_too(tmp_path):
+    index = DuplicateIndex(DuplicatesConfig(path=tmp_path / "duplicates.sqlite3"))
+    fingerprint = Fingerprint("a" * 64, 1, [0])
+    original = Job(source_path=tmp_path / "a.pdf", fingerprint=fingerprint)
+    copy = Job(source_path=tmp_path / "a-kopie.pdf", fingerprint=fingerprint)
+    assert index.claim(fingerprint, "a.pdf", owner=original.trace_id) == (None, [])
+    # the original may still fail, so the copy is not archived as its duplicate
+    assert index.claim(fingerprint, "a-kopie.pdf", owner=copy.trace_id) == (None, [])
+    index.forget(copy)
+    assert len(index) == 1  # the original's claim is not the copy's to drop
+    index.forget(original)
+    assert len(index) == 0
+    index.close()
+
+
+def test_pipeline_skips_exact_and_confirmed_similar_duplicates(tmp_path, fake_processor):
+    hotfolder = HotfolderConfig(
+        input_dir=tmp_path / "in",
+        processed_dir=tmp_path / "processed",
+        failed_dir=tmp_path / "failed",
+        archive_dir=tmp_path / "archive",
+    )
+    hotfolder.input_dir.mkdir()
+    cfg = ScannerConfig(
+        hotfolder=hotfolder,
+        onedrive=OneDriveConfig(base_path="/Dokumente"),
+        graph=GraphConfig(client_id="", tenant_id="", authority=""),
+        duplicates=DuplicatesConfig(path=tmp_path / "duplicates.sqlite3"),
+    )
+    original = build_report_page(INVOICE, "scan.pdf").getvalue()
+    next_invoice = replace(INVOICE, amount_total=98.1, invoice_number="R-12399")
+    files = {
+        "original.pdf": original,
+        "kopie.pdf": original,  # same file dropped twice
+        "email.pdf": build_report_page(INVOICE, "mail-anhang.pdf").getvalue(),  # same content, other bytes
+        "naechste.pdf": build_report_page(next_invoice, "scan.pdf").getvalue(),  # same layout, different invoice
+    }
+    processor = fake_processor(extracted=INVOICE)
+    processor.open_document = SourceDocument
+    index = DuplicateIndex(cfg.duplicates)
+    for name, data in files.items():
+        (hotfolder.input_dir / name).write_bytes(data)
+        pipeline = build_pipeline(cfg, processor, graph=None, duplicates=index).start()
+        pipeline.submit(Job(source_path=hotfolder.input_dir / name))
+        pipeline.shutdown()
+    index.close()
+
+    assert processor.calendar_calls == ["https://onedrive/original.pdf", "https://onedrive/naechste.pdf"]
+    assert len(processor.processed) == 2
+    # the text cache reuses the hash computed for the fingerprint instead of reading the file again
+    assert sha256(files["original.pdf"]).hexdigest() in processor.hashes and None not in processor.hashes
+    assert sorted(p.name for p in hotfolder.archive_dir.iterdir()) == sorted(files)
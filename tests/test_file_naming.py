@@ -1,7 +1,8 @@
+import threading
 from datetime import date
 from pathlib import Path
 
-from document_scanner.file_naming import build_filename, ensure_unique, sanitize_component
+from document_scanner.file_naming import NameAllocator, build_filename, sanitize_component
 
 
 def test_sanitize_component_strips_and_limits():
@@ -13,8 +14,40 @@ def test_build_filename_schema():
     assert name.startswith("2024-01-02__Rechnung__M-ller-Co__199.99__faellig_2024-01-15__tax_Y")
 
 
-def test_ensure_unique(tmp_path):
-    target = tmp_path / "file.pdf"
-    target.write_text("one")
-    unique = ensure_unique(target)
-    assert unique.name == "file__v2.pdf"
+def test_name_allocator_continues_after_existing_versions(tmp_path):
+    (tmp_path / "file.pdf").write_text("one")
+    (tmp_path / "file__v4.pdf").write_text("four")
+    (tmp_path / "other.pdf").write_text("other")
+    names = NameAllocator(tmp_path)
+    assert names.reserve("file.pdf").name == "file__v5.pdf"
+    assert names.reserve("file.pdf").name == "file__v6.pdf"
+    assert names.reserve("new.pdf").name == "new.pdf"
+    assert (tmp_path / "new.pdf").exists()
+
+
+def test_name_allocator_skips_files_created_behind_its_back(tmp_path):
+    names = NameAllocator(tmp_path)
+    (tmp_path / "file.pdf").write_text("external")
+    assert names.reserve("file.pdf").name == "file__v2.pdf"
+    assert (tmp_path / "file.pdf").read_text() == "external"
+
+
+def test_name_allocator_is_unique_across_threads(tmp_path):
+    names = NameAllocator(tmp_path / "processed")
+    results = []
+    lock = threading.Lock()
+
+    def worker():
+        for _ in range(25):
+            path = names.reserve("same.pdf")
+            with lock:
+                results.append(path)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(results)) == 200
+    # after a restart the index is rebuilt from the directory
+    assert NameAllocator(tmp_path / "processed").reserve("same.pdf").name == "same__v201.pdf"
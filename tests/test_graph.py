@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import pytest
+
+from document_scanner.config import CalendarConfig, GraphConfig, OneDriveConfig, ScannerConfig
+from document_scanner.graph import GraphClient
+
+
+class FakeGraph(BaseHTTPRequestHandler):
+    """Stand-in for the OneDrive simple upload and upload-session endpoints."""
+
+    protocol_version = "HTTP/1.1"
+    files: dict[str, bytes] = {}
+    sessions: dict[str, dict] = {}
+    fail_chunks: set[int] = set()
+    batches: list[int] = []
+    throttled: set[str] = set()
+    chunk_puts = 0
+
+    def log_message(self, *args):
+        pass
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _body(self):
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_PUT(self):
+        body = self._body()
+        if self.path.startswith("/upload/"):
+            session = FakeGraph.sessions[self.path]
+            FakeGraph.chunk_puts += 1
+            if FakeGraph.chunk_puts in FakeGraph.fail_chunks:
+                self._reply(503, {"error": "busy"})
+                return
+            assert "Authorization" not in self.headers
+            start, end_total = self.headers["Content-Range"].split(" ")[1].split("-")
+            end, total = (int(v) for v in end_total.split("/"))
+            assert int(start) == len(session["data"])
+            session["data"] += body
+            if len(session["data"]) == total:
+                FakeGraph.files[session["item"]] = bytes(session["data"])
+                self._reply(201, {"webUrl": f"https://onedrive.test{session['item']}"})
+            else:
+                self._reply(202, {"nextExpectedRanges": [f"{len(session['data'])}-"]})
+            return
+        item = self.path.split("root:")[1].rsplit(":/content", 1)[0]
+        FakeGraph.files[item] = body
+        self._reply(201, {"webUrl": f"https://onedrive.test{item}"})
+
+    def do_POST(self):
+        body = self._body()
+        if self.path.endswith("/$batch"):
+            FakeGraph.batches.append(len(json.loads(body)["requests"]))
+            responses = []
+            for request in json.loads(body)["requests"]:
+                subject = request["body"]["subject"]
+                if subject == "abgelehnt":
+                    responses.append({"id": request["id"], "status": 400, "body": {"error": "bad"}})
+                elif subject == "gedrosselt" and subject not in FakeGraph.throttled:
+                    FakeGraph.throttled.add(subject)
+                    responses.append({"id": request["id"], "status": 429, "headers": {"Retry-After": "0"}})
+                else:
+                    responses.append({"id": request["id"], "status": 201, "body": {"id": f"event-{subject}"}})
+            self._reply(200, {"responses": responses})
+            return
+        item = self.path.split("root:")[1].rsplit(":/createUploadSession", 1)[0]
+        upload_path = f"/upload/{len(FakeGraph.sessions)}"
+        FakeGraph.sessions[upload_path] = {"item": item, "data": bytearray()}
+        host, port = self.server.server_address
+        self._reply(200, {"uploadUrl": f"http://{host}:{port}{upload_path}"})
+
+    def do_GET(self):
+        session = FakeGraph.sessions[self.path]
+        self._reply(200, {"nextExpectedRanges": [f"{len(session['data'])}-"]})
+
+
+@pytest.fixture
+def graph():
+    FakeGraph.files, FakeGraph.sessions, FakeGraph.fail_chunks, FakeGraph.chunk_puts = {}, {}, set(), 0
+    FakeGraph.batches, FakeGraph.throttled = [], set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeGraph)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    cfg = GraphConfig(
+        client_id="test",
+        tenant_id="test",
+        authority="https://login.microsoftonline.com/test",
+        base_url=f"http://127.0.0.1:{server.server_address[1]}/v1.0",
+        simple_upload_max=1000,
+        upload_chunk_size=400,
+        batch_window=0.2,
+        token_cache_path=None,
+    )
+    client = GraphClient(cfg)
+    client._token = {"access_token": "token", "expires_at": time.time() + 3600}
+    yield client
+    client.close()
+    server.shutdown()
+
+
+def test_large_upload_resumes_after_failed_chunk(graph, tmp_path, monkeypatch):
+    monkeypatch.setattr("document_scanner.graph.time.sleep", lambda s: None)
+    FakeGraph.fail_chunks = {2}
+    source = tmp_path / "scan.pdf"
+    source.write_bytes(bytes(range(256)) * 10)
+    link = graph.upload_file(OneDriveConfig(base_path="/Dokumente"), "Rechnung/scan.pdf", source)
+    assert link == "https://onedrive.test/Dokumente/Rechnung/scan.pdf"
+    assert FakeGraph.files["/Dokumente/Rechnung/scan.pdf"] == source.read_bytes()
+
+
+def test_calendar_events_are_coalesced_into_batches(graph):
+    subjects = [f"rechnung-{n}" for n in range(43)] + ["gedrosselt", "abgelehnt"]
+
+    def create(subject):
+        try:
+            return graph.create_calendar_event(
+                CalendarConfig(), subject, datetime(2024, 1, 30, 9), "IBAN: -", 10.0, "EUR"
+            )
+        except RuntimeError as exc:
+            return exc
+
+    with ThreadPoolExecutor(max_workers=len(subjects)) as executor:
+        results = dict(zip(subjects, executor.map(create, subjects)))
+    assert results["rechnung-7"] == "event-rechnung-7"
+    assert results["gedrosselt"] == "event-gedrosselt"
+    assert isinstance(results["abgelehnt"], RuntimeError)
+    assert sum(FakeGraph.batches) == len(subjects) + 1  # only the throttled request is sent twice
+    assert max(FakeGraph.batches) == 20
+    assert len(FakeGraph.batches) <= 4
+
+
+class FakeMsalApp:
+    def __init__(self, cache):
+        self.cache = cache
+        self.silent_calls = 0
+        self.device_flows = 0
+
+    def get_accounts(self):
+        return [{"username": "scanner"}] if self.device_flows else []
+
+    def acquire_token_silent(self, scopes, account, force_refresh=False):
+        self.silent_calls += 1
+        return {"access_token": "refreshed", "expires_in": 3600}
+
+    def initiate_device_flow(self, scopes):
+        assert "offline_access" not in scopes
+        return {"user_code": "ABC"}
+
+    def acquire_token_by_device_flow(self, flow):
+        time.sleep(0.05)
+        self.device_flows += 1
+        self.cache.has_state_changed = True
+        return {"access_token": "fresh", "expires_in": 3600}
+
+
+def test_token_single_flight_and_cache_file(tmp_path):
+    cfg = GraphConfig(
+        client_id="test",
+        tenant_id="test",
+        authority="https://login.microsoftonline.com/test",
+        batch_requests=False,
+        token_cache_path=tmp_path / "token.json",
+    )
+    client = GraphClient(cfg)
+    client._app = FakeMsalApp(client._token_cache)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        tokens = list(executor.map(lambda _: client._acquire_token(), range(8)))
+    assert tokens == ["fresh"] * 8
+    assert client._app.device_flows == 1
+    assert (tmp_path / "token.json").exists()
+    if os.name == "posix":
+        assert (tmp_path / "token.json").stat().st_mode & 0o777 == 0o600
+
+    # shortly before expiry the token is refreshed silently instead of a new device flow
+    client._token["expires_at"] = time.time() + 60
+    assert client._acquire_token() == "refreshed"
+    assert client._app.device_flows == 1
+    client.close()
+
+
+def test_token_cache_path_can_be_switched_off():
+    hotfolder = {key: key for key in ("input_dir", "processed_dir", "failed_dir", "archive_dir")}
+
+    def token_cache_path(graph):
+        raw = {"hotfolder": hotfolder, "onedrive": {"base_path": "/Dokumente"}, "graph": graph}
+        return ScannerConfig.from_dict(raw).graph.token_cache_path
+
+    assert token_cache_path({}) == GraphConfig.token_cache_path
+    assert token_cache_path({"token_cache_path": "/var/lib/scanner/token.json"}) == Path("/var/lib/scanner/token.json")
+    assert token_cache_path({"token_cache_path": None}) is None
+    assert token_cache_path({"token_cache_path": ""}) is None
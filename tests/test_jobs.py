@@ -0,0 +1,90 @@
+import os
+import stat
+from dataclasses import replace
+
+from document_scanner.config import GraphConfig, HotfolderConfig, JobsConfig, OneDriveConfig, ScannerConfig
+from document_scanner.jobs import JobStore
+from document_scanner.models import PageText
+from document_scanner.pipeline import build_pipeline
+
+def _store(tmp_path):
+    return JobStore(JobsConfig(path=tmp_path / "jobs.sqlite3"))
+
+
+def test_job_resumes_after_last_completed_stage(tmp_path, extracted):
+    source = tmp_path / "scan.pdf"
+    source.write_bytes(b"%PDF")
+    store = _store(tmp_path)
+    job = store.begin(source)
+    assert job.stage is None
+    assert store.begin(source) is None  # already in flight
+
+    job = replace(job, text="Rechnung", pages=[PageText(0, "ocr", "Rechnung", 1.5)], extracted=extracted)
+    store.record(job, "llm")
+    store.close()
+
+    store = _store(tmp_path)
+    resumed = store.begin(source)
+    assert resumed.stage == "llm"
+    assert resumed.pages == job.pages
+    assert resumed.extracted == extracted
+
+    store.finish(resumed)
+    assert store.begin(source).stage is None  # finished records start over
+    store.close()
+
+
+def test_changed_file_starts_over(tmp_path):
+    source = tmp_path / "scan.pdf"
+    source.write_bytes(b"%PDF")
+    store = _store(tmp_path)
+    store.record(replace(store.begin(source), text="alt"), "text")
+    store.close()
+
+    source.write_bytes(b"%PDF neu")
+    os.utime(source, ns=(0, 0))
+    store = _store(tmp_path)
+    assert store.begin(source).stage is None
+    store.close()
+
+
+def _must_not_run(*args):
+    raise AssertionError("Abgeschlossene Stufe darf nicht erneut laufen")
+
+
+def test_pipeline_skips_completed_stages(tmp_path, extracted, fake_processor):
+    hotfolder = HotfolderConfig(
+        input_dir=tmp_path / "in",
+        processed_dir=tmp_path / "processed",
+        failed_dir=tmp_path / "failed",
+        archive_dir=tmp_path / "archive",
+    )
+    hotfolder.input_dir.mkdir()
+    source = hotfolder.input_dir / "scan.pdf"
+    source.write_bytes(b"%PDF")
+    cfg = ScannerConfig(
+        hotfolder=hotfolder,
+        onedrive=OneDriveConfig(base_path="/Dokumente"),
+        graph=GraphConfig(client_id="", tenant_id="", authority=""),
+    )
+    store = _store(tmp_path)
+    job = replace(store.begin(source), extracted=extracted, onedrive_link="https://onedrive/scan.pdf")
+    store.record(job, "upload")
+    store.release(job)  # simulated crash
+
+    processor = fake_processor()
+    processor.open_document = processor.upload = _must_not_run
+    pipeline = build_pipeline(cfg, processor, graph=None, store=store).start()
+    pipeline.submit(store.begin(source))
+    pipeline.shutdown()
+
+    assert processor.calendar_calls == ["https://onedrive/scan.pdf"]
+    assert (hotfolder.archive_dir / "scan.pdf").exists()
+    assert store.counts() == {"finished": 1}
+    store.close()
+
+
+def test_job_store_is_private(tmp_path):
+    store = _store(tmp_path)
+    assert stat.S_IMODE((tmp_path / "jobs.sqlite3").stat().st_mode) == 0o600
+    store.close()
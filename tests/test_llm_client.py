@@ -0,0 +1,95 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import pytest
+from openai import BadRequestError, RateLimitError
+
+from document_scanner.llm_client import LLMExtractor, TokenRateLimiter
+
+
+def _response(status, headers=None):
+    return SimpleNamespace(request=None, status_code=status, headers=headers or {})
+
+
+def test_rate_limiter_waits_for_refill():
+    limiter = TokenRateLimiter(tokens_per_minute=600)  # 10 tokens per second
+    assert limiter.acquire(600) == 0
+    start = time.monotonic()
+    limiter.acquire(2)
+    assert time.monotonic() - start >= 0.15
+
+
+def test_retries_rate_limit_then_succeeds():
+    extractor = LLMExtractor(api_key="test", max_retries=3, backoff_base=0.01)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) < 3:
+            raise RateLimitError("zu viele", response=_response(429, {"retry-after": "0"}), body=None)
+        return "ok"
+
+    assert extractor.call_with_retries(call) == "ok"
+    assert len(calls) == 3
+
+
+def test_does_not_retry_client_errors():
+    extractor = LLMExtractor(api_key="test", max_retries=3, backoff_base=0.01)
+    calls = []
+
+    def call():
+        calls.append(1)
+        raise BadRequestError("kaputt", response=_response(400), body=None)
+
+    with pytest.raises(BadRequestError):
+        extractor.call_with_retries(call)
+    assert len(calls) == 1
+
+
+def test_extract_sends_a_chat_completion_and_parses_the_json():
+    requests = []
+
+    class ChatAPI(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            requests.append((self.path, json.loads(self.rfile.read(int(self.headers["Content-Length"])))))
+            answer = {
+                "id": "chatcmpl-1",
+                "object": "chat.completion",
+                "created": 0,
+                "model": "gpt-4o-mini",
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {"role": "assistant", "content": json.dumps({"issuer": "Beispiel GmbH"})},
+                    }
+                ],
+            }
+            data = json.dumps(answer).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), ChatAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        # the real SDK client, so a call it does not accept fails here instead of in production
+        extractor = LLMExtractor(api_key="test", base_url=f"http://127.0.0.1:{server.server_address[1]}/v1")
+        result = extractor.extract("Rechnung 49,99", {"type": "object"}, model="gpt-4o")
+        extractor.close()
+    finally:
+        server.shutdown()
+    assert result == {"issuer": "Beispiel GmbH"}
+    path, body = requests[0]
+    assert path == "/v1/chat/completions"
+    assert body["model"] == "gpt-4o"
+    assert body["response_format"] == {"type": "json_object"}
+    assert body["messages"][1] == {"role": "user", "content": "Rechnung 49,99"}
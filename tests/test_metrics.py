@@ -0,0 +1,99 @@
+import json
+import logging
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from document_scanner.config import MetricsConfig
+from document_scanner.metrics import (
+    FAILURES,
+    STAGE_SECONDS,
+    Counter,
+    Histogram,
+    MetricsServer,
+    TraceIdFilter,
+    span,
+    trace_context,
+)
+from document_scanner.models import Job
+from document_scanner.pipeline import Pipeline, Stage
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("test_seconds", "Test", ("stage",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.5, 3.0):
+        histogram.observe(value, stage="ocr")
+    lines = histogram.render()
+    assert 'test_seconds_bucket{stage="ocr",le="0.1"} 1' in lines
+    assert 'test_seconds_bucket{stage="ocr",le="1"} 3' in lines
+    assert 'test_seconds_bucket{stage="ocr",le="+Inf"} 4' in lines
+    assert 'test_seconds_count{stage="ocr"} 4' in lines
+    assert histogram.count(stage="ocr") == 4
+
+
+def test_counter_rejects_unknown_labels():
+    counter = Counter("test_total", "Test", ("service",))
+    counter.inc(service="llm")
+    counter.inc(2, service="llm")
+    assert counter.value(service="llm") == 3
+    with pytest.raises(ValueError):
+        counter.inc(stage="llm")
+
+
+def test_spans_are_written_as_json_lines_with_trace_id(tmp_path: Path):
+    server = MetricsServer(MetricsConfig(port=None, trace_path=tmp_path / "traces.jsonl")).start()
+    try:
+        with trace_context("abc123"):
+            with span("report.build", renderer="vector"):
+                pass
+            with pytest.raises(RuntimeError):
+                with span("graph.upload"):
+                    raise RuntimeError("kaputt")
+    finally:
+        server.close()
+    events = [json.loads(line) for line in (tmp_path / "traces.jsonl").read_text().splitlines()]
+    assert [(e["span"], e["status"], e["trace_id"]) for e in events] == [
+        ("report.build", "ok", "abc123"),
+        ("graph.upload", "error", "abc123"),
+    ]
+    assert events[0]["renderer"] == "vector"
+
+
+def test_pipeline_records_stages_and_failures_per_job():
+    seen = []
+    filter_ = TraceIdFilter()
+
+    def check(job):
+        record = logging.LogRecord("test", logging.INFO, __file__, 0, "", (), None)
+        filter_.filter(record)
+        seen.append((job.source_path.name, record.trace_id))
+        if job.source_path.name == "b.pdf":
+            raise ValueError("kaputt")
+        return job
+
+    before = STAGE_SECONDS.count(stage="metrics-check")
+    failures = FAILURES.value(stage="metrics-check")
+    jobs = [Job(source_path=Path("a.pdf")), Job(source_path=Path("b.pdf"))]
+    pipeline = Pipeline([Stage("metrics-check", check)], on_error=lambda job, exc: None).start()
+    for job in jobs:
+        pipeline.submit(job)
+    pipeline.shutdown()
+    assert sorted(seen) == [("a.pdf", jobs[0].trace_id), ("b.pdf", jobs[1].trace_id)]
+    assert STAGE_SECONDS.count(stage="metrics-check") == before + 2
+    assert FAILURES.value(stage="metrics-check") == failures + 1
+
+
+def test_metrics_endpoint_serves_prometheus_text():
+    server = MetricsServer(MetricsConfig(port=0)).start()
+    try:
+        with span("endpoint-test"):
+            pass
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.port}/metrics") as response:
+            body = response.read().decode()
+            content_type = response.headers["Content-Type"]
+    finally:
+        server.close()
+    assert content_type.startswith("text/plain")
+    assert "# TYPE scanner_stage_duration_seconds histogram" in body
+    assert 'scanner_stage_duration_seconds_count{stage="endpoint-test"} 1' in body
@@ -0,0 +1,170 @@
+import sys
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+
+import pytest
+
+from PIL import Image
+
+from document_scanner import ocr
+from document_scanner.config import OCRConfig, PreprocessConfig
+from document_scanner.document import SourceDocument
+from document_scanner.report import _pdf_document
+
+
+def test_ocr_pages_keep_page_order(monkeypatch):
+    def fake_image_to_string(image, lang):
+        # later pages finish first
+        time.sleep(0.05 * (5 - image.width))
+        return f"seite {image.width}"
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", fake_image_to_string)
+    images = [Image.new("L", (width, 1)) for width in range(1, 5)]
+    cfg = OCRConfig(searchable_output=False, preprocess=PreprocessConfig(enabled=False))
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = ocr._ocr_images(images, cfg, executor)
+    assert [result.text for result in results] == ["seite 1", "seite 2", "seite 3", "seite 4"]
+
+
+def _closed(image):
+    try:
+        image.getpixel((0, 0))
+    except ValueError:
+        return True
+    return False
+
+
+def test_ocr_pages_are_streamed_with_bounded_memory(monkeypatch):
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", lambda image, lang: f"seite {image.width}")
+    cfg = OCRConfig(
+        workers=2, pages_in_flight_per_worker=1, searchable_output=False, preprocess=PreprocessConfig(enabled=False)
+    )
+    rendered = []
+
+    def render():
+        for width in range(1, 21):
+            # at most workers * pages_in_flight_per_worker pages may be alive when the next one is rendered
+            assert sum(not _closed(image) for image in rendered) <= 2
+            image = Image.new("L", (width, 1))
+            rendered.append(image)
+            yield image
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = ocr._ocr_images(render(), cfg, executor)
+    assert [result.text for result in results] == [f"seite {width}" for width in range(1, 21)]
+    assert all(_closed(image) for image in rendered)
+
+
+def test_page_dpi_adapts_to_oversized_pages():
+    a4, a3 = (595, 842), (842, 1191)
+    assert ocr.page_dpi(*a4, 300, 12.0) == 300
+    reduced = ocr.page_dpi(*a3, 300, 12.0)
+    assert reduced < 300
+    assert (a3[0] / 72 * reduced) * (a3[1] / 72 * reduced) == pytest.approx(12e6)
+    assert ocr.page_dpi(*a3, 300, None) == 300
+
+
+def test_page_needs_ocr_by_density_and_glyph_coverage():
+    cfg = OCRConfig()
+    a4 = (595, 842)
+    letter = "Sehr geehrte Damen und Herren, " * 20
+    assert not ocr.page_needs_ocr(letter, *a4, cfg)
+    assert ocr.page_needs_ocr("", *a4, cfg)
+    assert ocr.page_needs_ocr("Scan 01", *a4, cfg)
+    assert ocr.page_needs_ocr("\ufffd" * 600, *a4, cfg)
+
+
+HOCR = b"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE html PUBLIC "-//W3C//DTD XHTML 1.0 Transitional//EN"
+    "http://www.w3.org/TR/xhtml1/DTD/xhtml1-transitional.dtd">
+<html xmlns="http://www.w3.org/1999/xhtml" xml:lang="en" lang="en">
+ <body>
+  <div class='ocr_page' id='page_1' title='image "x.png"; bbox 0 0 1000 2000; ppageno 0'>
+   <span class='ocr_line' id='line_1_1' title="bbox 100 200 600 260">
+    <span class='ocrx_word' id='word_1_1' title='bbox 100 200 300 260; x_wconf 95'>Rechnung</span>
+    <span class='ocrx_word' id='word_1_2' title='bbox 350 200 600 260; x_wconf 91'><strong>M&#252;ller</strong></span>
+   </span>
+  </div>
+ </body>
+</html>"""
+
+
+def test_parse_hocr_returns_relative_word_boxes():
+    assert ocr.parse_hocr(HOCR) == [
+        ("Rechnung", 0.1, 0.1, 0.3, 0.13),
+        ("Müller", 0.35, 0.1, 0.6, 0.13),
+    ]
+
+
+class FakeTessAPI:
+    instances = 0
+
+    def __init__(self, lang):
+        FakeTessAPI.instances += 1
+        self.lang = lang
+
+    def SetImage(self, image):
+        self.image = image
+
+    def GetUTF8Text(self):
+        return f"seite {self.image.width}"
+
+    def GetHOCRText(self, page):
+        return (
+            "<div class='ocr_page' title='bbox 0 0 10 20'>"
+            "<span class='ocrx_word' title='bbox 1 2 5 4'>seite</span></div>"
+        )
+
+    def End(self):
+        pass
+
+
+def test_tesserocr_engine_is_created_once_per_worker(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tesserocr", types.SimpleNamespace(PyTessBaseAPI=FakeTessAPI))
+    monkeypatch.setattr(ocr, "_engines", threading.local())
+    cfg = OCRConfig(preprocess=PreprocessConfig(enabled=False))
+    results = ocr._ocr_images([Image.new("L", (width, 20)) for width in (10, 11, 12)], cfg, executor=None)
+    assert FakeTessAPI.instances == 1
+    assert [result.text for result in results] == ["seite 10", "seite 11", "seite 12"]
+    assert results[0].words == [("seite", 0.1, 0.1, 0.5, 0.2)]
+
+
+def test_preprocessor_is_per_thread_and_setting(monkeypatch):
+    monkeypatch.setattr(ocr, "_engines", threading.local())
+    sharp, soft = PreprocessConfig(), PreprocessConfig(binarize=False)
+    first = ocr._get_preprocessor(sharp)
+    assert ocr._get_preprocessor(soft) is not first
+    assert ocr._get_preprocessor(PreprocessConfig()) is first  # alternating profiles reuse their buffers
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert executor.submit(ocr._get_preprocessor, sharp).result() is not first
+
+
+def test_engine_falls_back_to_pytesseract(monkeypatch):
+    monkeypatch.setitem(sys.modules, "tesserocr", None)  # import fails
+    assert ocr.create_engine(OCRConfig()).name == "pytesseract"
+    with pytest.raises(RuntimeError):
+        ocr.create_engine(OCRConfig(engine="tesserocr"))
+
+
+def test_settings_key_follows_settings_that_change_the_text():
+    base = OCRConfig(workers=2)
+    assert ocr.settings_key(base) == ocr.settings_key(replace(base, workers=8, pages_in_flight_per_worker=4))
+    assert ocr.settings_key(base) != ocr.settings_key(replace(base, engine="pytesseract"))
+    assert ocr.settings_key(base) != ocr.settings_key(replace(base, min_chars_per_sq_inch=2.0))
+    assert ocr.settings_key(base) != ocr.settings_key(replace(base, preprocess=replace(base.preprocess, enabled=False)))
+
+
+def test_sparse_digital_page_is_not_overlaid_twice(monkeypatch, tmp_path):
+    path = tmp_path / "digital.pdf"
+    path.write_bytes(_pdf_document([(b"BT /F1 12 Tf 72 720 Td (Rechnung) Tj ET", (595, 842))]))
+    words = [("Rechnung", 0.12, 0.13, 0.21, 0.15), ("Stempel", 0.6, 0.8, 0.8, 0.83)]
+    monkeypatch.setattr(
+        ocr, "_ocr_images", lambda images, cfg, executor: [ocr.OcrResult("Rechnung Stempel", 0.0, words) for _ in images]
+    )
+    with SourceDocument(path) as document:
+        extraction = ocr.extract_text_from_pdf(document, OCRConfig(preprocess=PreprocessConfig(enabled=False)))
+    assert extraction.pages[0].method == "ocr"
+    assert [word[0] for word in extraction.pages[0].words] == ["Stempel"]
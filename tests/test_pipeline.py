@@ -0,0 +1,116 @@
+import threading
+
+from document_scanner.config import ScannerConfig
+from document_scanner.models import Job
+from document_scanner.pipeline import Pipeline, Stage, build_pipeline, move_into
+
+
+def test_pipeline_runs_all_stages():
+    results = []
+    lock = threading.Lock()
+
+    def collect(value):
+        with lock:
+            results.append(value)
+        return value
+
+    pipeline = Pipeline(
+        [Stage("double", lambda v: v * 2, workers=3), Stage("collect", collect)],
+        queue_size=2,
+    ).start()
+    for value in range(20):
+        pipeline.submit(value)
+    pipeline.shutdown()
+    assert sorted(results) == [v * 2 for v in range(20)]
+
+
+def test_pipeline_reports_errors_and_drops_none():
+    failed = []
+    passed = []
+
+    def check(value):
+        if value == 3:
+            raise ValueError("kaputt")
+        return value if value % 2 else None
+
+    pipeline = Pipeline(
+        [Stage("check", check), Stage("collect", passed.append)],
+        on_error=lambda job, exc: failed.append(job),
+    ).start()
+    for value in range(6):
+        pipeline.submit(value)
+    pipeline.shutdown()
+    assert failed == [3]
+    assert passed == [1, 5]
+
+
+
+def test_move_into_never_replaces_a_file(tmp_path):
+    archive = tmp_path / "archive"
+    for n, content in enumerate((b"erster", b"zweiter")):
+        source = tmp_path / f"in{n}" / "scan.pdf"
+        source.parent.mkdir()
+        source.write_bytes(content)
+        move_into(source, archive)
+        assert not source.exists()
+    assert (archive / "scan.pdf").read_bytes() == b"erster"
+    assert (archive / "scan__v2.pdf").read_bytes() == b"zweiter"
+    assert move_into(archive / "scan.pdf", archive) == archive / "scan.pdf"
+def test_profiles_inherit_defaults_and_route_jobs(tmp_path, fake_processor):
+    def folders(name):
+        return {key: str(tmp_path / name / key) for key in ("input_dir", "processed_dir", "failed_dir", "archive_dir")}
+
+    cfg = ScannerConfig.from_dict(
+        {
+            "onedrive": {"base_path": "/Dokumente"},
+            "llm": {"model": "gpt-4o-mini"},
+            "ocr": {"language": "deu"},
+            "duplicates": {"enabled": False},
+            "profiles": [
+                {"name": "buchhaltung", "hotfolder": folders("buchhaltung"), "onedrive": {"base_path": "/Buchhaltung"}},
+                {"name": "personal", "hotfolder": folders("personal"), "llm": {"model": "gpt-4o"}, "weight": 2},
+            ],
+        }
+    )
+    profiles = cfg.profile_configs()
+    assert cfg.hotfolder == profiles["buchhaltung"].hotfolder
+    assert [profiles[name].onedrive.base_path for name in profiles] == ["/Buchhaltung", "/Dokumente"]
+    assert [profiles[name].llm.model for name in profiles] == ["gpt-4o-mini", "gpt-4o"]
+    assert profiles["personal"].ocr.language == "deu"
+    assert [profile.weight for profile in cfg.profiles] == [1, 2]
+
+    processors = {name: fake_processor(profile_cfg) for name, profile_cfg in profiles.items()}
+    pipeline = build_pipeline(cfg, None, graph=None, processors=processors).start()
+    for name, profile_cfg in profiles.items():
+        profile_cfg.hotfolder.input_dir.mkdir(parents=True)
+        path = profile_cfg.hotfolder.input_dir / f"{name}.pdf"
+        path.write_text(name)
+        pipeline.submit(Job(source_path=path, profile=name))
+    pipeline.shutdown()
+
+    for name, profile_cfg in profiles.items():
+        assert processors[name].uploads == [f"{name}.pdf"]
+        assert [p.name for p in profile_cfg.hotfolder.archive_dir.iterdir()] == [f"{name}.pdf"]
+
+
+def test_shutdown_without_drain_only_finishes_running_jobs():
+    started = threading.Event()
+    release = threading.Event()
+    done, dropped = [], []
+
+    def slow(value):
+        started.set()
+        release.wait(5)
+        return value
+
+    pipeline = Pipeline(
+        [Stage("slow", slow), Stage("collect", done.append)], queue_size=10, on_drop=dropped.append
+    ).start()
+    for value in range(5):
+        pipeline.submit(value)
+    started.wait(5)
+    threading.Timer(0.2, release.set).start()
+    pipeline.shutdown(drain=False)
+    # job 0 was running and finishes its stage, the rest never started
+    assert done == []
+    assert sorted(dropped) == [0, 1, 2, 3, 4]
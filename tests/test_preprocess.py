@@ -0,0 +1,56 @@
+import numpy as np
+from PIL import Image, ImageDraw
+
+from document_scanner.config import PreprocessConfig
+from document_scanner.preprocess import ImagePreprocessor
+
+
+def _page(size=(1240, 1754), skew=0.0):
+    image = Image.new("L", size, 255)
+    draw = ImageDraw.Draw(image)
+    for y in range(200, 1500, 40):
+        for x in range(150, 1050, 90):
+            draw.rectangle((x, y, x + 70, y + 12), fill=0)
+    return image.rotate(-skew, fillcolor=255) if skew else image
+
+
+def _dark_box(image):
+    ys, xs = np.nonzero(np.asarray(image.convert("L")) < 128)
+    return xs.min(), ys.min(), xs.max() + 1, ys.max() + 1
+
+
+def test_deskew_straightens_text_lines():
+    preprocessor = ImagePreprocessor(PreprocessConfig(crop_borders=False, binarize=False))
+    prepared = preprocessor.prepare(_page(skew=2.0), dpi=150)
+    assert any(step.startswith("deskew=") for step in prepared.steps)
+    angle = float(next(step for step in prepared.steps if step.startswith("deskew=")).split("=")[1])
+    assert abs(angle - 2.0) <= 0.25
+    # straight lines: every text row is either fully dark across the block or empty
+    rows = (np.asarray(prepared.image)[:, 200:1000] < 128).mean(axis=1)
+    assert ((rows < 0.05) | (rows > 0.6)).mean() > 0.95
+
+
+def test_phone_photo_is_scaled_cropped_and_mapped_back():
+    photo = Image.new("RGB", (3508, 4961), "white")  # 12 MP, no DPI
+    draw = ImageDraw.Draw(photo)
+    draw.rectangle((0, 0, 120, 4960), fill="black")  # scanner/table edge
+    draw.rectangle((1000, 1500, 1400, 1600), fill="black")
+    preprocessor = ImagePreprocessor(PreprocessConfig(deskew=False))
+    prepared = preprocessor.prepare(photo)
+    assert prepared.image.mode == "1"
+    assert prepared.pixels_after < prepared.pixels_before / 4
+    assert "crop" in prepared.steps
+
+    width, height = prepared.image.size
+    x0, y0, x1, y1 = _dark_box(prepared.image)
+    box = prepared.map_box(x0 / width, y0 / height, x1 / width, y1 / height)
+    expected = (1000 / 3508, 1500 / 4961, 1401 / 3508, 1601 / 4961)
+    assert np.allclose(box, expected, atol=0.003)
+
+
+def test_buffers_are_reused_between_pages():
+    preprocessor = ImagePreprocessor(PreprocessConfig(deskew=False))
+    preprocessor.prepare(_page(), dpi=150)
+    buffers = {name: buffer.ctypes.data for name, buffer in preprocessor._buffers.items()}
+    preprocessor.prepare(_page(), dpi=150)
+    assert {name: buffer.ctypes.data for name, buffer in preprocessor._buffers.items()} == buffers
@@ -0,0 +1,84 @@
+from document_scanner.config import GraphConfig, HotfolderConfig, JobsConfig, OneDriveConfig, ScannerConfig
+from document_scanner.jobs import JobStore
+from document_scanner.replay import collect_files, run_replay
+
+
+def _cfg(tmp_path):
+    return ScannerConfig(
+        hotfolder=HotfolderConfig(
+            input_dir=tmp_path / "in",
+            processed_dir=tmp_path / "processed",
+            failed_dir=tmp_path / "failed",
+            archive_dir=tmp_path / "archive",
+        ),
+        onedrive=OneDriveConfig(base_path="/Dokumente"),
+        graph=GraphConfig(client_id="", tenant_id="", authority=""),
+    )
+
+
+def _files(directory, names):
+    directory.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        (directory / name).write_bytes(b"%PDF")
+    return collect_files(str(directory))
+
+
+def test_collect_files_from_directory_or_glob(tmp_path):
+    _files(tmp_path / "2023" / "01", ["a.pdf", "b.png", "notiz.txt"])
+    _files(tmp_path / "2023" / "02", ["c.PDF"])
+    assert [p.name for p in collect_files(str(tmp_path / "2023" / "01"))] == ["a.pdf", "b.png"]
+    assert [p.name for p in collect_files(str(tmp_path / "2023" / "**" / "*.pdf"))] == ["a.pdf"]
+    assert [p.name for p in collect_files(str(tmp_path / "2023" / "*" / "*"))] == ["a.pdf", "b.png", "c.PDF"]
+
+
+def test_replay_processes_files_and_summarises(tmp_path, fake_processor):
+    cfg = _cfg(tmp_path)
+    # reprocessing the failed folder: successes move on to the archive
+    files = _files(cfg.hotfolder.failed_dir, ["a.pdf", "b.pdf", "kaputt.pdf"])
+    processor = fake_processor()
+    summary = run_replay(cfg, processor, graph=None, files=files)
+    assert (summary.files, summary.processed, summary.failed, summary.pages) == (3, 2, 1, 2)
+    assert summary.documents_per_second > 0
+    assert "2 verarbeitet" in summary.format()
+    assert sorted(processor.uploads) == ["a.pdf", "b.pdf"]
+    assert sorted(p.name for p in cfg.hotfolder.archive_dir.iterdir()) == ["a.pdf", "b.pdf"]
+    assert [p.name for p in cfg.hotfolder.failed_dir.iterdir()] == ["kaputt.pdf"]
+
+
+def test_files_outside_the_hotfolder_stay_in_place(tmp_path, fake_processor):
+    cfg = _cfg(tmp_path)
+    _files(tmp_path / "archiv" / "2023" / "01", ["rechnung.pdf"])
+    _files(tmp_path / "archiv" / "2023" / "02", ["rechnung.pdf", "kaputt.pdf"])
+    files = collect_files(str(tmp_path / "archiv" / "**" / "*.pdf"))
+    summary = run_replay(cfg, fake_processor(), graph=None, files=files)
+    assert (summary.processed, summary.failed) == (2, 1)
+    assert all(path.exists() for path in files)
+    assert not cfg.hotfolder.archive_dir.exists() and not cfg.hotfolder.failed_dir.exists()
+
+
+def test_dry_run_makes_no_graph_calls_and_leaves_files(tmp_path, fake_processor):
+    cfg = _cfg(tmp_path)
+    files = _files(tmp_path / "alt", ["a.pdf", "kaputt.pdf"])
+    store = JobStore(JobsConfig(path=tmp_path / "jobs.sqlite3"))
+    processor = fake_processor()
+    summary = run_replay(cfg, processor, graph=None, files=files, store=store, dry_run=True)
+    assert (summary.processed, summary.failed) == (1, 1)
+    assert processor.uploads == []
+    assert all(path.exists() for path in files)
+    assert store.counts() == {}
+    store.close()
+
+
+def test_resume_skips_finished_files(tmp_path, fake_processor):
+    cfg = _cfg(tmp_path)
+    # reprocessing the archive in place: finished files stay where they are
+    cfg.hotfolder.archive_dir = tmp_path / "archiv"
+    files = _files(cfg.hotfolder.archive_dir, ["a.pdf", "b.pdf"])
+    store = JobStore(JobsConfig(path=tmp_path / "jobs.sqlite3"))
+    assert run_replay(cfg, fake_processor(), graph=None, files=files[:1], store=store).processed == 1
+
+    processor = fake_processor()
+    summary = run_replay(cfg, processor, graph=None, files=files, store=store, resume=True)
+    assert (summary.processed, summary.skipped) == (1, 1)
+    assert processor.uploads == ["b.pdf"]
+    store.close()
@@ -0,0 +1,92 @@
+from dataclasses import replace
+from datetime import date
+from functools import partial
+
+import pypdfium2 as pdfium
+from PIL import Image
+
+from document_scanner.document import SourceDocument
+from document_scanner.models import ExtractedData, PageText
+from document_scanner.report import build_report_page, merge_report_with_original, text_width, wrap_text
+
+DATA = ExtractedData(
+    document_type="Rechnung",
+    issuer="Müller & Söhne (Bäckerei) GmbH",
+    document_date=date(2024, 3, 1),
+    amount_total=1234.5,
+    currency="EUR",
+    due_date=date(2024, 3, 15),
+    iban="DE89370400440532013000",
+    invoice_number="R-2024-17",
+    is_tax_relevant=True,
+    tax_category="Handwerkerleistung",
+    summary=["Brötchenlieferung März " * 20, "Zahlbar innerhalb von 14 Tagen"],
+)
+
+
+def test_vector_report_is_small_searchable_text():
+    report = build_report_page(DATA, "scan.pdf").getvalue()
+    assert len(report) < 10_000
+    pdf = pdfium.PdfDocument(report)
+    page = pdf[0]
+    assert page.get_size() == (595, 842)
+    text = page.get_textpage().get_text_range()
+    assert "Absender: Müller & Söhne (Bäckerei) GmbH" in text
+    assert "Betrag: 1234.50 EUR" in text
+    assert "Zahlbar innerhalb von 14 Tagen" in text
+    pdf.close()
+
+
+def test_long_summary_continues_on_next_page():
+    data = replace(DATA, summary=[f"Position {n}: Brötchen, Kaffee und Kuchen" for n in range(80)])
+    pdf = pdfium.PdfDocument(build_report_page(data, "scan.pdf").getvalue())
+    assert len(pdf) == 2
+    text = "".join(pdf[n].get_textpage().get_text_range() for n in range(len(pdf)))
+    assert "Position 79:" in text
+    assert "Original folgt auf den naechsten Seiten." in text
+    pdf.close()
+
+
+def test_characters_outside_cp1252_are_transliterated():
+    data = replace(DATA, issuer="Dvořák Łódź", summary=["ﬁnal"])
+    pdf = pdfium.PdfDocument(build_report_page(data, "scan.pdf").getvalue())
+    text = pdf[0].get_textpage().get_text_range()
+    assert "Absender: Dvorák Lódz" in text
+    assert "final" in text
+    pdf.close()
+
+
+def test_wrap_text_respects_width():
+    measure = partial(text_width, size=10)
+    lines = wrap_text("Brötchenlieferung März " * 20, 200, measure)
+    assert len(lines) > 1
+    assert all(measure(line) <= 200 for line in lines)
+    assert " ".join(lines) == ("Brötchenlieferung März " * 20).strip()
+
+
+def test_raster_renderer_still_available():
+    report = build_report_page(DATA, "scan.pdf", renderer="raster").getvalue()
+    pdf = pdfium.PdfDocument(report)
+    assert len(pdf) == 1
+    pdf.close()
+
+
+def test_ocr_pages_get_invisible_text_layer(tmp_path):
+    scan = tmp_path / "scan.pdf"
+    Image.new("RGB", (1000, 2000), "white").save(scan, format="PDF", resolution=100.0)
+    page = PageText(0, "ocr", "Rechnung Müller", 1.0, words=[
+        ("Rechnung", 0.1, 0.1, 0.3, 0.13),
+        ("Müller", 0.35, 0.1, 0.6, 0.13),
+    ])
+    target = tmp_path / "out.pdf"
+    with SourceDocument(scan) as document, target.open("wb") as f:
+        merge_report_with_original(build_report_page(DATA, "scan.pdf"), document, f, [page])
+    pdf = pdfium.PdfDocument(str(target))
+    assert len(pdf) == 2
+    textpage = pdf[1].get_textpage()
+    assert textpage.get_text_range().split() == ["Rechnung", "Müller"]
+    # the word sits where tesseract found it: 10-30 % from the left, 10-13 % from the top
+    left, bottom, right, top = textpage.get_charbox(0)
+    assert 72 <= left < 80
+    assert 1440 * 0.87 - 1 <= bottom < top <= 1440 * 0.9
+    pdf.close()
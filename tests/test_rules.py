@@ -0,0 +1,56 @@
+from datetime import date
+
+from document_scanner.config import RulesConfig
+from document_scanner.rules import RuleExtractor, iban_is_valid, parse_amount
+
+INVOICE = """Stadtwerke Musterstadt GmbH
+Hauptstraße 1, 12345 Musterstadt
+Rechnung
+Rechnungsnummer: RE-2024-0815
+Rechnungsdatum: 02.01.2024
+Strom Januar            80,00 EUR
+MwSt 19 %               15,20 EUR
+Gesamtbetrag: 95,20 €
+Zahlbar bis 30.01.2024 auf IBAN DE02 1203 0000 0000 2020 51
+"""
+
+
+def test_parse_amount_formats():
+    assert parse_amount("1.234,56") == 1234.56
+    assert parse_amount("1,234.56") == 1234.56
+    assert parse_amount("95,20") == 95.20
+
+
+def test_iban_checksum():
+    assert iban_is_valid("DE02 1203 0000 0000 2020 51")
+    assert not iban_is_valid("DE03 1203 0000 0000 2020 51")
+
+
+def test_invoice_is_extracted_without_llm():
+    extractor = RuleExtractor(RulesConfig())
+    data = extractor.extract(INVOICE)
+    assert data.document_type == "Rechnung"
+    assert data.issuer == "Stadtwerke Musterstadt GmbH"
+    assert data.document_date == date(2024, 1, 2)
+    assert data.due_date == date(2024, 1, 30)
+    assert data.amount_total == 95.20
+    assert data.currency == "EUR"
+    assert data.iban == "DE02120300000000202051"
+    assert data.invoice_number == "RE-2024-0815"
+    assert extractor.is_confident(data)
+
+
+def test_known_issuer_and_low_confidence_fallback():
+    extractor = RuleExtractor(RulesConfig(known_issuers=["Musterbank"]))
+    assert extractor.extract("Ihre Musterbank informiert\nBetrag 10,00").issuer == "Musterbank"
+    vague = extractor.extract("Liebe Grüße aus dem Urlaub")
+    assert vague.document_type == "Sonstiges"
+    assert not extractor.is_confident(vague)
+
+
+def test_subtotals_are_not_taken_for_the_total():
+    extractor = RuleExtractor(RulesConfig())
+    data = extractor.extract("Rechnung\nGesamtbetrag: 95,20 €\nZwischensumme 80,00 EUR\nSubtotal 70,00 EUR")
+    assert data.amount_total == 95.20
+    only_subtotal = extractor.extract("Rechnung\nNettosumme 80,00 EUR\nMwSt 15,20 EUR")
+    assert only_subtotal.confidence["amount_total"] == 0.5
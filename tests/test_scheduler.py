@@ -0,0 +1,86 @@
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from document_scanner.models import Job
+from document_scanner.scheduler import FairScheduler
+
+
+def _jobs(profile: str, count: int) -> list[Job]:
+    return [Job(source_path=Path(f"{profile}-{n}.pdf"), profile=profile) for n in range(count)]
+
+
+def _run(weights: dict[str, int], jobs: list[Job]) -> list[str]:
+    submitted = []
+    scheduler = FairScheduler(lambda job: submitted.append(job.source_path.stem), weights)
+    for job in jobs:
+        scheduler.put(job)
+    scheduler.start().close()
+    return submitted
+
+
+def test_busy_profile_does_not_starve_the_others():
+    order = _run({"buchhaltung": 1, "personal": 1}, _jobs("buchhaltung", 5) + _jobs("personal", 2))
+    assert order == [
+        "buchhaltung-0",
+        "personal-0",
+        "buchhaltung-1",
+        "personal-1",
+        "buchhaltung-2",
+        "buchhaltung-3",
+        "buchhaltung-4",
+    ]
+
+
+def test_weights_set_the_share_per_round():
+    order = _run({"buchhaltung": 2, "personal": 1}, _jobs("buchhaltung", 4) + _jobs("personal", 3))
+    assert [name.split("-")[0] for name in order] == [
+        "buchhaltung",
+        "buchhaltung",
+        "personal",
+        "buchhaltung",
+        "buchhaltung",
+        "personal",
+        "personal",
+    ]
+
+
+def test_feeder_waits_for_the_pipeline():
+    release = threading.Event()
+    submitted = []
+
+    def submit(job):
+        release.wait(5)
+        submitted.append(job.profile)
+
+    scheduler = FairScheduler(submit, {"a": 1, "b": 1}).start()
+    for job in _jobs("a", 3) + _jobs("b", 1):
+        scheduler.put(job)
+    # the first job blocks in submit, the rest stays in the per-profile backlogs
+    assert sum(scheduler.pending().values()) >= 3
+    release.set()
+    scheduler.close()
+    assert sorted(submitted) == ["a", "a", "a", "b"]
+    with pytest.raises(ValueError):
+        FairScheduler(submit, {"a": 1}).put(Job(source_path=Path("x.pdf"), profile="unbekannt"))
+
+
+def test_close_without_drain_drops_the_backlog():
+    taken = threading.Event()
+    submitted = []
+
+    def submit(job):
+        taken.set()
+        time.sleep(0.1)  # the pipeline's first queue is full
+        submitted.append(job.source_path.stem)
+
+    scheduler = FairScheduler(submit, {"a": 1, "b": 1})
+    for job in _jobs("a", 3) + _jobs("b", 2):
+        scheduler.put(job)
+    scheduler.start()
+    taken.wait(5)
+    scheduler.close(drain=False)
+    assert submitted == ["a-0"]  # only the job the feeder had already taken
+    assert scheduler.pending() == {"a": 0, "b": 0}
@@ -1,20 +1,62 @@
+import os
 import threading
 import time
-from pathlib import Path
 
-from document_scanner.stable_write import wait_for_stable_file
+from document_scanner.stable_write import StabilityTracker
 
 
-def test_wait_for_stable_file(tmp_path):
-    target = tmp_path / "file.bin"
+def _collect():
+    ready = []
+    event = threading.Event()
 
-    def writer():
-        with target.open("wb") as f:
-            f.write(b"123")
-            time.sleep(0.2)
-            f.write(b"456")
+    def on_ready(path):
+        ready.append(path)
+        event.set()
 
-    thread = threading.Thread(target=writer)
-    thread.start()
-    assert wait_for_stable_file(target, timeout=5, interval=0.1)
-    thread.join()
+    return ready, event, on_ready
+
+
+def test_tracker_reports_closed_file_immediately(tmp_path):
+    ready, event, on_ready = _collect()
+    tracker = StabilityTracker(on_ready, settle=10, timeout=20)
+    target = tmp_path / "scan.pdf"
+    target.write_bytes(b"%PDF")
+    tracker.touch(target)
+    started = time.monotonic()
+    tracker.closed(target)
+    assert event.wait(1)
+    assert time.monotonic() - started < 1
+    tracker.closed(target)  # late duplicate event
+    tracker.close()
+    assert ready == [target]
+
+
+def test_tracker_waits_for_size_to_settle(tmp_path):
+    ready, _, on_ready = _collect()
+    tracker = StabilityTracker(on_ready, settle=0.2, timeout=5)
+    files = [tmp_path / f"scan{i}.pdf" for i in range(50)]
+    for target in files:
+        target.write_bytes(b"1")
+        tracker.touch(target)
+    time.sleep(0.1)
+    for target in files:
+        with target.open("ab") as f:
+            f.write(b"2")
+        tracker.touch(target)
+    assert ready == []
+    deadline = time.monotonic() + 5
+    while len(ready) < len(files) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    tracker.close()
+    assert sorted(ready) == sorted(files)
+
+
+def test_tracker_reports_old_files_without_waiting(tmp_path):
+    ready, event, on_ready = _collect()
+    tracker = StabilityTracker(on_ready, settle=30, timeout=60)
+    target = tmp_path / "scan.pdf"
+    target.write_bytes(b"%PDF")
+    os.utime(target, (time.time() - 60, time.time() - 60))
+    tracker.touch(target)
+    assert event.wait(1)
+    tracker.close()
@@ -0,0 +1,32 @@
+from document_scanner.llm_client import estimate_tokens
+from document_scanner.text_preprocess import (
+    GAP_MARKER,
+    normalize_ocr_text,
+    prepare_llm_text,
+    remove_repeated_lines,
+)
+
+
+def test_normalize_joins_hyphenation_and_drops_noise():
+    text = "Rech-\nnungsnummer:  4711\n~~~|||~~~\n\n\n\nBetrag 12,00 EUR"
+    assert normalize_ocr_text(text) == "Rechnungsnummer: 4711\n\nBetrag 12,00 EUR"
+
+
+def test_repeated_headers_and_footers_are_removed():
+    bodies = ["Anschreiben", "Position Wartung", "Position Material"]
+    pages = [f"Muster GmbH Briefkopf\n{body}\nSeite {n} von 3" for n, body in enumerate(bodies, 1)]
+    cleaned = remove_repeated_lines(pages)
+    assert cleaned == [pages[0], "Position Wartung", "Position Material"]
+
+
+def test_budget_keeps_field_lines():
+    filler = [f"Allgemeine Geschaeftsbedingungen Absatz {n} ohne relevante Angaben" for n in range(400)]
+    first = "Muster GmbH\nRechnung Nr. 4711 vom 02.01.2024"
+    last = "Gesamtbetrag 1.234,56 EUR\nIBAN DE02 1203 0000 0000 2020 51"
+    pages = [first, "\n".join(filler[:200]), "\n".join(filler[200:]), last]
+    prepared = prepare_llm_text(pages, token_budget=120)
+    assert prepared.tokens_after <= 120 + estimate_tokens(GAP_MARKER) * 3
+    assert "Rechnung Nr. 4711 vom 02.01.2024" in prepared.text
+    assert "Gesamtbetrag 1.234,56 EUR" in prepared.text
+    assert "IBAN DE02 1203 0000 0000 2020 51" in prepared.text
+    assert prepared.tokens_saved > 0